@@ -1,7 +1,7 @@
 """detLLM package."""
 
-from detllm.api import check, run
+from detllm.api import acheck, arun, check, matrix, merge, run
 from detllm.core.env import capture_env
 from detllm.version import __version__
 
-__all__ = ["__version__", "capture_env", "run", "check"]
+__all__ = ["__version__", "capture_env", "run", "check", "merge", "matrix", "arun", "acheck"]
@@ -4,19 +4,25 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 import os
-from typing import Any, Sequence
+from typing import TYPE_CHECKING, Any, Sequence
 
 from detllm.backends.base import BackendAdapter
-from detllm.core.artifacts import dump_json, validate_artifact
-from detllm.core.capabilities import evaluate_capabilities
-from detllm.core.deterministic import DeterministicContext
+from detllm.core.artifacts import validate_artifact
 from detllm.core.env import capture_env
-from detllm.core.models import DeterminismAppliedRecord, EnvSnapshot, RunConfig, TokenTraceRow
-from detllm.diff.diff import aggregate_diffs, diff_traces
+from detllm.core.events import EventCallback
+from detllm.core.models import EnvSnapshot
+from detllm.core.profiling import PROFILERS, profiler_available
+from detllm.core.sharding import ShardSpec
+from detllm.core.sink import MemorySink
+from detllm.core.store import ArtifactStore, dump_artifact
+from detllm.diff.tolerance import ScoreTolerance
 from detllm.report.report import Report
-from detllm.report.render_text import render_report
-from detllm.trace.io import write_trace
-from detllm.version import __version__
+from detllm.trace.io import TRACE_FORMATS
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+
+    from detllm.core.async_jobs import AsyncJob
 
 
 @dataclass(frozen=True)
@@ -26,6 +32,58 @@ class RunResult:
     out_dir: str
 
 
+@dataclass(frozen=True)
+class InMemoryResult:
+    """Result of ``run``/``check`` with ``write_artifacts=False``.
+
+    ``artifacts`` holds what the call would have written, by path relative to
+    its output directory; ``save(out_dir)`` writes them there.
+    """
+
+    report: Report
+    artifacts: MemorySink
+
+    @property
+    def status(self) -> str:
+        return self.report.status
+
+    @property
+    def category(self) -> str:
+        return self.report.category
+
+    @property
+    def details(self) -> dict[str, Any]:
+        return self.report.details
+
+    @property
+    def env(self) -> dict[str, Any]:
+        return self.artifacts.files["env.json"]
+
+    @property
+    def envs(self) -> dict[str, dict[str, Any]]:
+        """Env snapshots captured per run (check only), by task label."""
+        return {
+            _stem(path): payload
+            for path, payload in self.artifacts.files.items()
+            if path.startswith("envs" + os.sep)
+        }
+
+    @property
+    def traces(self) -> dict[str, list[dict[str, Any]]]:
+        """Trace rows by task label (``run_0``, ``batch_4``; ``trace`` for ``run``)."""
+        return {_stem(path): rows for path, rows in self.artifacts.traces.items()}
+
+    @property
+    def diff(self) -> dict[str, Any] | None:
+        """The first divergence, as in ``diffs/first_divergence.json``."""
+        return self.artifacts.files.get(os.path.join("diffs", "first_divergence.json"))
+
+    def save(self, out_dir: str) -> str:
+        """Materialise the artifacts as a repro pack under ``out_dir``."""
+        self.artifacts.save(out_dir)
+        return out_dir
+
+
 def run(
     *,
     backend: str,
@@ -34,6 +92,7 @@ def run(
     tier: int = 1,
     mode: str = "best-effort",
     batch_size: int = 1,
+    batching: str = "sequential",
     seed: int = 0,
     max_new_tokens: int = 32,
     temperature: float = 0.0,
@@ -42,21 +101,52 @@ def run(
     device: str = "cpu",
     dtype: str = "float32",
     out_dir: str = "artifacts/run",
+    trace_format: str = "jsonl",
+    trace_index: bool = False,
+    artifact_store: str | None = None,
     backend_adapter: BackendAdapter | None = None,
     redact: bool = False,
     redact_env_vars: Sequence[str] | None = None,
     validate_schema: bool = False,
-) -> RunResult:
+    profile: str | None = None,
+    profile_batches: int = 1,
+    profile_top: int = 30,
+    shard: str | None = None,
+    on_event: EventCallback | None = None,
+    write_artifacts: bool = True,
+) -> RunResult | InMemoryResult:
     from detllm.cli import main as cli_main
+
     if not prompts:
         raise ValueError("prompts must be non-empty")
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unsupported trace format: {trace_format}")
+    if artifact_store and trace_format == "binary":
+        raise ValueError("artifact_store cannot be combined with trace_format='binary'")
+    _check_profile(profile, profile_batches)
+    if shard is not None:
+        ShardSpec.parse(shard)
+    if not write_artifacts:
+        _check_in_memory(
+            artifact_store=artifact_store, trace_index=trace_index, profile=profile, shard=shard
+        )
 
-    os.makedirs(out_dir, exist_ok=True)
+    sink = None if write_artifacts else MemorySink(trace_format)
     env_snapshot = capture_env(redact=redact, redact_env_vars=list(redact_env_vars or []))
     env_payload = _coerce_env(env_snapshot)
     if validate_schema:
         validate_artifact(env_payload)
-    dump_json(os.path.join(out_dir, "env.json"), env_payload)
+    if sink is not None:
+        # Artifact paths become relative to the result.
+        out_dir = ""
+        sink.write_json("env.json", env_payload)
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+        dump_artifact(
+            os.path.join(out_dir, "env.json"),
+            env_payload,
+            ArtifactStore(artifact_store) if artifact_store else None,
+        )
 
     args = _build_args(
         backend=backend,
@@ -65,6 +155,7 @@ def run(
         tier=tier,
         mode=mode,
         batch_size=batch_size,
+        batching=batching,
         seed=seed,
         max_new_tokens=max_new_tokens,
         temperature=temperature,
@@ -73,45 +164,22 @@ def run(
         device=device,
         dtype=dtype,
         out_dir=out_dir,
+        trace_format=trace_format,
+        trace_index=trace_index,
+        artifact_store=artifact_store,
+        validate_schema=validate_schema,
+        profile=profile,
+        profile_batches=profile_batches,
+        profile_top=profile_top,
+        shard=shard,
+        on_event=on_event,
+        sink=sink,
     )
 
-    with DeterministicContext(tier, mode, seed) as ctx:
-        backend_impl = backend_adapter or cli_main._build_backend(args)
-        decision = evaluate_capabilities(ctx.applied, backend_impl.capabilities(), tier, mode)
-        if not decision.supported:
-            cli_main._write_unsupported(
-                out_dir, runs=1, decision=decision, validate_schema=validate_schema
-            )
-            determinism_payload = _coerce_determinism(ctx.applied.to_dict())
-            if validate_schema:
-                validate_artifact(determinism_payload)
-            dump_json(os.path.join(out_dir, "determinism_applied.json"), determinism_payload)
-            return RunResult(status="FAIL", category="UNSUPPORTED_REQUEST", out_dir=out_dir)
-
-        trace_rows = cli_main._run_generation(
-            backend_impl, list(prompts), args, capture_scores=ctx.applied.tier_effective >= 2
-        )
-
-    determinism_payload = _coerce_determinism(ctx.applied.to_dict())
-    if validate_schema:
-        validate_artifact(determinism_payload)
-    dump_json(os.path.join(out_dir, "determinism_applied.json"), determinism_payload)
-    run_config = cli_main._build_run_config(
-        args,
-        env_snapshot.get("device"),
-        ctx.applied.tier_effective,
-        cli_main._parse_vary_batch(None),
-    )
-    run_config = _coerce_run_config(run_config)
-    if validate_schema:
-        validate_artifact(run_config)
-    dump_json(os.path.join(out_dir, "run_config.json"), run_config)
-    write_trace(
-        os.path.join(out_dir, "trace.jsonl"),
-        _coerce_trace_rows(trace_rows),
-        validate_rows=validate_schema,
-    )
-    return RunResult(status="PASS", category="PASS", out_dir=out_dir)
+    report = cli_main._execute_run(args, list(prompts), env_snapshot, backend_adapter)
+    if sink is not None:
+        return InMemoryResult(report=report, artifacts=sink)
+    return RunResult(status=report.status, category=report.category, out_dir=out_dir)
 
 
 def check(
@@ -123,6 +191,7 @@ def check(
     mode: str = "best-effort",
     runs: int = 3,
     batch_size: int = 1,
+    batching: str = "sequential",
     vary_batch: Sequence[int] | None = None,
     seed: int = 0,
     max_new_tokens: int = 32,
@@ -132,21 +201,69 @@ def check(
     device: str = "cpu",
     dtype: str = "float32",
     out_dir: str = "artifacts/check",
+    trace_format: str = "jsonl",
+    trace_index: bool = False,
+    artifact_store: str | None = None,
     backend_adapter: BackendAdapter | None = None,
     redact: bool = False,
     redact_env_vars: Sequence[str] | None = None,
     validate_schema: bool = False,
-) -> Report:
+    reload_per_run: bool = False,
+    workers: int = 1,
+    fail_fast: bool = False,
+    analyze: bool = False,
+    score_atol: float = 0.0,
+    score_rtol: float = 0.0,
+    score_ulps: int = 0,
+    profile: str | None = None,
+    profile_runs: int = 1,
+    profile_batches: int = 1,
+    profile_top: int = 30,
+    shard: str | None = None,
+    resume: bool = False,
+    on_event: EventCallback | None = None,
+    write_artifacts: bool = True,
+) -> Report | InMemoryResult:
     from detllm.cli import main as cli_main
+
     if not prompts:
         raise ValueError("prompts must be non-empty")
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unsupported trace format: {trace_format}")
+    if artifact_store and trace_format == "binary":
+        raise ValueError("artifact_store cannot be combined with trace_format='binary'")
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    _check_profile(profile, profile_batches, profile_runs)
+    if shard is not None:
+        ShardSpec.parse(shard)
+    # Reject bad tolerances before any generation work.
+    ScoreTolerance(atol=score_atol, rtol=score_rtol, ulps=score_ulps)
+    if not write_artifacts:
+        _check_in_memory(
+            artifact_store=artifact_store,
+            trace_index=trace_index,
+            profile=profile,
+            shard=shard,
+            resume=resume,
+            workers=workers > 1,
+        )
 
-    os.makedirs(out_dir, exist_ok=True)
+    sink = None if write_artifacts else MemorySink(trace_format)
     env_snapshot = capture_env(redact=redact, redact_env_vars=list(redact_env_vars or []))
     env_payload = _coerce_env(env_snapshot)
     if validate_schema:
         validate_artifact(env_payload)
-    dump_json(os.path.join(out_dir, "env.json"), env_payload)
+    if sink is not None:
+        out_dir = ""
+        sink.write_json("env.json", env_payload)
+    else:
+        os.makedirs(out_dir, exist_ok=True)
+        dump_artifact(
+            os.path.join(out_dir, "env.json"),
+            env_payload,
+            ArtifactStore(artifact_store) if artifact_store else None,
+        )
 
     vary_batch_sizes = list(vary_batch or [])
     args = _build_args(
@@ -156,6 +273,7 @@ def check(
         tier=tier,
         mode=mode,
         batch_size=batch_size,
+        batching=batching,
         seed=seed,
         max_new_tokens=max_new_tokens,
         temperature=temperature,
@@ -164,125 +282,121 @@ def check(
         device=device,
         dtype=dtype,
         out_dir=out_dir,
+        trace_format=trace_format,
+        trace_index=trace_index,
+        artifact_store=artifact_store,
         runs=runs,
         vary_batch=vary_batch_sizes,
+        reload_per_run=reload_per_run,
+        workers=workers,
+        fail_fast=fail_fast,
+        analyze=analyze,
+        score_atol=score_atol,
+        score_rtol=score_rtol,
+        score_ulps=score_ulps,
+        profile=profile,
+        profile_runs=profile_runs,
+        profile_batches=profile_batches,
+        profile_top=profile_top,
+        shard=shard,
+        resume=resume,
+        on_event=on_event,
+        validate_schema=validate_schema,
+        redact_env=redact,
+        redact_env_var=list(redact_env_vars or []),
+        sink=sink,
     )
 
-    run_config = cli_main._build_run_config(
+    report = cli_main._run_check(
         args,
-        env_snapshot.get("device"),
-        tier_effective=tier,
-        vary_batch=vary_batch_sizes,
+        list(prompts),
+        vary_batch_sizes,
+        env_snapshot,
+        backend_adapter=backend_adapter,
     )
-    run_config = _coerce_run_config(run_config)
-    if validate_schema:
-        validate_artifact(run_config)
-    dump_json(os.path.join(out_dir, "run_config.json"), run_config)
-
-    traces: list[list[dict[str, Any]]] = []
-    determinism_rows: list[dict[str, Any]] = []
-    baseline_fingerprint = env_snapshot.get("fingerprint")
-    for run_idx in range(runs):
-        env_run = capture_env(redact=redact, redact_env_vars=list(redact_env_vars or []))
-        env_payload = _coerce_env(env_run)
-        env_path = os.path.join(out_dir, "envs", f"run_{run_idx}.json")
-        os.makedirs(os.path.dirname(env_path), exist_ok=True)
-        dump_json(env_path, env_payload)
-        if baseline_fingerprint and env_payload.get("fingerprint") != baseline_fingerprint:
-            cli_main._write_env_mismatch(
-                out_dir,
-                runs,
-                run_idx,
-                baseline_fingerprint,
-                env_payload,
-                validate_schema=validate_schema,
-            )
-            return Report(status="FAIL", category="ENV_MISMATCH", details={})
-        with DeterministicContext(tier, mode, seed) as ctx:
-            backend_impl = backend_adapter or cli_main._build_backend(args)
-            decision = evaluate_capabilities(ctx.applied, backend_impl.capabilities(), tier, mode)
-            if not decision.supported:
-                cli_main._write_unsupported(
-                    out_dir, runs=runs, decision=decision, validate_schema=validate_schema
-                )
-                determinism_payload = _coerce_determinism(ctx.applied.to_dict())
-                if validate_schema:
-                    validate_artifact(determinism_payload)
-                dump_json(
-                    os.path.join(out_dir, "determinism_applied.json"),
-                    determinism_payload,
-                )
-                return Report(status="FAIL", category="UNSUPPORTED_REQUEST", details={})
-
-            trace_rows = cli_main._run_generation(
-                backend_impl, list(prompts), args, capture_scores=ctx.applied.tier_effective >= 2
-            )
-
-        traces.append(trace_rows)
-        determinism_rows.append(_coerce_determinism(ctx.applied.to_dict()))
-        trace_path = os.path.join(out_dir, "traces", f"run_{run_idx}.jsonl")
-        os.makedirs(os.path.dirname(trace_path), exist_ok=True)
-        write_trace(
-            trace_path,
-            _coerce_trace_rows(trace_rows),
-            validate_rows=validate_schema,
-        )
+    if sink is not None:
+        return InMemoryResult(report=report, artifacts=sink)
+    return report
 
-    if validate_schema:
-        validate_artifact(determinism_rows[0])
-    dump_json(os.path.join(out_dir, "determinism_applied.json"), determinism_rows[0])
-
-    diffs = [diff_traces(traces[0], traces[i]) for i in range(1, len(traces))]
-    result = aggregate_diffs(diffs)
-
-    batch_result = None
-    batch_traces: dict[int, list[dict[str, Any]]] = {}
-    batch_diffs: list[tuple[int, Any]] = []
-    if vary_batch_sizes:
-        for batch_size_item in vary_batch_sizes:
-            batch_args = cli_main._clone_args(args, batch_size=batch_size_item)
-            with DeterministicContext(tier, mode, seed) as ctx:
-                backend_impl = backend_adapter or cli_main._build_backend(batch_args)
-                trace_rows = cli_main._run_generation(
-                    backend_impl,
-                    list(prompts),
-                    batch_args,
-                    capture_scores=ctx.applied.tier_effective >= 2,
-                )
-            batch_traces[batch_size_item] = trace_rows
-            trace_path = os.path.join(out_dir, "traces", f"batch_{batch_size_item}.jsonl")
-            write_trace(trace_path, _coerce_trace_rows(trace_rows))
-
-        batch_diffs = [
-            (size, diff_traces(traces[0], batch_traces[size])) for size in vary_batch_sizes
-        ]
-        batch_result = aggregate_diffs([diff for _, diff in batch_diffs])
-
-    report = Report(
-        status=cli_main._report_status(result, batch_result),
-        category=cli_main._report_category(result, batch_result),
-        details={
-            "runs": runs,
-            "batch_sizes": vary_batch_sizes,
-            "first_divergence": cli_main._report_divergence(result, batch_result),
-            "batch_divergence": cli_main._batch_divergence_detail(batch_diffs, result),
-        },
+
+def merge(
+    *,
+    shard_dirs: Sequence[str],
+    out_dir: str = "artifacts/merged",
+    trace_format: str | None = None,
+    artifact_store: str | None = None,
+    analyze: bool = False,
+    validate_schema: bool = False,
+) -> Report | None:
+    """Merge ``run``/``check`` shard outputs; returns the merged check report (None for runs)."""
+    from detllm.cli import main as cli_main
+
+    if not shard_dirs:
+        raise ValueError("shard_dirs must be non-empty")
+    if trace_format is not None and trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unsupported trace format: {trace_format}")
+
+    os.makedirs(out_dir, exist_ok=True)
+    args = _build_args(
+        shard_dirs=list(shard_dirs),
+        out=out_dir,
+        trace_format=trace_format,
+        artifact_store=artifact_store,
+        analyze=analyze,
+        validate_schema=validate_schema,
     )
-    report_payload = cli_main._wrap_artifact("report", report.to_dict())
-    if validate_schema:
-        validate_artifact(report_payload)
-    dump_json(os.path.join(out_dir, "report.json"), report_payload)
-    with open(os.path.join(out_dir, "report.txt"), "w", encoding="utf-8") as handle:
-        handle.write(render_report(report))
-
-    if cli_main._report_divergence(result, batch_result) is not None:
-        diff_path = os.path.join(out_dir, "diffs", "first_divergence.json")
-        dump_json(
-            diff_path,
-            cli_main._wrap_artifact("first_divergence", cli_main._report_divergence(result, batch_result)),
-        )
+    return cli_main._execute_merge(args)
+
+
+def matrix(
+    *,
+    spec: dict[str, Any] | str,
+    out_dir: str = "artifacts/matrix",
+    dry_run: bool = False,
+    validate_schema: bool = False,
+) -> dict[str, Any]:
+    """Run a check matrix (a spec dict or JSON/TOML path); returns the ``matrix.json`` payload."""
+    from detllm.matrix import load_spec, run_matrix
+
+    if isinstance(spec, str):
+        spec = load_spec(spec)
+    return run_matrix(spec, out_dir, dry_run=dry_run, validate_schema=validate_schema)
+
+
+def arun(*, executor: Executor | None = None, **kwargs: Any) -> AsyncJob:
+    """Async ``run``: takes the same keyword arguments; await the job for the ``RunResult``."""
+    from detllm.core.async_jobs import AsyncJob
+
+    return AsyncJob(run, kwargs, executor)
 
-    return report
+
+def acheck(*, executor: Executor | None = None, **kwargs: Any) -> AsyncJob:
+    """Async ``check``: takes the same keyword arguments; await the job for the ``Report``."""
+    from detllm.core.async_jobs import AsyncJob
+
+    return AsyncJob(check, kwargs, executor)
+
+
+def _check_profile(profile: str | None, batches: int, runs: int = 1) -> None:
+    if profile is None:
+        return
+    if profile not in PROFILERS:
+        raise ValueError(f"Unsupported profiler: {profile}")
+    if not profiler_available(profile):
+        raise ValueError(f"profile={profile!r} requires torch")
+    if batches < 1 or runs < 1:
+        raise ValueError("profile_runs and profile_batches must be at least 1")
+
+
+def _check_in_memory(**options: Any) -> None:
+    # These options produce or read files beyond the artifacts a sink holds.
+    given = [name for name, value in options.items() if value]
+    if given:
+        raise ValueError(f"write_artifacts=False cannot be combined with: {', '.join(given)}")
+
+
+def _stem(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
 
 
 def _build_args(**kwargs: Any) -> Any:
@@ -296,27 +410,10 @@ def _build_args(**kwargs: Any) -> Any:
         setattr(args, "runs", 1)
     if not hasattr(args, "vary_batch"):
         setattr(args, "vary_batch", [])
+    if not hasattr(args, "out") and hasattr(args, "out_dir"):
+        args.out = args.out_dir
     return args
 
 
 def _coerce_env(payload: dict[str, Any]) -> dict[str, Any]:
     return EnvSnapshot.from_dict(payload).to_dict()
-
-
-def _coerce_run_config(payload: dict[str, Any]) -> dict[str, Any]:
-    return RunConfig.from_dict(payload).to_dict()
-
-
-def _coerce_determinism(payload: dict[str, Any]) -> dict[str, Any]:
-    if "schema_version" not in payload:
-        payload = {
-            "schema_version": "1.0",
-            "detllm_version": __version__,
-            "artifact_type": "determinism_applied",
-            **payload,
-        }
-    return DeterminismAppliedRecord.from_dict(payload).to_dict()
-
-
-def _coerce_trace_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    return [TokenTraceRow.from_dict(row).to_dict() for row in rows]
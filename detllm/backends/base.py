@@ -12,11 +12,11 @@ class BackendCapabilities:
     supports_scores: bool
     supports_torch_deterministic: bool
     notes: list[str] = field(default_factory=list)
+    # Backend accepts ``reference_output_ids`` and stops rows once they diverge from it.
+    supports_step_stopping: bool = False
 
 
 class BackendAdapter(Protocol):
-    def capabilities(self) -> BackendCapabilities:
-        ...
+    def capabilities(self) -> BackendCapabilities: ...
 
-    def generate(self, prompts: list[str], **kwargs: Any) -> list[dict[str, Any]]:
-        ...
+    def generate(self, prompts: list[str], **kwargs: Any) -> list[dict[str, Any]]: ...
@@ -2,6 +2,8 @@
 
 from __future__ import annotations
 
+import copy
+import time
 from typing import Any
 
 from detllm.backends.base import BackendAdapter, BackendCapabilities
@@ -17,6 +19,8 @@ class HFBackend(BackendAdapter):
         self.dtype = dtype
         self.model = None
         self.tokenizer = None
+        # Phase timings and token counts of the latest ``generate`` call (see core.metrics).
+        self.last_batch_stats: dict[str, Any] | None = None
         self._load()
 
     def _load(self) -> None:
@@ -48,14 +52,39 @@ class HFBackend(BackendAdapter):
         self.model = AutoModelForCausalLM.from_pretrained(self.model_id, dtype=torch_dtype)
         self.model.to(self.device)
         self.model.eval()
+        self._generation_config = copy.deepcopy(self.model.generation_config)
+
+    def reset(self) -> None:
+        """Drop per-run state so a pooled backend behaves like a fresh load."""
+        if self.model is None:
+            return
+        self.model.generation_config = copy.deepcopy(self._generation_config)
+        if str(self.device).startswith("cuda"):
+            import torch
+
+            torch.cuda.empty_cache()
+
+    def close(self) -> None:
+        self.model = None
+        self.tokenizer = None
+
+    def token_lengths(self, prompts: list[str]) -> list[int]:
+        if self.tokenizer is None:
+            raise RuntimeError("HF backend not initialized.")
+        return [len(ids) for ids in self.tokenizer(prompts)["input_ids"]]
+
+    def memory_bytes(self) -> int:
+        if self.model is None:
+            return 0
+        return int(self.model.get_memory_footprint())
 
     def capabilities(self) -> BackendCapabilities:
         return BackendCapabilities(
             supports_tier1_fixed_batch=True,
             supports_scores=True,
             supports_torch_deterministic=True,
-            # TODO: Add score/logprob capture support for Tier 2 when available.
             notes=["CPU-only deterministic controls are best-effort."],
+            supports_step_stopping=True,
         )
 
     def generate(
@@ -64,66 +93,150 @@ class HFBackend(BackendAdapter):
         max_new_tokens: int = 32,
         do_sample: bool = False,
         capture_scores: bool = False,
+        reference_output_ids: list[list[int]] | None = None,
     ) -> list[dict[str, Any]]:
         import torch
-        import torch.nn.functional as torch_f
+        from transformers import LogitsProcessorList, StoppingCriteriaList
 
         if self.model is None or self.tokenizer is None:
             raise RuntimeError("HF backend not initialized.")
 
+        started = time.perf_counter()
         inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
         inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        tokenized = time.perf_counter()
+
+        step_timer = _FirstStepTimer()
+        logprob_capture = None
+        processors: list[Any] = [step_timer]
+        if capture_scores:
+            logprob_capture = _ChosenTokenLogprobs(len(prompts), max_new_tokens)
+            processors.append(logprob_capture)
+        generate_kwargs: dict[str, Any] = {"logits_processor": LogitsProcessorList(processors)}
+        if reference_output_ids is not None:
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList(
+                [_StopOnDivergence(reference_output_ids, self.device)]
+            )
 
         with torch.inference_mode():
-            outputs = self.model.generate(
+            sequences = self.model.generate(
                 **inputs,
                 max_new_tokens=max_new_tokens,
                 do_sample=do_sample,
-                output_scores=capture_scores,
-                return_dict_in_generate=capture_scores,
+                **generate_kwargs,
             )
+        finished = time.perf_counter()
+
+        input_ids = inputs["input_ids"]
+        attention_mask = inputs.get("attention_mask")
+        real_tokens = int(attention_mask.sum()) if attention_mask is not None else input_ids.numel()
+        first_step = step_timer.first_step
+        self.last_batch_stats = {
+            "tokenize_s": tokenized - started,
+            # The first logits are produced by the prefill forward pass.
+            "prefill_s": first_step - tokenized if first_step is not None else None,
+            "decode_s": finished - first_step if first_step is not None else None,
+            "input_tokens": real_tokens,
+            "padding_tokens": int(input_ids.numel()) - real_tokens,
+            "generated_tokens": int(sequences.shape[1] - input_ids.shape[1]) * len(prompts),
+        }
 
-        if capture_scores:
-            sequences = outputs.sequences
-            score_tensors = outputs.scores
-        else:
-            sequences = outputs
-            score_tensors = None
+        scores_by_row = None
+        if logprob_capture is not None:
+            scores_by_row = logprob_capture.finish(sequences)
 
         results: list[dict[str, Any]] = []
         for i, prompt in enumerate(prompts):
-            scores = None
-            if capture_scores and score_tensors is not None:
-                input_len = int(inputs["attention_mask"][i].sum().item())
-                scores = _token_logprobs(
-                    sequences[i],
-                    input_len,
-                    score_tensors,
-                    i,
-                    torch_f,
-                )
             results.append(
                 {
                     "prompt": prompt,
                     "input_ids": inputs["input_ids"][i].tolist(),
                     "output_ids": sequences[i].tolist(),
-                    "scores": scores,
+                    "scores": scores_by_row[i] if scores_by_row is not None else None,
                     "tokenizer_id": self._tokenizer_id,
                 }
             )
         return results
 
 
-def _token_logprobs(
-    sequence: torch.Tensor,
-    input_len: int,
-    score_tensors: list[torch.Tensor],
-    batch_index: int,
-    torch_f,
-) -> list[float]:
-    logprobs: list[float] = []
-    for step, scores in enumerate(score_tensors):
-        token_id = int(sequence[input_len + step].item())
-        log_probs = torch_f.log_softmax(scores[batch_index], dim=-1)
-        logprobs.append(float(log_probs[token_id].item()))
-    return logprobs
+class _FirstStepTimer:
+    """Logits processor noting when the first decode step's logits arrive."""
+
+    def __init__(self):
+        self.first_step: float | None = None
+
+    def __call__(self, input_ids, scores):
+        if self.first_step is None:
+            self.first_step = time.perf_counter()
+        return scores
+
+
+class _ChosenTokenLogprobs:
+    """Logits processor recording the log-probability of each chosen token.
+
+    Registered last so it sees the same processed scores ``output_scores`` would
+    return. Scores for step ``t`` are held until step ``t + 1`` reveals the chosen
+    token (the last column of ``input_ids``), so at most one ``[batch, vocab]``
+    tensor is alive and the result is a ``[batch, steps]`` buffer.
+    """
+
+    def __init__(self, batch_size: int, max_steps: int):
+        self.batch_size = batch_size
+        self.max_steps = max_steps
+        self._buffer = None
+        self._pending = None
+        self._steps = 0
+
+    def __call__(self, input_ids, scores):
+        self._record(input_ids[:, -1])
+        self._pending = scores
+        return scores
+
+    def finish(self, sequences) -> list[list[float]]:
+        self._record(sequences[:, -1])
+        if self._buffer is None:
+            return [[] for _ in range(self.batch_size)]
+        return self._buffer[:, : self._steps].tolist()
+
+    def _record(self, token_ids) -> None:
+        import torch
+
+        if self._pending is None:
+            return
+        log_probs = torch.log_softmax(self._pending, dim=-1)
+        if self._buffer is None:
+            self._buffer = torch.empty(
+                (self.batch_size, self.max_steps),
+                dtype=log_probs.dtype,
+                device=log_probs.device,
+            )
+        chosen = log_probs.gather(1, token_ids.view(-1, 1).to(log_probs.device))
+        self._buffer[:, self._steps] = chosen.squeeze(1)
+        self._steps += 1
+        self._pending = None
+
+
+class _StopOnDivergence:
+    """Stopping criterion that finishes a row as soon as it leaves its reference sequence.
+
+    Rows that still match keep generating, so the diverging token is always the last
+    one emitted for a stopped row and earlier positions are untouched.
+    """
+
+    def __init__(self, references: list[list[int]], device: str):
+        import torch
+
+        width = max((len(ref) for ref in references), default=0)
+        self._reference = torch.full((len(references), width), -1, dtype=torch.long)
+        for row, ref in enumerate(references):
+            self._reference[row, : len(ref)] = torch.tensor(ref, dtype=torch.long)
+        self._reference = self._reference.to(device)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        length = input_ids.shape[1]
+        if length > self._reference.shape[1]:
+            return torch.ones(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        expected = self._reference[:, :length]
+        return (input_ids != expected).any(dim=1)
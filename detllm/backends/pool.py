@@ -0,0 +1,126 @@
+"""In-process pool of loaded backends reused across runs."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from detllm.backends.base import BackendAdapter
+from detllm.logging import get_logger
+
+logger = get_logger("backends.pool")
+
+
+@dataclass(frozen=True)
+class BackendKey:
+    backend: str
+    model: str
+    device: str
+    dtype: str
+    tokenizer_revision: str | None = None
+
+    @classmethod
+    def from_args(cls, args: Any) -> "BackendKey":
+        return cls(
+            backend=args.backend,
+            model=args.model,
+            device=args.device,
+            dtype=args.dtype,
+            tokenizer_revision=getattr(args, "tokenizer_revision", None),
+        )
+
+
+class BackendPool:
+    """LRU pool of loaded backends keyed by (backend, model, device, dtype, revision).
+
+    A pooled backend is reset via its optional ``reset()`` hook before being handed
+    out again. RNG state is not owned by the backend: it is reseeded by
+    ``DeterministicContext`` at the start of every run.
+    """
+
+    def __init__(self, max_entries: int = 1, max_bytes: int | None = None):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        if max_bytes is not None and max_bytes < 1:
+            raise ValueError("max_bytes must be at least 1")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.loads = 0
+        self.hits = 0
+        self._entries: OrderedDict[BackendKey, BackendAdapter] = OrderedDict()
+        self._sizes: dict[BackendKey, int] = {}
+
+    def acquire(
+        self,
+        key: BackendKey,
+        factory: Callable[[], BackendAdapter],
+    ) -> BackendAdapter:
+        backend = self._entries.get(key)
+        if backend is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            reset_backend(backend)
+            logger.debug("Reusing pooled backend %s", key)
+            return backend
+
+        backend = factory()
+        self.loads += 1
+        self._entries[key] = backend
+        self._sizes[key] = _backend_nbytes(backend)
+        logger.debug("Loaded backend %s (%s bytes)", key, self._sizes[key])
+        self._evict(keep=key)
+        return backend
+
+    def clear(self) -> None:
+        while self._entries:
+            key, backend = self._entries.popitem(last=False)
+            self._sizes.pop(key, None)
+            close_backend(backend)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "loads": self.loads,
+            "hits": self.hits,
+            "bytes": sum(self._sizes.values()),
+        }
+
+    def _evict(self, keep: BackendKey) -> None:
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self._over_budget()
+        ):
+            key = next(iter(self._entries))
+            if key == keep:
+                break
+            backend = self._entries.pop(key)
+            self._sizes.pop(key, None)
+            logger.debug("Evicting pooled backend %s", key)
+            close_backend(backend)
+
+    def _over_budget(self) -> bool:
+        if self.max_bytes is None:
+            return False
+        return sum(self._sizes.values()) > self.max_bytes
+
+
+def reset_backend(backend: BackendAdapter) -> None:
+    reset = getattr(backend, "reset", None)
+    if callable(reset):
+        reset()
+
+
+def close_backend(backend: BackendAdapter) -> None:
+    close = getattr(backend, "close", None)
+    if callable(close):
+        close()
+
+
+def _backend_nbytes(backend: BackendAdapter) -> int:
+    memory_bytes = getattr(backend, "memory_bytes", None)
+    if not callable(memory_bytes):
+        return 0
+    try:
+        return int(memory_bytes())
+    except Exception:
+        return 0
@@ -0,0 +1,37 @@
+"""Backend registry, resolved lazily by name.
+
+Adapters are referenced as ``module:attribute`` strings so importing the CLI
+never imports a backend module (or, transitively, torch/transformers/vllm);
+the module is loaded only when a backend of that name is built.
+"""
+
+from __future__ import annotations
+
+import importlib
+from typing import Any
+
+_BACKENDS: dict[str, str] = {
+    "hf": "detllm.backends.hf:HFBackend",
+    "vllm": "detllm.backends.vllm:VLLMBackend",
+    "synthetic": "detllm.backends.synthetic:SyntheticBackend",
+}
+
+
+def register_backend(name: str, target: str) -> None:
+    """Register an adapter class as ``"package.module:ClassName"``."""
+    if ":" not in target:
+        raise ValueError(f"Backend target must look like 'module:attribute': {target}")
+    _BACKENDS[name] = target
+
+
+def backend_names() -> list[str]:
+    return sorted(_BACKENDS)
+
+
+def load_backend(name: str) -> Any:
+    """Import and return the adapter class registered as ``name``."""
+    target = _BACKENDS.get(name)
+    if target is None:
+        raise ValueError(f"Unsupported backend: {name}")
+    module_name, attribute = target.split(":", 1)
+    return getattr(importlib.import_module(module_name), attribute)
@@ -0,0 +1,75 @@
+"""Synthetic in-process backend for benchmarks and tests.
+
+Outputs are a cheap deterministic function of the prompt, so runs never
+diverge unless ``perturb`` names a prompt: its last score is then moved by
+one ULP, which exercises the element-wise diff path.
+"""
+
+from __future__ import annotations
+
+import math
+import zlib
+from typing import Any, Collection
+
+from detllm.backends.base import BackendAdapter, BackendCapabilities
+
+_VOCAB = 50_000
+
+
+class SyntheticBackend(BackendAdapter):
+    def __init__(
+        self,
+        model: str = "synthetic",
+        device: str = "cpu",
+        dtype: str = "float32",
+        prompt_tokens: int = 16,
+        score_size: int | None = None,
+        perturb: Collection[str] = (),
+    ):
+        self.model = model
+        self.device = device
+        self.dtype = dtype
+        self.prompt_tokens = prompt_tokens
+        # Scores per row; None means one per generated token.
+        self.score_size = score_size
+        self.perturb = frozenset(perturb)
+
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+            notes=["synthetic backend: outputs are a function of the prompt, no model runs"],
+        )
+
+    def token_lengths(self, prompts: list[str]) -> list[int]:
+        return [self.prompt_tokens] * len(prompts)
+
+    def generate(
+        self,
+        prompts: list[str],
+        max_new_tokens: int = 32,
+        capture_scores: bool = False,
+        **kwargs: Any,
+    ) -> list[dict[str, Any]]:
+        results = []
+        score_size = max_new_tokens if self.score_size is None else self.score_size
+        for prompt in prompts:
+            seed = zlib.crc32(prompt.encode("utf-8"))
+            input_ids = [(seed + step * 7919) % _VOCAB for step in range(self.prompt_tokens)]
+            output_ids = [(seed + step * 104_729) % _VOCAB for step in range(max_new_tokens)]
+            scores = None
+            if capture_scores:
+                scores = [-((seed + step) % 1000) / 1000.0 for step in range(score_size)]
+                if scores and prompt in self.perturb:
+                    scores[-1] = math.nextafter(scores[-1], -math.inf)
+            results.append(
+                {
+                    "prompt": prompt,
+                    "input_ids": input_ids,
+                    "output_ids": output_ids,
+                    "scores": scores,
+                    "tokenizer_id": f"synthetic/{self.model}",
+                }
+            )
+        return results
@@ -0,0 +1,317 @@
+"""Pipeline overhead benchmark (``detllm bench``).
+
+Drives the ``check`` pipeline with the synthetic backend, so the time
+measured is detLLM's own: prompt loading, row building (prompt and token
+hashes, output digests), coercion, schema validation, trace writing and
+reading, and diffing. Each scale is measured twice:
+
+- stage by stage, over two runs of the same prompts (the second differs from
+  the first in one score, so diffs do real work). With ``memory`` set, the
+  peak memory each stage allocates is traced too, which slows every stage;
+  compare timings only between results taken with the same setting. Schema
+  validation is slow enough to dominate, so it is timed on the first
+  ``VALIDATION_SAMPLE`` rows of each run and extrapolated;
+- end to end, as a full ``check`` whose backend time is subtracted to give
+  the pipeline overhead.
+
+Results are written as ``bench.json`` (schema ``bench``); pass an earlier
+file as ``baseline`` to add per-stage speed ratios.
+"""
+
+from __future__ import annotations
+
+import argparse
+from contextlib import contextmanager
+from importlib.util import find_spec
+import json
+import os
+import platform
+import shutil
+import sys
+import time
+import tracemalloc
+from typing import Any, Iterator, Sequence
+
+from detllm import api
+from detllm.backends.synthetic import SyntheticBackend
+from detllm.core.artifacts import dump_json, load_json, load_schema, validate_json, wrap_artifact
+from detllm.core.batching import plan_batches
+from detllm.core.generation import iter_generation, load_prompts
+from detllm.core.metrics import RunMetrics, peak_rss_bytes
+from detllm.core.models import TokenTraceRow
+from detllm.diff.diff import TraceComparator
+from detllm.diff.files import diff_trace_files
+from detllm.trace.io import TraceWriter, iter_trace, trace_filename
+
+BENCH_STAGES = (
+    "prompt_loading",
+    "generate",
+    "row_build",
+    "coercion",
+    "validation",
+    "trace_write",
+    "trace_read",
+    "diff",
+    "diff_files",
+)
+DEFAULT_ROWS = (1_000, 100_000)
+VALIDATION_SAMPLE = 1_000
+
+
+class _StageClock:
+    def __init__(self, memory: bool):
+        self.memory = memory
+        self.seconds: dict[str, float] = {}
+        self.peak_bytes: dict[str, int] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if self.memory:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+            if self.memory:
+                peak = tracemalloc.get_traced_memory()[1] - before
+                self.peak_bytes[name] = max(self.peak_bytes.get(name, 0), peak)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+
+
+def run_bench(
+    out_dir: str,
+    rows: Sequence[int] = DEFAULT_ROWS,
+    prompt_tokens: int = 16,
+    new_tokens: int = 32,
+    score_size: int | None = None,
+    batch_size: int = 64,
+    trace_format: str = "jsonl",
+    memory: bool = False,
+    end_to_end: bool = True,
+    baseline: str | None = None,
+) -> dict[str, Any]:
+    """Benchmark every scale in ``rows`` and write ``<out_dir>/bench.json``."""
+    if not rows or min(rows) < 1:
+        raise ValueError("rows must be positive")
+    os.makedirs(out_dir, exist_ok=True)
+    config = {
+        "rows": list(rows),
+        "prompt_tokens": prompt_tokens,
+        "new_tokens": new_tokens,
+        "score_size": new_tokens if score_size is None else score_size,
+        "batch_size": batch_size,
+        "trace_format": trace_format,
+        "memory": memory,
+    }
+    results = []
+    for count in rows:
+        work_dir = os.path.join(out_dir, "work", str(count))
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            result = _bench_stages(work_dir, count, config)
+            if end_to_end:
+                result["check"] = _bench_check(work_dir, count, config)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        results.append(result)
+    shutil.rmtree(os.path.join(out_dir, "work"), ignore_errors=True)
+
+    payload = wrap_artifact(
+        "bench",
+        {"config": config, "platform": _platform(), "results": results},
+    )
+    if baseline is not None:
+        payload["comparison"] = compare_bench(payload, load_json(baseline))
+    dump_json(os.path.join(out_dir, "bench.json"), payload)
+    return payload
+
+
+def compare_bench(current: dict[str, Any], baseline: dict[str, Any]) -> list[dict[str, Any]]:
+    """Per-stage speedups of ``current`` over ``baseline`` (>1 is faster), by row count."""
+    previous = {result["rows"]: result for result in baseline.get("results", [])}
+    comparison = []
+    for result in current["results"]:
+        before = previous.get(result["rows"])
+        if before is None:
+            continue
+        speedups = {}
+        for name, stage in result["stages"].items():
+            old = before.get("stages", {}).get(name)
+            if old and old["seconds"] and stage["seconds"]:
+                speedups[name] = old["seconds"] / stage["seconds"]
+        old_check, new_check = before.get("check"), result.get("check")
+        if old_check and new_check and new_check["overhead_s"] > 0:
+            speedups["check_overhead"] = old_check["overhead_s"] / new_check["overhead_s"]
+        comparison.append(
+            {
+                "rows": result["rows"],
+                "baseline_version": baseline.get("detllm_version"),
+                "speedup": speedups,
+            }
+        )
+    return comparison
+
+
+def _bench_stages(work_dir: str, count: int, config: dict[str, Any]) -> dict[str, Any]:
+    prompt_file = _write_prompts(work_dir, count)
+    args = _args(config, prompt_file=prompt_file)
+    memory = config["memory"]
+    if memory:
+        tracemalloc.start()
+    clock = _StageClock(memory)
+    schema = load_schema("trace_row") if find_spec("jsonschema") is not None else None
+    skipped = [] if schema is not None else ["validation"]
+    try:
+        with clock.stage("prompt_loading"):
+            prompts = load_prompts(args)
+        plan = plan_batches(prompts)
+        baseline_rows: list[dict[str, Any]] = []
+        paths = []
+        for run in range(2):
+            # Run 1 moves one score of the last prompt, so it is diffed element-wise.
+            backend = _backend(config, perturb=prompts[-1:] if run else ())
+            metrics = RunMetrics(f"run_{run}")
+            comparator = TraceComparator(baseline_rows) if run else None
+            path = os.path.join(work_dir, trace_filename(f"run_{run}", config["trace_format"]))
+            paths.append(path)
+            validated = 0
+            batches = iter_generation(
+                backend, prompts, args, capture_scores=True, plan=plan, metrics=metrics
+            )
+            with TraceWriter(path, trace_format=config["trace_format"]) as writer:
+                while True:
+                    # Batch generation plus row building (prompt and token hashes,
+                    # output digests); backend time is split out below.
+                    with clock.stage("row_build"):
+                        batch = next(batches, None)
+                    if batch is None:
+                        break
+                    batch_indices, batch_rows = batch
+                    with clock.stage("coercion"):
+                        batch_rows = [TokenTraceRow.from_dict(row).to_dict() for row in batch_rows]
+                    sample = batch_rows[: max(0, VALIDATION_SAMPLE - validated)]
+                    if schema is not None and sample:
+                        with clock.stage("validation"):
+                            for row in sample:
+                                validate_json(row, schema)
+                        validated += len(sample)
+                    with clock.stage("trace_write"):
+                        for idx, row in zip(batch_indices, batch_rows, strict=True):
+                            writer.put(idx, row)
+                    if comparator is None:
+                        baseline_rows.extend(batch_rows)
+                        continue
+                    with clock.stage("diff"):
+                        for idx, row in zip(batch_indices, batch_rows, strict=True):
+                            comparator.add(idx, row)
+            generate_s = sum(batch["wall_s"] for batch in metrics.batches)
+            clock.add("generate", generate_s)
+            clock.add("row_build", -generate_s)
+        comparator = baseline_rows = None
+        with clock.stage("trace_read"):
+            for _ in iter_trace(paths[0]):
+                pass
+        with clock.stage("diff_files"):
+            diff_trace_files(paths[0], paths[1])
+    finally:
+        if memory:
+            tracemalloc.stop()
+
+    # Stages over both runs are reported per run, like the single-pass stages.
+    per_run = {"generate", "row_build", "coercion", "validation", "trace_write"}
+    stages = {}
+    for name in BENCH_STAGES:
+        if name not in clock.seconds:
+            continue
+        seconds = clock.seconds[name] / (2 if name in per_run else 1)
+        stage = {"peak_bytes": clock.peak_bytes.get(name)}
+        if name == "validation":
+            sampled = min(count, VALIDATION_SAMPLE)
+            seconds *= count / sampled
+            stage["sampled_rows"] = sampled
+        stage["seconds"] = seconds
+        stage["rows_per_s"] = count / seconds if seconds > 0 else None
+        stages[name] = stage
+    return {
+        "rows": count,
+        "stages": stages,
+        "skipped_stages": skipped,
+        "peak_rss_bytes": peak_rss_bytes(),
+    }
+
+
+def _bench_check(work_dir: str, count: int, config: dict[str, Any]) -> dict[str, Any]:
+    prompts = [_prompt(idx) for idx in range(count)]
+    out = os.path.join(work_dir, "check")
+    start = time.perf_counter()
+    report = api.check(
+        backend="synthetic",
+        model="synthetic",
+        prompts=prompts,
+        tier=2,
+        runs=2,
+        batch_size=config["batch_size"],
+        max_new_tokens=config["new_tokens"],
+        out_dir=out,
+        trace_format=config["trace_format"],
+        backend_adapter=_backend(config),
+    )
+    seconds = time.perf_counter() - start
+    metrics = load_json(os.path.join(out, "metrics.json"))["summary"]
+    overhead = seconds - metrics["generate_s"] - metrics["load_s"]
+    return {
+        "status": report.status,
+        "runs": 2,
+        "seconds": seconds,
+        "generate_s": metrics["generate_s"],
+        "overhead_s": overhead,
+        "overhead_us_per_row": overhead / (2 * count) * 1e6,
+    }
+
+
+def _backend(config: dict[str, Any], perturb: Sequence[str] = ()) -> SyntheticBackend:
+    return SyntheticBackend(
+        prompt_tokens=config["prompt_tokens"],
+        score_size=config["score_size"],
+        perturb=perturb,
+    )
+
+
+def _args(config: dict[str, Any], prompt_file: str) -> argparse.Namespace:
+    return argparse.Namespace(
+        prompt=None,
+        prompt_file=prompt_file,
+        model="synthetic",
+        batch_size=config["batch_size"],
+        max_new_tokens=config["new_tokens"],
+        temperature=0.0,
+        top_p=1.0,
+        top_k=0,
+    )
+
+
+def _prompt(idx: int) -> str:
+    return f"bench prompt {idx}"
+
+
+def _write_prompts(work_dir: str, count: int) -> str:
+    path = os.path.join(work_dir, "prompts.jsonl")
+    with open(path, "w", encoding="utf-8") as handle:
+        for idx in range(count):
+            handle.write(json.dumps({"prompt": _prompt(idx)}))
+            handle.write("\n")
+    return path
+
+
+def _platform() -> dict[str, Any]:
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": find_spec("numpy") is not None,
+        "jsonschema": find_spec("jsonschema") is not None,
+    }
@@ -3,35 +3,89 @@
 from __future__ import annotations
 
 import argparse
-import hashlib
-import json
+from dataclasses import replace
 import os
 import sys
 from typing import Any
 
 from detllm.backends.base import BackendAdapter
-from detllm.backends.hf import HFBackend
-from detllm.backends.vllm import VLLMBackend
+from detllm.backends.pool import BackendKey, BackendPool
+from detllm.backends.registry import load_backend
 from detllm.core.artifacts import (
     dump_json,
     load_json,
     load_schema,
     validate_artifact,
     validate_json,
+    wrap_artifact,
 )
+from detllm.core.batching import BATCHING_STRATEGIES, BatchPlan, plan_batches
 from detllm.core.capabilities import evaluate_capabilities
+from detllm.core.checkpoint import (
+    CHECKPOINT_FILENAME,
+    Checkpoint,
+    CheckpointMismatch,
+    checkpoint_identity,
+)
 from detllm.core.deterministic import DeterministicContext
 from detllm.core.env import capture_env
+from detllm.core.events import ProgressEvent
+from detllm.core.generation import hash_prompt, iter_generation, load_prompts
+from detllm.core.metrics import RunMetrics, summarize_metrics
+from detllm.core.sharding import (
+    SHARD_FILENAME,
+    ShardMergeError,
+    ShardSpec,
+    iter_merged_trace,
+    load_shards,
+    prompt_set_digest,
+    shard_metadata,
+    shard_positions,
+)
+from detllm.core.sink import MemorySink
+from detllm.core.profiling import PROFILE_DIR, PROFILERS, BatchProfiler, profiler_available
 from detllm.core.models import DeterminismAppliedRecord, EnvSnapshot, RunConfig, TokenTraceRow
-from detllm.diff.diff import aggregate_diffs, diff_traces
+from detllm.core.store import ArtifactStore, dump_artifact
+from detllm.core.workers import GenerationOutcome, GenerationTask, run_parallel
+from detllm.diff.analysis import DivergenceAnalyzer
+from detllm.diff.cache import (
+    DEFAULT_MAX_BYTES,
+    DiffCache,
+    cached_diff_trace_files,
+    cached_score_drift_files,
+)
+from detllm.diff.diff import (
+    ALIGN_MODES,
+    DIFF_ENGINES,
+    DiffResult,
+    TraceComparator,
+    aggregate_diffs,
+    diff_trace_stream,
+)
+from detllm.diff.files import diff_trace_files, score_drift_files
+from detllm.diff.tolerance import ScoreDrift, ScoreTolerance
 from detllm.report.render_text import render_report
 from detllm.report.report import Report
-from detllm.trace.io import read_trace, write_trace
-from detllm.version import __version__
+from detllm.trace.io import (
+    TRACE_FORMATS,
+    MemoryTraceWriter,
+    TraceWriter,
+    convert_trace,
+    iter_partial_trace,
+    iter_trace,
+    read_trace,
+    trace_digest,
+    trace_filename,
+)
 from detllm.logging import configure_logging, get_logger
 
 logger = get_logger("cli")
 
+# Report categories after which a check's traces are not a complete result.
+_INCOMPLETE_CATEGORIES = ("UNSUPPORTED_REQUEST", "ENV_MISMATCH")
+# run/check/diff are submitted to this detllm server when set (see ``detllm serve``).
+_SERVER_ENV_VAR = "DETLLM_SERVER"
+
 
 def build_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
@@ -76,6 +130,12 @@ def build_parser() -> argparse.ArgumentParser:
     run_parser.add_argument("--prompt-file", required=False, help="JSONL file of prompts")
     run_parser.add_argument("--tier", type=int, default=1, help="Determinism tier")
     run_parser.add_argument("--batch-size", type=int, default=1, help="Batch size")
+    run_parser.add_argument(
+        "--batching",
+        choices=list(BATCHING_STRATEGIES),
+        default="sequential",
+        help="Batch prompts in file order or grouped by tokenized length",
+    )
     run_parser.add_argument(
         "--seed",
         type=int,
@@ -83,25 +143,42 @@ def build_parser() -> argparse.ArgumentParser:
         help="Seed for determinism controls (defaults to 0 when omitted)",
     )
     run_parser.add_argument("--max-new-tokens", type=int, default=32, help="Max new tokens")
-    run_parser.add_argument(
-        "--temperature", type=float, default=0.0, help="Sampling temperature"
-    )
+    run_parser.add_argument("--temperature", type=float, default=0.0, help="Sampling temperature")
     run_parser.add_argument("--top-p", type=float, default=1.0, help="Top-p nucleus sampling")
-    run_parser.add_argument(
-        "--top-k", type=int, default=0, help="Top-k sampling (0 disables)"
-    )
+    run_parser.add_argument("--top-k", type=int, default=0, help="Top-k sampling (0 disables)")
     run_parser.add_argument("--dtype", default="float32", help="Model dtype")
     run_parser.add_argument("--device", default="cpu", help="Device")
     run_parser.add_argument(
         "--tokenizer-revision", required=False, help="Tokenizer revision or commit hash"
     )
     run_parser.add_argument("--mode", choices=["strict", "best-effort"], default="best-effort")
+    run_parser.add_argument(
+        "--shard",
+        required=False,
+        help="Process only shard i of n (0-based, e.g. 0/4), assigned by prompt_id hash",
+    )
     run_parser.add_argument(
         "--out",
         required=False,
         default="artifacts/run",
         help="Output directory for artifacts",
     )
+    run_parser.add_argument(
+        "--trace-format",
+        choices=list(TRACE_FORMATS),
+        default="jsonl",
+        help="Trace file format (binary traces use the .dtrace suffix)",
+    )
+    run_parser.add_argument(
+        "--trace-index",
+        action="store_true",
+        help="Write a prompt-id index sidecar (<trace>.idx) next to each trace",
+    )
+    run_parser.add_argument(
+        "--artifact-store",
+        required=False,
+        help="Content-addressed store for trace rows and env snapshots (shared across outputs)",
+    )
     run_parser.add_argument(
         "--redact-env",
         action="store_true",
@@ -113,6 +190,24 @@ def build_parser() -> argparse.ArgumentParser:
         default=[],
         help="Environment variable name to redact (repeatable)",
     )
+    run_parser.add_argument(
+        "--profile",
+        choices=list(PROFILERS),
+        required=False,
+        help="Profile sampled generation batches into <out>/profiles",
+    )
+    run_parser.add_argument(
+        "--profile-batches",
+        type=int,
+        default=1,
+        help="Batches profiled per run, from the first (default 1)",
+    )
+    run_parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=30,
+        help="Entries in each profile's top-N summary",
+    )
     run_parser.add_argument(
         "--validate-schema",
         action="store_true",
@@ -126,6 +221,12 @@ def build_parser() -> argparse.ArgumentParser:
     check_parser.add_argument("--prompt-file", required=False, help="JSONL file of prompts")
     check_parser.add_argument("--tier", type=int, default=1, help="Determinism tier")
     check_parser.add_argument("--batch-size", type=int, default=1, help="Batch size")
+    check_parser.add_argument(
+        "--batching",
+        choices=list(BATCHING_STRATEGIES),
+        default="sequential",
+        help="Batch prompts in file order or grouped by tokenized length",
+    )
     check_parser.add_argument("--runs", type=int, default=3, help="Number of runs")
     check_parser.add_argument(
         "--vary-batch",
@@ -134,25 +235,86 @@ def build_parser() -> argparse.ArgumentParser:
     )
     check_parser.add_argument("--seed", type=int, default=0, help="Seed for determinism controls")
     check_parser.add_argument("--max-new-tokens", type=int, default=32, help="Max new tokens")
-    check_parser.add_argument(
-        "--temperature", type=float, default=0.0, help="Sampling temperature"
-    )
+    check_parser.add_argument("--temperature", type=float, default=0.0, help="Sampling temperature")
     check_parser.add_argument("--top-p", type=float, default=1.0, help="Top-p nucleus sampling")
-    check_parser.add_argument(
-        "--top-k", type=int, default=0, help="Top-k sampling (0 disables)"
-    )
+    check_parser.add_argument("--top-k", type=int, default=0, help="Top-k sampling (0 disables)")
     check_parser.add_argument("--dtype", default="float32", help="Model dtype")
     check_parser.add_argument("--device", default="cpu", help="Device")
     check_parser.add_argument(
         "--tokenizer-revision", required=False, help="Tokenizer revision or commit hash"
     )
     check_parser.add_argument("--mode", choices=["strict", "best-effort"], default="best-effort")
+    check_parser.add_argument(
+        "--reload-per-run",
+        action="store_true",
+        help="Load a fresh backend for every run instead of reusing a pooled one",
+    )
+    check_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Worker processes for runs and batch sweeps (1 runs in-process)",
+    )
+    check_parser.add_argument(
+        "--fail-fast",
+        action="store_true",
+        help="Stop at the first divergence from run 0 and write partial traces",
+    )
+    check_parser.add_argument(
+        "--analyze",
+        action="store_true",
+        help="Cluster runs by output and write diffs/divergence_analysis.json",
+    )
+    check_parser.add_argument(
+        "--score-atol",
+        type=float,
+        default=0.0,
+        help="Absolute tolerance for score comparison (default exact)",
+    )
+    check_parser.add_argument(
+        "--score-rtol",
+        type=float,
+        default=0.0,
+        help="Relative tolerance for score comparison, against the left/baseline score",
+    )
+    check_parser.add_argument(
+        "--score-ulps",
+        type=int,
+        default=0,
+        help="Accept scores at most this many ULPs apart",
+    )
+    check_parser.add_argument(
+        "--shard",
+        required=False,
+        help="Process only shard i of n (0-based, e.g. 0/4), assigned by prompt_id hash",
+    )
+    check_parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted check in --out from its checkpoint",
+    )
     check_parser.add_argument(
         "--out",
         required=False,
         default="artifacts/check",
         help="Output directory for artifacts",
     )
+    check_parser.add_argument(
+        "--trace-format",
+        choices=list(TRACE_FORMATS),
+        default="jsonl",
+        help="Trace file format (binary traces use the .dtrace suffix)",
+    )
+    check_parser.add_argument(
+        "--trace-index",
+        action="store_true",
+        help="Write a prompt-id index sidecar (<trace>.idx) next to each trace",
+    )
+    check_parser.add_argument(
+        "--artifact-store",
+        required=False,
+        help="Content-addressed store for trace rows and env snapshots (shared across outputs)",
+    )
     check_parser.add_argument(
         "--redact-env",
         action="store_true",
@@ -164,6 +326,30 @@ def build_parser() -> argparse.ArgumentParser:
         default=[],
         help="Environment variable name to redact (repeatable)",
     )
+    check_parser.add_argument(
+        "--profile",
+        choices=list(PROFILERS),
+        required=False,
+        help="Profile sampled generation batches into <out>/profiles",
+    )
+    check_parser.add_argument(
+        "--profile-runs",
+        type=int,
+        default=1,
+        help="Runs profiled, counting repeats then batch sweeps (default 1)",
+    )
+    check_parser.add_argument(
+        "--profile-batches",
+        type=int,
+        default=1,
+        help="Batches profiled per run, from the first (default 1)",
+    )
+    check_parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=30,
+        help="Entries in each profile's top-N summary",
+    )
     check_parser.add_argument(
         "--validate-schema",
         action="store_true",
@@ -171,8 +357,43 @@ def build_parser() -> argparse.ArgumentParser:
     )
 
     diff_parser = subparsers.add_parser("diff", help="Diff traces and emit a report")
-    diff_parser.add_argument("--left", required=False, help="Left trace file (jsonl)")
-    diff_parser.add_argument("--right", required=False, help="Right trace file (jsonl)")
+    diff_parser.add_argument("--left", required=False, help="Left trace file (jsonl or binary)")
+    diff_parser.add_argument("--right", required=False, help="Right trace file (jsonl or binary)")
+    diff_parser.add_argument(
+        "--align",
+        choices=list(ALIGN_MODES),
+        default="position",
+        help="Pair rows by position or by prompt_id",
+    )
+    diff_parser.add_argument(
+        "--engine",
+        choices=list(DIFF_ENGINES),
+        default="auto",
+        help="Diff implementation (auto uses NumPy for binary traces when installed)",
+    )
+    diff_parser.add_argument(
+        "--score-atol",
+        type=float,
+        default=0.0,
+        help="Absolute tolerance for score comparison (default exact)",
+    )
+    diff_parser.add_argument(
+        "--score-rtol",
+        type=float,
+        default=0.0,
+        help="Relative tolerance for score comparison, against the left/baseline score",
+    )
+    diff_parser.add_argument(
+        "--score-ulps",
+        type=int,
+        default=0,
+        help="Accept scores at most this many ULPs apart",
+    )
+    diff_parser.add_argument(
+        "--score-stats",
+        action="store_true",
+        help="Add score drift statistics over all rows to the report",
+    )
     diff_parser.add_argument(
         "--out",
         required=False,
@@ -189,6 +410,119 @@ def build_parser() -> argparse.ArgumentParser:
         action="store_true",
         help="Print report text to stdout",
     )
+    diff_parser.add_argument(
+        "--cache-dir",
+        required=False,
+        help="Cache diff results and parsed baselines in this directory",
+    )
+    diff_parser.add_argument(
+        "--cache-size-mb",
+        type=int,
+        default=DEFAULT_MAX_BYTES // (1024 * 1024),
+        help="Evict least recently used cache entries beyond this size",
+    )
+    convert_parser = subparsers.add_parser(
+        "convert", help="Convert a trace between jsonl and binary formats"
+    )
+    convert_parser.add_argument("--in", dest="trace_in", required=False, help="Input trace")
+    convert_parser.add_argument("--out", required=False, help="Output trace path")
+    convert_parser.add_argument(
+        "--to",
+        choices=list(TRACE_FORMATS),
+        required=False,
+        help="Target format (defaults to binary for .dtrace outputs, else jsonl)",
+    )
+    convert_parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Also write a prompt-id index sidecar for the output trace",
+    )
+
+    merge_parser = subparsers.add_parser(
+        "merge", help="Merge sharded run/check outputs into one result"
+    )
+    merge_parser.add_argument(
+        "--in",
+        dest="shard_dirs",
+        action="append",
+        default=[],
+        help="Shard output directory (repeat once per shard)",
+    )
+    merge_parser.add_argument(
+        "--out",
+        required=False,
+        default="artifacts/merged",
+        help="Output directory for the merged artifacts",
+    )
+    merge_parser.add_argument(
+        "--trace-format",
+        choices=list(TRACE_FORMATS),
+        required=False,
+        help="Merged trace format (defaults to the shards' format)",
+    )
+    merge_parser.add_argument(
+        "--artifact-store",
+        required=False,
+        help="Content-addressed store for merged manifest traces",
+    )
+    merge_parser.add_argument(
+        "--analyze",
+        action="store_true",
+        help="Cluster merged runs by output and write diffs/divergence_analysis.json",
+    )
+    merge_parser.add_argument(
+        "--validate-schema",
+        action="store_true",
+        help="Validate output artifacts against schemas",
+    )
+
+    bench_parser = subparsers.add_parser(
+        "bench", help="Measure detLLM pipeline overhead with a synthetic backend"
+    )
+    bench_parser.add_argument(
+        "--rows",
+        default="1000,100000",
+        help="Comma-separated row counts to benchmark (e.g. 1000,100000,1000000)",
+    )
+    bench_parser.add_argument(
+        "--prompt-tokens", type=int, default=16, help="Prompt length in tokens"
+    )
+    bench_parser.add_argument("--new-tokens", type=int, default=32, help="Generated tokens per row")
+    bench_parser.add_argument(
+        "--score-size",
+        type=int,
+        required=False,
+        help="Scores per row (defaults to one per generated token; 0 disables)",
+    )
+    bench_parser.add_argument("--batch-size", type=int, default=64, help="Batch size")
+    bench_parser.add_argument(
+        "--trace-format",
+        choices=list(TRACE_FORMATS),
+        default="jsonl",
+        help="Trace file format",
+    )
+    bench_parser.add_argument(
+        "--memory",
+        action="store_true",
+        help="Trace peak memory per stage (slows every stage)",
+    )
+    bench_parser.add_argument(
+        "--skip-check",
+        action="store_true",
+        help="Skip the end-to-end check measurement",
+    )
+    bench_parser.add_argument(
+        "--baseline",
+        required=False,
+        help="Earlier bench.json to compute per-stage speedups against",
+    )
+    bench_parser.add_argument(
+        "--out",
+        required=False,
+        default="artifacts/bench",
+        help="Output directory for bench.json",
+    )
+
     report_parser = subparsers.add_parser("report", help="Render report artifacts")
     report_parser.add_argument("--in", dest="report_in", required=False, help="Input report.json")
     report_parser.add_argument(
@@ -203,6 +537,61 @@ def build_parser() -> argparse.ArgumentParser:
         help="Validate report.json against schema",
     )
 
+    matrix_parser = subparsers.add_parser(
+        "matrix", help="Run checks over a cross product of options, grouped by loaded model"
+    )
+    matrix_parser.add_argument(
+        "--spec", required=False, help="JSON or TOML spec with base options and matrix axes"
+    )
+    matrix_parser.add_argument(
+        "--out",
+        required=False,
+        default="artifacts/matrix",
+        help="Output directory for matrix.json and cells/<id>",
+    )
+    matrix_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Write the planned cell order to matrix.json without running it",
+    )
+    matrix_parser.add_argument(
+        "--validate-schema",
+        action="store_true",
+        help="Validate output artifacts against schemas",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Keep backends loaded and execute run/check/diff jobs from clients"
+    )
+    serve_parser.add_argument(
+        "--port", type=int, required=False, help="Localhost HTTP port to listen on (default 8765)"
+    )
+    serve_parser.add_argument(
+        "--socket", required=False, help="Listen on this Unix socket instead of HTTP"
+    )
+    serve_parser.add_argument(
+        "--jobs", type=int, default=1, help="Jobs executed concurrently (generation is serialized)"
+    )
+    serve_parser.add_argument(
+        "--queue-size", type=int, default=64, help="Queued jobs before submissions are refused"
+    )
+    serve_parser.add_argument(
+        "--max-backends", type=int, default=1, help="Loaded backends kept warm (LRU)"
+    )
+    serve_parser.add_argument(
+        "--pool-max-bytes",
+        type=int,
+        default=None,
+        help="Memory budget of the warm backends; least recently used ones are unloaded past it",
+    )
+
+    for served_parser in (run_parser, check_parser, diff_parser):
+        served_parser.add_argument(
+            "--server",
+            required=False,
+            help=f"Submit to a detllm server (unix:PATH or host:port; default ${_SERVER_ENV_VAR})",
+        )
+
     return parser
 
 
@@ -211,6 +600,43 @@ def main(argv: list[str] | None = None) -> int:
     args = parser.parse_args(argv)
     configure_logging(verbose=getattr(args, "verbose", False), quiet=getattr(args, "quiet", False))
 
+    # Only the commands a server executes have --server.
+    server = None
+    if hasattr(args, "server"):
+        server = args.server or os.environ.get(_SERVER_ENV_VAR)
+    if server:
+        from detllm.serve import submit_job
+
+        try:
+            job = submit_job(server, sys.argv[1:] if argv is None else argv)
+        except RuntimeError as exc:
+            logger.error("%s", exc)
+            return 2
+        if job is not None:
+            return _finish_submitted(args, job)
+    return _dispatch(parser, args)
+
+
+def _finish_submitted(args: argparse.Namespace, job: dict[str, Any]) -> int:
+    if job["status"] == "failed":
+        logger.error("Job %s failed: %s", job["id"], job["error"])
+        return job["exit_code"]
+    report = job["report"]
+    if report is not None:
+        logger.info("Job %s: %s (%s)", job["id"], report["status"], report["category"])
+    logger.info("Wrote %s artifacts to %s", args.command, job["out"])
+    if args.command == "diff" and args.report:
+        with open(os.path.join(job["out"], "report.txt"), "r", encoding="utf-8") as handle:
+            print(handle.read(), end="")
+    return job["exit_code"]
+
+
+def _dispatch(
+    parser: argparse.ArgumentParser,
+    args: argparse.Namespace,
+    pool: BackendPool | None = None,
+) -> int:
+    """Execute a parsed command; ``pool`` holds backends kept warm across calls (``serve``)."""
     if args.command == "env":
         snapshot = capture_env(**_redact_kwargs(args))
         env_payload = _coerce_env(snapshot)
@@ -223,8 +649,16 @@ def main(argv: list[str] | None = None) -> int:
     if args.command == "run":
         if not args.model:
             parser.error("--model is required for run")
-
-        prompts = _load_prompts(args)
+        if args.artifact_store and args.trace_format == "binary":
+            parser.error("--artifact-store cannot be combined with --trace-format binary")
+        _check_profile_args(args, parser)
+        if args.shard:
+            try:
+                ShardSpec.parse(args.shard)
+            except ValueError as exc:
+                parser.error(str(exc))
+
+        prompts = load_prompts(args)
         if not prompts:
             parser.error("Prompt input is required via --prompt or --prompt-file")
 
@@ -233,195 +667,33 @@ def main(argv: list[str] | None = None) -> int:
         env_payload = _coerce_env(env_snapshot)
         if args.validate_schema:
             validate_artifact(env_payload)
-        dump_json(os.path.join(args.out, "env.json"), env_payload)
+        dump_artifact(os.path.join(args.out, "env.json"), env_payload, _artifact_store(args))
         logger.info("Running detllm run; output=%s", args.out)
 
-        with DeterministicContext(args.tier, args.mode, args.seed) as ctx:
-            backend = _build_backend(args)
-            decision = evaluate_capabilities(ctx.applied, backend.capabilities(), args.tier, args.mode)
-            if not decision.supported:
-                _write_unsupported(
-                    args.out,
-                    args.runs if hasattr(args, "runs") else 1,
-                    decision,
-                    validate_schema=args.validate_schema,
-                )
-                dump_json(
-                    os.path.join(args.out, "determinism_applied.json"),
-                    _coerce_determinism(ctx.applied.to_dict()),
-                )
-                return 2
-            trace_rows = _run_generation(
-                backend, prompts, args, capture_scores=ctx.applied.tier_effective >= 2
-            )
-
-        determinism_payload = _coerce_determinism(ctx.applied.to_dict())
-        if args.validate_schema:
-            validate_artifact(determinism_payload)
-        dump_json(os.path.join(args.out, "determinism_applied.json"), determinism_payload)
-        run_config = _build_run_config(
-            args,
-            env_snapshot.get("device"),
-            ctx.applied.tier_effective,
-            _parse_vary_batch(getattr(args, "vary_batch", None)),
-        )
-        run_config = _coerce_run_config(run_config)
-        if args.validate_schema:
-            validate_artifact(run_config)
-        dump_json(os.path.join(args.out, "run_config.json"), run_config)
-        write_trace(
-            os.path.join(args.out, "trace.jsonl"),
-            _coerce_trace_rows(trace_rows),
-            validate_rows=args.validate_schema,
-        )
+        report = _execute_run(args, prompts, env_snapshot, pool=pool)
+        if report.category == "UNSUPPORTED_REQUEST":
+            return 2
         logger.info("Wrote run artifacts to %s", args.out)
         return 0
 
     if args.command == "check":
-        if not args.model:
-            parser.error("--model is required for check")
-
-        prompts = _load_prompts(args)
-        if not prompts:
-            parser.error("Prompt input is required via --prompt or --prompt-file")
+        prompts, vary_batch_sizes = _validate_check_args(parser, args)
 
         os.makedirs(args.out, exist_ok=True)
         env_snapshot = capture_env(**_redact_kwargs(args))
         env_payload = _coerce_env(env_snapshot)
         if args.validate_schema:
             validate_artifact(env_payload)
-        dump_json(os.path.join(args.out, "env.json"), env_payload)
+        dump_artifact(os.path.join(args.out, "env.json"), env_payload, _artifact_store(args))
         logger.info("Running detllm check; output=%s runs=%s", args.out, args.runs)
 
-        vary_batch_sizes = _parse_vary_batch(args.vary_batch)
-        run_config = _build_run_config(
-            args,
-            env_snapshot.get("device"),
-            tier_effective=args.tier,
-            vary_batch=vary_batch_sizes,
-        )
-        run_config = _coerce_run_config(run_config)
-        if args.validate_schema:
-            validate_artifact(run_config)
-        dump_json(os.path.join(args.out, "run_config.json"), run_config)
-
-        traces: list[list[dict[str, Any]]] = []
-        determinism_rows: list[dict[str, Any]] = []
-        baseline_fingerprint = env_snapshot.get("fingerprint")
-        # TODO: Consider reusing the backend per run for speed; per-run reloads isolate state.
-        for run_idx in range(args.runs):
-            env_run = capture_env(**_redact_kwargs(args))
-            env_payload = _coerce_env(env_run)
-            env_path = os.path.join(args.out, "envs", f"run_{run_idx}.json")
-            os.makedirs(os.path.dirname(env_path), exist_ok=True)
-            if args.validate_schema:
-                validate_artifact(env_payload)
-            dump_json(env_path, env_payload)
-            if baseline_fingerprint and env_payload.get("fingerprint") != baseline_fingerprint:
-                _write_env_mismatch(
-                    args.out,
-                    args.runs,
-                    run_idx,
-                    baseline_fingerprint,
-                    env_payload,
-                    validate_schema=args.validate_schema,
-                )
-                return 0
-            with DeterministicContext(args.tier, args.mode, args.seed) as ctx:
-                backend = _build_backend(args)
-                decision = evaluate_capabilities(
-                    ctx.applied, backend.capabilities(), args.tier, args.mode
-                )
-                if not decision.supported:
-                    _write_unsupported(
-                        args.out,
-                        args.runs,
-                        decision,
-                        validate_schema=args.validate_schema,
-                    )
-                    dump_json(
-                        os.path.join(args.out, "determinism_applied.json"),
-                        _coerce_determinism(ctx.applied.to_dict()),
-                    )
-                    return 2
-                trace_rows = _run_generation(
-                    backend, prompts, args, capture_scores=ctx.applied.tier_effective >= 2
-                )
-
-            traces.append(trace_rows)
-            determinism_rows.append(_coerce_determinism(ctx.applied.to_dict()))
-            trace_path = os.path.join(args.out, "traces", f"run_{run_idx}.jsonl")
-            os.makedirs(os.path.dirname(trace_path), exist_ok=True)
-            write_trace(
-                trace_path,
-                _coerce_trace_rows(trace_rows),
-                validate_rows=args.validate_schema,
-            )
-
-        # Determinism controls are expected to be stable across runs; record first run only.
-        if args.validate_schema:
-            validate_artifact(determinism_rows[0])
-        dump_json(os.path.join(args.out, "determinism_applied.json"), determinism_rows[0])
-
-        diffs = [
-            diff_traces(traces[0], traces[i]) for i in range(1, len(traces))
-        ]
-        result = aggregate_diffs(diffs)
-
-        batch_result = None
-        batch_traces: dict[int, list[dict[str, Any]]] = {}
-        batch_diffs: list[tuple[int, Any]] = []
-        if vary_batch_sizes:
-            for batch_size in vary_batch_sizes:
-                batch_args = _clone_args(args, batch_size=batch_size)
-                with DeterministicContext(args.tier, args.mode, args.seed) as ctx:
-                    backend = _build_backend(batch_args)
-                    trace_rows = _run_generation(
-                        backend,
-                        prompts,
-                        batch_args,
-                        capture_scores=ctx.applied.tier_effective >= 2,
-                    )
-                batch_traces[batch_size] = trace_rows
-                trace_path = os.path.join(args.out, "traces", f"batch_{batch_size}.jsonl")
-                write_trace(
-                    trace_path,
-                    _coerce_trace_rows(trace_rows),
-                    validate_rows=args.validate_schema,
-                )
-
-            # Compare against the baseline (fixed batch) trace only, not pairwise.
-            batch_diffs = [
-                (size, diff_traces(traces[0], batch_traces[size]))
-                for size in vary_batch_sizes
-            ]
-            batch_result = aggregate_diffs([diff for _, diff in batch_diffs])
-
-        report = Report(
-            status=_report_status(result, batch_result),
-            category=_report_category(result, batch_result),
-            details={
-                "runs": args.runs,
-                "batch_sizes": vary_batch_sizes,
-                "first_divergence": _report_divergence(result, batch_result),
-                "batch_divergence": _batch_divergence_detail(batch_diffs, result),
-                "baseline_batch_size": args.batch_size,
-            },
-        )
-        report_payload = _wrap_artifact("report", report.to_dict())
-        if args.validate_schema:
-            validate_artifact(report_payload)
-        dump_json(os.path.join(args.out, "report.json"), report_payload)
-        report_text = render_report(report)
-        with open(os.path.join(args.out, "report.txt"), "w", encoding="utf-8") as handle:
-            handle.write(report_text)
-
-        if _report_divergence(result, batch_result) is not None:
-            diff_path = os.path.join(args.out, "diffs", "first_divergence.json")
-            dump_json(
-                diff_path,
-                _wrap_artifact("first_divergence", _report_divergence(result, batch_result)),
-            )
+        try:
+            report = _run_check(args, prompts, vary_batch_sizes, env_snapshot, pool=pool)
+        except CheckpointMismatch as exc:
+            logger.error("Cannot resume: %s", exc)
+            return 2
+        if report.category == "UNSUPPORTED_REQUEST":
+            return 2
         logger.info("Wrote check artifacts to %s", args.out)
 
         return 0
@@ -431,18 +703,45 @@ def main(argv: list[str] | None = None) -> int:
             parser.error("--left and --right are required for diff")
 
         os.makedirs(args.out, exist_ok=True)
-        left_trace = read_trace(args.left)
-        right_trace = read_trace(args.right)
-        result = diff_traces(left_trace, right_trace)
+        tolerance = _score_tolerance(args, parser)
+        cache = (
+            DiffCache(args.cache_dir, max_bytes=args.cache_size_mb * 1024 * 1024)
+            if args.cache_dir
+            else None
+        )
+        if cache is not None:
+            result = cached_diff_trace_files(
+                cache,
+                args.left,
+                args.right,
+                align=args.align,
+                engine=args.engine,
+                tolerance=tolerance,
+            )
+        else:
+            result = diff_trace_files(
+                args.left, args.right, align=args.align, engine=args.engine, tolerance=tolerance
+            )
 
-        report = Report(
-            status=result.status,
-            category=result.category,
-            details={
-                "first_divergence": result.first_divergence,
-            },
+        details: dict[str, Any] = {"first_divergence": result.first_divergence}
+        if args.align != "position":
+            details["align"] = args.align
+        if not tolerance.exact:
+            details["score_tolerance"] = tolerance.to_dict()
+        # Traces of different lengths have no positional pairing to measure drift over.
+        score_stats = args.score_stats and not (
+            args.align == "position" and "left_len" in (result.first_divergence or {})
         )
-        report_payload = _wrap_artifact("report", report.to_dict())
+        if score_stats and cache is not None:
+            details["score_drift"] = cached_score_drift_files(
+                cache, args.left, args.right, align=args.align, tolerance=tolerance
+            )
+        elif score_stats:
+            details["score_drift"] = score_drift_files(
+                args.left, args.right, align=args.align, tolerance=tolerance
+            )
+        report = Report(status=result.status, category=result.category, details=details)
+        report_payload = wrap_artifact("report", report.to_dict())
         if args.validate_schema:
             validate_artifact(report_payload)
         dump_json(os.path.join(args.out, "report.json"), report_payload)
@@ -457,10 +756,116 @@ def main(argv: list[str] | None = None) -> int:
             diff_path = os.path.join(args.out, "diffs", "first_divergence.json")
             dump_json(
                 diff_path,
-                _wrap_artifact("first_divergence", result.first_divergence),
+                wrap_artifact("first_divergence", result.first_divergence),
             )
         return 0
 
+    if args.command == "convert":
+        if not args.trace_in or not args.out:
+            parser.error("--in and --out are required for convert")
+
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        trace_format = convert_trace(args.trace_in, args.out, args.to, index=args.index)
+        logger.info("Wrote %s trace to %s", trace_format, args.out)
+        return 0
+
+    if args.command == "merge":
+        if not args.shard_dirs:
+            parser.error("--in is required for merge (once per shard)")
+        if args.artifact_store and args.trace_format == "binary":
+            parser.error("--artifact-store cannot be combined with --trace-format binary")
+
+        os.makedirs(args.out, exist_ok=True)
+        try:
+            report = _execute_merge(args)
+        except ShardMergeError as exc:
+            logger.error("Cannot merge shards: %s", exc)
+            return 2
+        logger.info("Wrote merged artifacts to %s", args.out)
+        return 0 if report is None or report.category != "UNSUPPORTED_REQUEST" else 2
+
+    if args.command == "bench":
+        try:
+            rows = [int(item) for item in args.rows.split(",") if item.strip()]
+        except ValueError:
+            parser.error("--rows must be comma-separated integers")
+        if not rows or min(rows) < 1:
+            parser.error("--rows must be positive")
+        from detllm.bench import run_bench
+
+        payload = run_bench(
+            args.out,
+            rows=rows,
+            prompt_tokens=args.prompt_tokens,
+            new_tokens=args.new_tokens,
+            score_size=args.score_size,
+            batch_size=args.batch_size,
+            trace_format=args.trace_format,
+            memory=args.memory,
+            end_to_end=not args.skip_check,
+            baseline=args.baseline,
+        )
+        for result in payload["results"]:
+            for name, stage in result["stages"].items():
+                logger.info("%s rows %s: %.3fs", result["rows"], name, stage["seconds"])
+            if "check" in result:
+                logger.info(
+                    "%s rows check overhead: %.3fs", result["rows"], result["check"]["overhead_s"]
+                )
+        logger.info("Wrote bench results to %s", os.path.join(args.out, "bench.json"))
+        return 0
+
+    if args.command == "matrix":
+        if not args.spec:
+            parser.error("--spec is required for matrix")
+        from detllm.matrix import MATRIX_FILENAME, load_spec, run_matrix
+
+        try:
+            payload = run_matrix(
+                load_spec(args.spec),
+                args.out,
+                dry_run=args.dry_run,
+                validate_schema=args.validate_schema,
+            )
+        except ValueError as exc:
+            logger.error("Invalid matrix spec: %s", exc)
+            return 2
+        for cell in payload["cells"]:
+            logger.info("%s %s: %s", cell["id"], cell["params"], cell["status"])
+        logger.info(
+            "Wrote %s cells (%s backend loads) to %s",
+            payload["summary"]["cells"],
+            payload["backend_loads"],
+            os.path.join(args.out, MATRIX_FILENAME),
+        )
+        return 1 if payload["summary"]["statuses"].get("ERROR") else 0
+
+    if args.command == "serve":
+        if args.jobs < 1 or args.queue_size < 1 or args.max_backends < 1:
+            parser.error("--jobs, --queue-size and --max-backends must be at least 1")
+        if args.pool_max_bytes is not None and args.pool_max_bytes < 1:
+            parser.error("--pool-max-bytes must be at least 1")
+        from detllm.serve import JobServer
+
+        if args.socket:
+            address = f"unix:{args.socket}"
+        else:
+            address = f"127.0.0.1:{args.port}" if args.port else None
+        job_server = JobServer(
+            address,
+            jobs=args.jobs,
+            queue_size=args.queue_size,
+            max_backends=args.max_backends,
+            pool_max_bytes=args.pool_max_bytes,
+        )
+        try:
+            job_server.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("Shutting down")
+        finally:
+            job_server.shutdown()
+        return 0
+
     if args.command == "report":
         if not args.report_in:
             parser.error("--in is required for report")
@@ -483,46 +888,839 @@ def main(argv: list[str] | None = None) -> int:
     return 0
 
 
-def _load_prompts(args: argparse.Namespace) -> list[str]:
-    if args.prompt:
-        return [args.prompt]
-
-    if args.prompt_file:
-        prompts: list[str] = []
-        with open(args.prompt_file, "r", encoding="utf-8") as handle:
-            for line in handle:
-                if not line.strip():
-                    continue
-                data = json.loads(line)
-                if isinstance(data, str):
-                    prompts.append(data)
-                elif isinstance(data, dict):
-                    prompt = data.get("prompt") or data.get("text")
-                    if prompt is None:
-                        raise ValueError("Prompt file entries must include 'prompt' or 'text'")
-                    prompts.append(prompt)
-                else:
-                    raise ValueError("Prompt file entries must be JSON objects or strings")
-        return prompts
+def _validate_check_args(
+    parser: argparse.ArgumentParser, args: argparse.Namespace
+) -> tuple[list[str], list[int]]:
+    """Reject invalid ``check`` options via ``parser.error``; returns prompts and sweep sizes."""
+    if not args.model:
+        parser.error("--model is required for check")
+    if args.artifact_store and args.trace_format == "binary":
+        parser.error("--artifact-store cannot be combined with --trace-format binary")
+    _check_profile_args(args, parser)
+    if args.shard:
+        try:
+            ShardSpec.parse(args.shard)
+        except ValueError as exc:
+            parser.error(str(exc))
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    try:
+        vary_batch_sizes = _parse_vary_batch(args.vary_batch)
+    except ValueError as exc:
+        parser.error(f"--vary-batch: {exc}")
+    _score_tolerance(args, parser)
 
-    return []
+    prompts = load_prompts(args)
+    if not prompts:
+        parser.error("Prompt input is required via --prompt or --prompt-file")
+    return prompts, vary_batch_sizes
 
 
 def _build_backend(args: argparse.Namespace) -> BackendAdapter:
-    if args.backend == "hf":
-        return HFBackend(args.model, device=args.device, dtype=args.dtype)
+    backend_cls = load_backend(args.backend)
     if args.backend == "vllm":
-        return VLLMBackend(args.model)
-    raise ValueError(f"Unsupported backend: {args.backend}")
+        return backend_cls(args.model)
+    return backend_cls(args.model, device=args.device, dtype=args.dtype)
+
+
+def _acquire_backend(
+    args: argparse.Namespace,
+    pool: BackendPool | None,
+    backend_adapter: BackendAdapter | None = None,
+) -> BackendAdapter:
+    if backend_adapter is not None:
+        return backend_adapter
+    if pool is None:
+        return _build_backend(args)
+    return pool.acquire(BackendKey.from_args(args), lambda: _build_backend(args))
+
+
+def _backend_strategy(args: argparse.Namespace, backend_adapter: BackendAdapter | None) -> str:
+    if backend_adapter is not None:
+        return "adapter"
+    if getattr(args, "reload_per_run", False):
+        return "reload_per_run"
+    return "pooled"
+
+
+def _run_check(
+    args: argparse.Namespace,
+    prompts: list[str],
+    vary_batch_sizes: list[int],
+    env_snapshot: dict[str, Any],
+    backend_adapter: BackendAdapter | None = None,
+    pool: BackendPool | None = None,
+) -> Report:
+    """Check ``prompts``; a given ``pool`` is shared with other calls and left loaded."""
+    prompts, sharding = _apply_shard(args, prompts)
+    strategy = _backend_strategy(args, backend_adapter)
+    shared_pool = pool if strategy == "pooled" else None
+    pool = shared_pool or (BackendPool() if strategy == "pooled" else None)
+    try:
+        plan = _plan_generation(args, prompts, pool, backend_adapter)
+        run_config = _build_run_config(
+            args,
+            env_snapshot.get("device"),
+            tier_effective=args.tier,
+            vary_batch=vary_batch_sizes,
+            batch_plan=plan,
+        )
+        run_config = _coerce_run_config(run_config)
+        if args.validate_schema:
+            validate_artifact(run_config)
+        # In-memory checks cannot be resumed, so they keep no checkpoint.
+        checkpoint = None
+        if _sink(args) is None:
+            checkpoint = _open_checkpoint(args, run_config, env_snapshot, prompts)
+        _write_json(args, os.path.join(args.out, "run_config.json"), run_config)
+        report = _execute_check(
+            args,
+            prompts,
+            vary_batch_sizes,
+            env_snapshot,
+            strategy,
+            pool,
+            backend_adapter,
+            plan,
+            checkpoint,
+        )
+        if sharding is not None:
+            tasks = [GenerationTask("run", idx, args.batch_size) for idx in range(args.runs)]
+            tasks.extend(GenerationTask("batch", size, size) for size in vary_batch_sizes)
+            aborted = (report.details.get("fail_fast") or {}).get("aborted")
+            _write_shard(
+                args,
+                "check",
+                sharding,
+                {task.label: _task_trace_path(args, task) for task in tasks},
+                complete=report.category not in _INCOMPLETE_CATEGORIES and not aborted,
+            )
+        _emit(args, "finished", None, status=report.status, category=report.category)
+        return report
+    finally:
+        if pool is not None and pool is not shared_pool:
+            pool.clear()
+
+
+def _execute_check(
+    args: argparse.Namespace,
+    prompts: list[str],
+    vary_batch_sizes: list[int],
+    env_snapshot: dict[str, Any],
+    strategy: str,
+    pool: BackendPool | None,
+    backend_adapter: BackendAdapter | None,
+    plan: BatchPlan,
+    checkpoint: Checkpoint | None = None,
+) -> Report:
+    baseline_fingerprint = env_snapshot.get("fingerprint")
+    # A shared pool may already hold the backend; count this check's loads only.
+    initial_loads = pool.loads if pool is not None else 0
+    workers = getattr(args, "workers", 1) or 1
+    fail_fast = getattr(args, "fail_fast", False)
+    tasks = [GenerationTask("run", run_idx, args.batch_size) for run_idx in range(args.runs)]
+    tasks.extend(GenerationTask("batch", size, size) for size in vary_batch_sizes)
+    if getattr(args, "profile", None):
+        # Sample the first tasks in order: repeats, then batch sweeps.
+        tasks = [
+            replace(task, profile=position < args.profile_runs)
+            for position, task in enumerate(tasks)
+        ]
+    # Completed tasks of a resumed check are read back; the rest continue their partial traces.
+    restored: dict[str, GenerationOutcome] = {}
+    if checkpoint is not None and checkpoint.resumed:
+        restored = _restored_outcomes(args, tasks, checkpoint)
+        tasks = [replace(task, resume=task.label not in restored) for task in tasks]
+        logger.info("Resuming check: %s of %s tasks complete", len(restored), len(tasks))
+
+    # Only the baseline trace stays resident; every other task is compared as it streams.
+    baseline: list[list[dict[str, Any]]] = []
+    tolerance = _score_tolerance(args)
+    # Score drift of every repeat run against run 0, gathered while comparing.
+    drift = ScoreDrift(tolerance)
+
+    def sequential_outcomes():
+        for task in tasks:
+            if task.label in restored:
+                yield restored[task.label]
+                continue
+            is_baseline = task.kind == "run" and task.index == 0
+            yield _generate_task(
+                args,
+                prompts,
+                task,
+                baseline_fingerprint,
+                plan,
+                pool=pool,
+                backend_adapter=backend_adapter,
+                capture_task_env=task.kind == "run",
+                baseline_rows=None if is_baseline else baseline[0],
+                keep_rows=is_baseline,
+                tolerance=tolerance,
+                drift=drift if task.kind == "run" else None,
+                checkpoint=checkpoint,
+            )
+
+    def parallel_outcomes():
+        pending = [task for task in tasks if task.label not in restored]
+        generated = run_parallel(
+            args, prompts, pending, workers, baseline_fingerprint, plan, backend_adapter
+        )
+        try:
+            for task in tasks:
+                yield restored[task.label] if task.label in restored else next(generated)
+        finally:
+            generated.close()
+
+    if workers > 1:
+        outcomes = parallel_outcomes()
+    else:
+        outcomes = sequential_outcomes()
+
+    determinism_rows: list[dict[str, Any]] = []
+    diffs: list[DiffResult] = []
+    batch_diffs: list[tuple[int, Any]] = []
+    written: list[tuple[str, str]] = []
+    run_metrics: list[dict[str, Any]] = []
+    profiles: list[dict[str, Any]] = []
+    aborted: dict[str, Any] | None = None
+    # Looked up once; every other trace is matched against it before a row diff.
+    baseline_digest: str | None = None
+    try:
+        for outcome in outcomes:
+            task = outcome.task
+            if outcome.env is not None:
+                env_path = os.path.join(args.out, "envs", f"{task.kind}_{task.index}.json")
+                if args.validate_schema:
+                    validate_artifact(outcome.env)
+                _write_env(args, env_path, outcome.env)
+                _emit(args, "artifact_written", task.label, path=env_path)
+            if outcome.env_mismatch:
+                return _write_env_mismatch(
+                    args,
+                    args.runs,
+                    task.index if task.kind == "run" else None,
+                    baseline_fingerprint,
+                    outcome.env,
+                    validate_schema=args.validate_schema,
+                    batch_size=task.index if task.kind == "batch" else None,
+                )
+            if outcome.decision is not None and not outcome.decision.supported:
+                report = _write_unsupported(
+                    args,
+                    args.runs,
+                    outcome.decision,
+                    validate_schema=args.validate_schema,
+                )
+                _write_json(
+                    args, os.path.join(args.out, "determinism_applied.json"), outcome.determinism
+                )
+                return report
+
+            if task.kind == "run":
+                determinism_rows.append(outcome.determinism)
+            written.append((task.label, outcome.trace_path))
+            if outcome.metrics is not None:
+                run_metrics.append(outcome.metrics)
+            if checkpoint is not None and task.label not in restored:
+                # Metrics first: a resume reads completed tasks' metrics back from the file.
+                _write_metrics(args, run_metrics)
+                checkpoint.record(
+                    task.label,
+                    "complete",
+                    outcome.rows_written,
+                    trace=os.path.relpath(outcome.trace_path, args.out),
+                    determinism=outcome.determinism,
+                )
+            if outcome.profile is not None:
+                profiles.append(outcome.profile)
+            _emit(args, "artifact_written", task.label, path=outcome.trace_path)
+            if task.kind == "run" and task.index == 0:
+                if outcome.rows is not None:
+                    baseline.append(outcome.rows)
+                else:
+                    # Worker processes stream to disk; load the baseline once for comparison.
+                    baseline.append(read_trace(outcome.trace_path))
+                baseline_digest = trace_digest(outcome.trace_path)
+                _emit(args, "run_finished", task.label, rows=outcome.rows_written, status=None)
+                continue
+            diff = outcome.divergence
+            task_drift = drift if task.kind == "run" else None
+            same_rows = baseline_digest is not None and baseline_digest == trace_digest(
+                outcome.trace_path
+            )
+            if diff is None and same_rows:
+                diff = DiffResult(status="PASS", category="PASS", first_divergence=None)
+                if task_drift is not None:
+                    task_drift.add_equal_rows(baseline[0])
+            if diff is None:
+                diff = diff_trace_stream(
+                    baseline[0],
+                    iter_trace(outcome.trace_path),
+                    tolerance,
+                    drift=task_drift,
+                    label=task.label,
+                )
+            if task.kind == "run":
+                diffs.append(diff)
+            else:
+                batch_diffs.append((task.index, diff))
+            if diff.status != "PASS":
+                _emit(
+                    args,
+                    "divergence",
+                    task.label,
+                    status=diff.status,
+                    first_divergence=diff.first_divergence,
+                )
+            _emit(args, "run_finished", task.label, rows=outcome.rows_written, status=diff.status)
+            if fail_fast and diff.status != "PASS":
+                aborted = {
+                    "task": task.label,
+                    "rows_generated": outcome.rows_written,
+                    "rows_total": len(prompts),
+                }
+                logger.info("Fail-fast: divergence in %s; skipping remaining work", task.label)
+                break
+    finally:
+        close = getattr(outcomes, "close", None)
+        if close is not None:
+            close()
+
+    # Determinism controls are expected to be stable across runs; record first run only.
+    if args.validate_schema:
+        validate_artifact(determinism_rows[0])
+    _write_json(args, os.path.join(args.out, "determinism_applied.json"), determinism_rows[0])
+
+    details = {
+        "backend_strategy": strategy,
+        # Loads happen inside worker processes when fanning out.
+        "backend_loads": None
+        if workers > 1
+        else _backend_loads(strategy, pool, args.runs, vary_batch_sizes) - initial_loads,
+        "workers": workers,
+    }
+    if fail_fast:
+        details["fail_fast"] = {"aborted": aborted}
+    if not tolerance.exact:
+        details["score_tolerance"] = tolerance.to_dict()
+    if drift.values_compared:
+        details["score_drift"] = drift.to_dict()
+    if run_metrics:
+        details["metrics"] = _write_metrics(args, run_metrics)
+    if profiles:
+        details["profile"] = {"profiler": args.profile, "runs": profiles}
+    return _write_check_report(
+        args, args.runs, args.batch_size, vary_batch_sizes, diffs, batch_diffs, written, details
+    )
 
 
-def _hash_prompt(prompt: str) -> str:
-    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+def _open_checkpoint(
+    args: argparse.Namespace,
+    run_config: dict[str, Any],
+    env_snapshot: dict[str, Any],
+    prompts: list[str],
+) -> Checkpoint:
+    """Start this check's checkpoint, or load and validate it for ``--resume``."""
+    identity = checkpoint_identity(
+        run_config,
+        env_snapshot.get("fingerprint"),
+        prompt_set_digest([hash_prompt(prompt) for prompt in prompts]),
+        {
+            "runs": args.runs,
+            "seed": args.seed,
+            "trace_format": _trace_format(args),
+            "fail_fast": getattr(args, "fail_fast", False),
+            "score_tolerance": _score_tolerance(args).to_dict(),
+            "shard": getattr(args, "shard", None),
+        },
+    )
+    path = os.path.join(args.out, CHECKPOINT_FILENAME)
+    checkpoint = Checkpoint.load(path) if getattr(args, "resume", False) else None
+    if checkpoint is None:
+        if getattr(args, "resume", False):
+            logger.info("No checkpoint in %s; starting the check from scratch", args.out)
+        checkpoint = Checkpoint(path, identity)
+        checkpoint.save()
+        return checkpoint
+    checkpoint.validate(identity)
+    return checkpoint
+
+
+def _restored_outcomes(
+    args: argparse.Namespace, tasks: list[GenerationTask], checkpoint: Checkpoint
+) -> dict[str, GenerationOutcome]:
+    """Outcomes of the tasks ``checkpoint`` records as complete, read back from ``--out``."""
+    metrics_path = os.path.join(args.out, "metrics.json")
+    metrics = {}
+    if os.path.exists(metrics_path):
+        metrics = {run["label"]: run for run in load_json(metrics_path)["runs"]}
+    restored = {}
+    for task in tasks:
+        state = checkpoint.completed(task.label)
+        if state is None or not os.path.exists(os.path.join(args.out, state["trace"])):
+            continue
+        restored[task.label] = GenerationOutcome(
+            task=task,
+            env=None,
+            env_mismatch=False,
+            determinism=state["determinism"],
+            decision=None,
+            rows=None,
+            trace_path=os.path.join(args.out, state["trace"]),
+            rows_written=state["rows"],
+            metrics=metrics.get(task.label),
+        )
+    return restored
 
 
-def _hash_token_ids(token_ids: list[int]) -> str:
-    encoded = json.dumps(token_ids, separators=(",", ":"), sort_keys=False).encode("utf-8")
-    return hashlib.sha256(encoded).hexdigest()
+def _write_check_report(
+    args: argparse.Namespace,
+    runs: int,
+    batch_size: int,
+    vary_batch_sizes: list[int],
+    diffs: list[DiffResult],
+    batch_diffs: list[tuple[int, Any]],
+    written: list[tuple[str, str]],
+    extra_details: dict[str, Any],
+) -> Report:
+    """Aggregate run and batch diffs into ``report.json``/``report.txt`` and diff artifacts."""
+    result = aggregate_diffs(diffs)
+    batch_result = None
+    if batch_diffs:
+        # Compare against the baseline (fixed batch) trace only, not pairwise.
+        batch_result = aggregate_diffs([diff for _, diff in batch_diffs])
+
+    details = {
+        "runs": runs,
+        "batch_sizes": vary_batch_sizes,
+        "first_divergence": _report_divergence(result, batch_result),
+        "batch_divergence": _batch_divergence_detail(batch_diffs, result),
+        "baseline_batch_size": batch_size,
+        **extra_details,
+    }
+    analysis = _analyze_traces(args, written) if getattr(args, "analyze", False) else None
+    if analysis is not None:
+        details["analysis"] = {
+            "clusters": len(analysis["clusters"]),
+            "diverged_prompts": analysis["prompts"]["diverged"],
+            "total_prompts": analysis["prompts"]["total"],
+        }
+    report = Report(
+        status=_report_status(result, batch_result),
+        category=_report_category(result, batch_result),
+        details=details,
+    )
+    report_payload = wrap_artifact("report", report.to_dict())
+    if args.validate_schema:
+        validate_artifact(report_payload)
+    _write_json(args, os.path.join(args.out, "report.json"), report_payload)
+    _write_text(args, os.path.join(args.out, "report.txt"), render_report(report))
+    _emit(args, "artifact_written", None, path=os.path.join(args.out, "report.json"))
+
+    if _report_divergence(result, batch_result) is not None:
+        diff_path = os.path.join(args.out, "diffs", "first_divergence.json")
+        _write_json(
+            args,
+            diff_path,
+            wrap_artifact("first_divergence", _report_divergence(result, batch_result)),
+        )
+    if analysis is not None:
+        analysis_payload = wrap_artifact("divergence_analysis", analysis)
+        if args.validate_schema:
+            validate_artifact(analysis_payload)
+        _write_json(
+            args, os.path.join(args.out, "diffs", "divergence_analysis.json"), analysis_payload
+        )
+    return report
+
+
+def _execute_merge(args: argparse.Namespace) -> Report | None:
+    """Merge shard outputs as if one host had run them; returns the check report, if any."""
+    shards = load_shards(args.shard_dirs)
+    first_dir, first = shards[0]
+
+    envs = [load_json(os.path.join(shard_dir, "env.json")) for shard_dir, _ in shards]
+    fingerprints = {env.get("fingerprint") for env in envs}
+    if len(fingerprints) != 1:
+        raise ShardMergeError(f"Shard env fingerprints differ: {sorted(map(str, fingerprints))}")
+    run_envs = _merged_run_envs([shard_dir for shard_dir, _ in shards], envs[0]["fingerprint"])
+    determinism = [
+        load_json(os.path.join(shard_dir, "determinism_applied.json")) for shard_dir, _ in shards
+    ]
+    if any(payload != determinism[0] for payload in determinism):
+        raise ShardMergeError("Shards applied different determinism controls")
+    run_configs = [load_json(os.path.join(shard_dir, "run_config.json")) for shard_dir, _ in shards]
+    comparable = [
+        {key: value for key, value in config.items() if key != "generation_context"}
+        for config in run_configs
+    ]
+    if any(config != comparable[0] for config in comparable):
+        raise ShardMergeError("Shard run configs differ")
+
+    store = _artifact_store(args)
+    dump_artifact(os.path.join(args.out, "env.json"), envs[0], store)
+    for name, env in run_envs.items():
+        dump_artifact(os.path.join(args.out, "envs", name), env, store)
+    dump_json(os.path.join(args.out, "determinism_applied.json"), determinism[0])
+    run_config = dict(run_configs[0])
+    generation_context = dict(run_config["generation_context"])
+    # Batch plans are per shard; the merged config records each of them.
+    generation_context["shards"] = [
+        {**meta["shard"], "batching": config["generation_context"].get("batching")}
+        for (_, meta), config in zip(shards, run_configs, strict=True)
+    ]
+    run_config["generation_context"] = generation_context
+    if args.validate_schema:
+        validate_artifact(run_config)
+    dump_json(os.path.join(args.out, "run_config.json"), run_config)
+
+    trace_format = args.trace_format or first["trace_format"]
+    if trace_format == "manifest" and store is None:
+        raise ShardMergeError("Merged manifest traces need --artifact-store (or --trace-format)")
+    merge_args = argparse.Namespace(
+        out=args.out,
+        trace_format=trace_format,
+        artifact_store=args.artifact_store,
+        validate_schema=args.validate_schema,
+        analyze=args.analyze,
+    )
+    labels = sorted(first["traces"])
+    if first["command"] == "check":
+        # Check order: repeats, then batch sweeps as requested.
+        runs = sum(1 for label in labels if label.startswith("run_"))
+        labels = [f"run_{idx}" for idx in range(runs)]
+        labels += [f"batch_{size}" for size in run_configs[0]["vary_batch"]]
+    written: list[tuple[str, str]] = []
+    for label in labels:
+        relpath = first["traces"][label]
+        path = os.path.join(args.out, os.path.dirname(relpath), trace_filename(label, trace_format))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with TraceWriter(
+            path, trace_format=trace_format, validate_rows=args.validate_schema, store=store
+        ) as writer:
+            for row in iter_merged_trace(shards, label):
+                writer.write(row)
+        written.append((label, path))
+
+    run_metrics = []
+    for shard_dir, meta in shards:
+        metrics_path = os.path.join(shard_dir, "metrics.json")
+        if os.path.exists(metrics_path):
+            for run in load_json(metrics_path)["runs"]:
+                label = f"{run['label']}@shard{meta['shard']['index']}"
+                run_metrics.append({**run, "label": label})
+    summary = _write_metrics(merge_args, run_metrics) if run_metrics else None
+    if first["command"] != "check":
+        return None
+
+    shard_report = load_json(os.path.join(first_dir, "report.json"))
+    recorded = shard_report.get("details", {}).get("score_tolerance")
+    tolerance = ScoreTolerance(**recorded) if recorded else ScoreTolerance()
+    drift = ScoreDrift(tolerance)
+    traces = dict(written)
+    baseline = read_trace(traces["run_0"])
+    baseline_digest = trace_digest(traces["run_0"])
+    diffs: list[DiffResult] = []
+    batch_diffs: list[tuple[int, Any]] = []
+    for label, path in written[1:]:
+        is_run = label.startswith("run_")
+        task_drift = drift if is_run else None
+        if baseline_digest is not None and baseline_digest == trace_digest(path):
+            diff = DiffResult(status="PASS", category="PASS", first_divergence=None)
+            if task_drift is not None:
+                task_drift.add_equal_rows(baseline)
+        else:
+            diff = diff_trace_stream(
+                baseline, iter_trace(path), tolerance, drift=task_drift, label=label
+            )
+        if is_run:
+            diffs.append(diff)
+        else:
+            batch_diffs.append((int(label.split("_", 1)[1]), diff))
+
+    details: dict[str, Any] = {"shards": first["shard"]["count"]}
+    if not tolerance.exact:
+        details["score_tolerance"] = tolerance.to_dict()
+    if drift.values_compared:
+        details["score_drift"] = drift.to_dict()
+    if summary is not None:
+        details["metrics"] = summary
+    return _write_check_report(
+        merge_args,
+        len(diffs) + 1,
+        run_config["batch_size"],
+        run_config["vary_batch"],
+        diffs,
+        batch_diffs,
+        written,
+        details,
+    )
+
+
+def _merged_run_envs(shard_dirs: list[str], fingerprint: str) -> dict[str, dict[str, Any]]:
+    """Per-run env snapshots (``envs/<task>.json``) of the shards, one per task.
+
+    A single-host check fails with ENV_MISMATCH when a run's environment
+    differs from the baseline, so every shard's snapshot of every run must
+    carry the shared fingerprint.
+    """
+    merged: dict[str, dict[str, Any]] = {}
+    for shard_dir in shard_dirs:
+        envs_dir = os.path.join(shard_dir, "envs")
+        if not os.path.isdir(envs_dir):
+            continue
+        for name in sorted(os.listdir(envs_dir)):
+            if not name.endswith(".json"):
+                continue
+            env = load_json(os.path.join(envs_dir, name))
+            if env.get("fingerprint") != fingerprint:
+                raise ShardMergeError(
+                    f"Shard {shard_dir} recorded {name[:-5]} in a different environment: "
+                    f"{env.get('fingerprint')} != {fingerprint}"
+                )
+            merged.setdefault(name, env)
+    return merged
+
+
+def _analyze_traces(args: argparse.Namespace, written: list[tuple[str, str]]) -> dict[str, Any]:
+    # Traces are re-read from disk so only per-row digests stay resident.
+    analyzer = DivergenceAnalyzer()
+    sink = _sink(args)
+    for label, path in written:
+        analyzer.add_trace(label, sink.traces[path] if sink else iter_trace(path))
+    return analyzer.result()
+
+
+def _generate_task(
+    args: argparse.Namespace,
+    prompts: list[str],
+    task: GenerationTask,
+    baseline_fingerprint: str | None,
+    plan: BatchPlan | None = None,
+    pool: BackendPool | None = None,
+    backend_adapter: BackendAdapter | None = None,
+    capture_task_env: bool = True,
+    baseline_rows: list[dict[str, Any]] | None = None,
+    keep_rows: bool = False,
+    tolerance: ScoreTolerance | None = None,
+    drift: ScoreDrift | None = None,
+    checkpoint: Checkpoint | None = None,
+) -> GenerationOutcome:
+    """Generate one task, streaming its rows to ``traces/<label>`` as batches finish.
+
+    Rows are compared against ``baseline_rows`` on the fly; only ``keep_rows``
+    (the baseline run) keeps them resident. The partial trace survives an
+    interruption; a ``task.resume`` continues it from the last written row,
+    and ``checkpoint`` records the progress after every batch.
+    """
+    env_payload = None
+    if capture_task_env:
+        env_payload = _coerce_env(capture_env(**_redact_kwargs(args)))
+        if baseline_fingerprint and env_payload.get("fingerprint") != baseline_fingerprint:
+            return GenerationOutcome(
+                task=task,
+                env=env_payload,
+                env_mismatch=True,
+                determinism=None,
+                decision=None,
+                rows=None,
+            )
+
+    task_args = _clone_args(args, batch_size=task.batch_size)
+    fail_fast = getattr(args, "fail_fast", False)
+    decision = None
+    divergence = None
+    rows: list[dict[str, Any] | None] | None = None
+    trace_path = None
+    rows_written = 0
+    metrics = RunMetrics(task.label)
+    profiler = _task_profiler(args, task.label, task.profile)
+    with DeterministicContext(args.tier, args.mode, args.seed) as ctx:
+        with metrics.time_load():
+            backend = _acquire_backend(task_args, pool, backend_adapter)
+        if task.kind == "run":
+            decision = evaluate_capabilities(
+                ctx.applied, backend.capabilities(), args.tier, args.mode
+            )
+        if decision is None or decision.supported:
+            rows = [None] * len(prompts) if keep_rows else None
+            comparator = (
+                TraceComparator(baseline_rows, tolerance=tolerance, drift=drift, label=task.label)
+                if baseline_rows is not None
+                else None
+            )
+            trace_path = _task_trace_path(args, task)
+            stopped = False
+            with _open_trace(args, trace_path, resume=task.resume, keep_partial=True) as writer:
+                resumed = writer.rows
+                _emit(args, "run_started", task.label, prompts=len(prompts), resumed_rows=resumed)
+                if resumed:
+                    logger.info("Resuming %s after %s rows", task.label, resumed)
+                    for idx, row in enumerate(iter_partial_trace(trace_path)):
+                        if idx >= resumed:
+                            break
+                        if rows is not None:
+                            rows[idx] = row
+                        if comparator is not None:
+                            stopped = comparator.add(idx, row) is not None or stopped
+                batches = iter_generation(
+                    backend,
+                    prompts,
+                    task_args,
+                    capture_scores=ctx.applied.tier_effective >= 2,
+                    plan=plan,
+                    reference_rows=baseline_rows if fail_fast else None,
+                    metrics=metrics,
+                    profiler=profiler,
+                    skip_below=resumed,
+                )
+                if fail_fast and stopped:
+                    # The replayed rows already diverge; nothing is left to generate.
+                    batches = iter(())
+                for batch_indices, batch_rows in batches:
+                    for idx, row in zip(batch_indices, batch_rows, strict=True):
+                        if idx < resumed:
+                            continue
+                        row = _coerce_trace_row(row)
+                        writer.put(idx, row)
+                        if rows is not None:
+                            rows[idx] = row
+                        if comparator is not None:
+                            stopped = comparator.add(idx, row) is not None or stopped
+                    if checkpoint is not None:
+                        writer.flush()
+                        checkpoint.record(task.label, "partial", writer.rows)
+                    _emit_batch(args, task.label, metrics, writer.rows)
+                    if fail_fast and stopped:
+                        break
+            rows_written = writer.rows
+            if comparator is not None:
+                # A fail-fast stop leaves the trace short; report the divergence, not the length.
+                divergence = comparator.failure if stopped else comparator.result()
+
+    return GenerationOutcome(
+        task=task,
+        env=env_payload,
+        env_mismatch=False,
+        determinism=_coerce_determinism(ctx.applied.to_dict()),
+        decision=decision,
+        rows=rows,
+        divergence=divergence,
+        trace_path=trace_path,
+        rows_written=rows_written,
+        metrics=metrics.to_dict() if trace_path is not None else None,
+        profile=profiler.save() if profiler is not None else None,
+    )
+
+
+def _task_trace_path(args: argparse.Namespace, task: GenerationTask) -> str:
+    return os.path.join(args.out, "traces", trace_filename(task.label, _trace_format(args)))
+
+
+def _execute_run(
+    args: argparse.Namespace,
+    prompts: list[str],
+    env_snapshot: dict[str, Any],
+    backend_adapter: BackendAdapter | None = None,
+    pool: BackendPool | None = None,
+) -> Report:
+    prompts, sharding = _apply_shard(args, prompts)
+    trace_path = os.path.join(args.out, trace_filename("trace", _trace_format(args)))
+    metrics = RunMetrics("run")
+    profiler = _task_profiler(args, "run", True)
+    with DeterministicContext(args.tier, args.mode, args.seed) as ctx:
+        with metrics.time_load():
+            backend = _acquire_backend(args, pool, backend_adapter)
+        decision = evaluate_capabilities(ctx.applied, backend.capabilities(), args.tier, args.mode)
+        if not decision.supported:
+            report = _write_unsupported(
+                args,
+                1,
+                decision,
+                validate_schema=args.validate_schema,
+            )
+            _write_json(
+                args,
+                os.path.join(args.out, "determinism_applied.json"),
+                _coerce_determinism(ctx.applied.to_dict()),
+            )
+            if sharding is not None:
+                _write_shard(args, "run", sharding, {"trace": trace_path}, complete=False)
+            _emit(args, "finished", None, status=report.status, category=report.category)
+            return report
+        plan = _plan_generation(args, prompts, None, backend)
+        _emit(args, "run_started", "run", prompts=len(prompts), resumed_rows=0)
+        with _open_trace(args, trace_path) as writer:
+            for batch_indices, batch_rows in iter_generation(
+                backend,
+                prompts,
+                args,
+                capture_scores=ctx.applied.tier_effective >= 2,
+                plan=plan,
+                metrics=metrics,
+                profiler=profiler,
+            ):
+                for idx, row in zip(batch_indices, batch_rows, strict=True):
+                    writer.put(idx, _coerce_trace_row(row))
+                _emit_batch(args, "run", metrics, writer.rows)
+    _emit(args, "artifact_written", "run", path=trace_path)
+    _emit(args, "run_finished", "run", rows=writer.rows, status=None)
+
+    determinism_payload = _coerce_determinism(ctx.applied.to_dict())
+    if args.validate_schema:
+        validate_artifact(determinism_payload)
+    _write_json(args, os.path.join(args.out, "determinism_applied.json"), determinism_payload)
+    run_config = _build_run_config(
+        args,
+        env_snapshot.get("device"),
+        ctx.applied.tier_effective,
+        _parse_vary_batch(None),
+        batch_plan=plan,
+    )
+    run_config = _coerce_run_config(run_config)
+    if args.validate_schema:
+        validate_artifact(run_config)
+    _write_json(args, os.path.join(args.out, "run_config.json"), run_config)
+    _write_metrics(args, [metrics.to_dict()])
+    details: dict[str, Any] = {}
+    profile = profiler.save() if profiler is not None else None
+    if profile is not None:
+        details["profile"] = {"profiler": args.profile, "runs": [profile]}
+        logger.info("Wrote %s profile to %s", args.profile, os.path.join(args.out, PROFILE_DIR))
+    if sharding is not None:
+        _write_shard(args, "run", sharding, {"trace": trace_path})
+    _emit(args, "finished", None, status="PASS", category="PASS")
+    return Report(status="PASS", category="PASS", details=details)
+
+
+def _plan_generation(
+    args: argparse.Namespace,
+    prompts: list[str],
+    pool: BackendPool | None,
+    backend_adapter: BackendAdapter | None,
+) -> BatchPlan:
+    strategy = getattr(args, "batching", "sequential")
+    if strategy == "sequential":
+        return plan_batches(prompts, strategy)
+    # The plan is computed once and shared by every run so traces stay comparable.
+    backend = _acquire_backend(args, pool, backend_adapter)
+    token_lengths = getattr(backend, "token_lengths", None)
+    lengths = token_lengths(prompts) if callable(token_lengths) else None
+    return plan_batches(prompts, strategy, lengths)
+
+
+def _backend_loads(
+    strategy: str,
+    pool: BackendPool | None,
+    runs: int,
+    vary_batch_sizes: list[int],
+) -> int:
+    if pool is not None:
+        return pool.loads
+    if strategy == "reload_per_run":
+        return runs + len(vary_batch_sizes)
+    return 0
 
 
 def _run_generation(
@@ -530,34 +1728,14 @@ def _run_generation(
     prompts: list[str],
     args: argparse.Namespace,
     capture_scores: bool = False,
+    plan: BatchPlan | None = None,
 ) -> list[dict[str, Any]]:
-    rows: list[dict[str, Any]] = []
-    batch_size = max(1, args.batch_size)
-    for start in range(0, len(prompts), batch_size):
-        batch = prompts[start : start + batch_size]
-        results = backend.generate(
-            batch,
-            max_new_tokens=args.max_new_tokens,
-            do_sample=False,
-            capture_scores=capture_scores,
-        )
-        for item in results:
-            rows.append(
-                {
-                    "prompt_id": _hash_prompt(item["prompt"]),
-                    "input_token_ids": item["input_ids"],
-                    # TODO: Add a privacy mode to store only token hashes/redacted ids.
-                    "input_token_ids_hash": _hash_token_ids(item["input_ids"]),
-                    "generated_token_ids": item["output_ids"],
-                    "scores": item.get("scores"),
-                    "tokenizer_id": item.get("tokenizer_id") or args.model,
-                    "decoding_max_new_tokens": args.max_new_tokens,
-                    "decoding_do_sample": False,
-                    "decoding_temperature": args.temperature,
-                    "decoding_top_p": args.top_p,
-                    "decoding_top_k": args.top_k,
-                }
-            )
+    rows: list[dict[str, Any] | None] = [None] * len(prompts)
+    for batch_indices, batch_rows in iter_generation(
+        backend, prompts, args, capture_scores=capture_scores, plan=plan
+    ):
+        for idx, row in zip(batch_indices, batch_rows, strict=True):
+            rows[idx] = row
     return rows
 
 
@@ -566,6 +1744,7 @@ def _build_run_config(
     device_snapshot: dict[str, Any] | None,
     tier_effective: int,
     vary_batch: list[int],
+    batch_plan: BatchPlan | None = None,
 ) -> dict[str, Any]:
     data = {
         "backend": args.backend,
@@ -590,18 +1769,175 @@ def _build_run_config(
         },
         "generation_context": {
             "device_snapshot": device_snapshot,
+            "batching": (batch_plan or BatchPlan("sequential", ())).to_dict(),
         },
     }
-    return _wrap_artifact("run_config", data)
+    return wrap_artifact("run_config", data)
 
 
-def _wrap_artifact(artifact_type: str, payload: dict[str, Any]) -> dict[str, Any]:
-    return {
-        "schema_version": "1.0",
-        "detllm_version": __version__,
-        "artifact_type": artifact_type,
-        **payload,
-    }
+def _apply_shard(
+    args: argparse.Namespace, prompts: list[str]
+) -> tuple[list[str], tuple[ShardSpec, list[str], list[int]] | None]:
+    """Restrict ``prompts`` to ``args.shard``; returns them with the shard's bookkeeping."""
+    shard = getattr(args, "shard", None)
+    if not shard:
+        return prompts, None
+    spec = ShardSpec.parse(shard)
+    prompt_ids = [hash_prompt(prompt) for prompt in prompts]
+    positions = shard_positions(prompt_ids, spec)
+    logger.info("Shard %s: %s of %s prompts", shard, len(positions), len(prompts))
+    return [prompts[position] for position in positions], (spec, prompt_ids, positions)
+
+
+def _write_shard(
+    args: argparse.Namespace,
+    command: str,
+    sharding: tuple[ShardSpec, list[str], list[int]],
+    traces: dict[str, str],
+    complete: bool = True,
+) -> None:
+    spec, prompt_ids, positions = sharding
+    payload = wrap_artifact(
+        "shard",
+        shard_metadata(
+            spec,
+            command,
+            prompt_ids,
+            positions,
+            {label: os.path.relpath(path, args.out) for label, path in traces.items()},
+            _trace_format(args),
+            complete=complete,
+        ),
+    )
+    if args.validate_schema:
+        validate_artifact(payload)
+    dump_json(os.path.join(args.out, SHARD_FILENAME), payload)
+
+
+def _check_profile_args(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    if not args.profile:
+        return
+    if not profiler_available(args.profile):
+        parser.error(f"--profile {args.profile} requires torch")
+    if args.profile_batches < 1 or getattr(args, "profile_runs", 1) < 1:
+        parser.error("--profile-runs and --profile-batches must be at least 1")
+
+
+def _task_profiler(args: argparse.Namespace, label: str, sampled: bool) -> BatchProfiler | None:
+    kind = getattr(args, "profile", None)
+    if not kind or not sampled:
+        return None
+    return BatchProfiler(
+        kind,
+        args.out,
+        label,
+        batches=getattr(args, "profile_batches", 1),
+        top=getattr(args, "profile_top", 30),
+    )
+
+
+def _write_metrics(args: argparse.Namespace, runs: list[dict[str, Any]]) -> dict[str, Any]:
+    """Write ``metrics.json`` and return the summary surfaced in the report."""
+    summary = summarize_metrics(runs)
+    payload = wrap_artifact("metrics", {"summary": summary, "runs": runs})
+    if args.validate_schema:
+        validate_artifact(payload)
+    _write_json(args, os.path.join(args.out, "metrics.json"), payload)
+    return summary
+
+
+def _sink(args: argparse.Namespace) -> MemorySink | None:
+    """The in-memory sink of ``write_artifacts=False`` API calls; None writes to ``--out``."""
+    return getattr(args, "sink", None)
+
+
+def _write_json(args: argparse.Namespace, path: str, payload: dict[str, Any]) -> None:
+    sink = _sink(args)
+    if sink is not None:
+        sink.write_json(path, payload)
+    else:
+        dump_json(path, payload)
+
+
+def _write_text(args: argparse.Namespace, path: str, text: str) -> None:
+    sink = _sink(args)
+    if sink is not None:
+        sink.write_text(path, text)
+        return
+    with open(path, "w", encoding="utf-8") as handle:
+        handle.write(text)
+
+
+def _write_env(args: argparse.Namespace, path: str, payload: dict[str, Any]) -> None:
+    sink = _sink(args)
+    if sink is not None:
+        sink.write_json(path, payload)
+    else:
+        dump_artifact(path, payload, _artifact_store(args))
+
+
+def _open_trace(
+    args: argparse.Namespace, path: str, resume: bool = False, keep_partial: bool = False
+) -> TraceWriter | MemoryTraceWriter:
+    sink = _sink(args)
+    if sink is not None:
+        return sink.trace_writer(path, validate_rows=args.validate_schema)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    return TraceWriter(
+        path,
+        trace_format=_trace_format(args),
+        validate_rows=args.validate_schema,
+        store=_artifact_store(args),
+        index=getattr(args, "trace_index", False),
+        resume=resume,
+        keep_partial=keep_partial,
+    )
+
+
+def _emit(args: argparse.Namespace, kind: str, task: str | None, **data: Any) -> None:
+    """Report progress to ``args.on_event`` (see ``detllm.core.events``), if set."""
+    on_event = getattr(args, "on_event", None)
+    if on_event is not None:
+        on_event(ProgressEvent(kind, task, data))
+
+
+def _emit_batch(args: argparse.Namespace, task: str, metrics: RunMetrics, rows: int) -> None:
+    batch = metrics.batches[-1]
+    _emit(
+        args,
+        "batch_done",
+        task,
+        batch=batch["index"],
+        size=batch["size"],
+        wall_s=batch["wall_s"],
+        rows=rows,
+    )
+
+
+def _trace_format(args: argparse.Namespace) -> str:
+    if getattr(args, "artifact_store", None):
+        return "manifest"
+    return getattr(args, "trace_format", "jsonl")
+
+
+def _score_tolerance(
+    args: argparse.Namespace, parser: argparse.ArgumentParser | None = None
+) -> ScoreTolerance:
+    try:
+        return ScoreTolerance(
+            atol=getattr(args, "score_atol", 0.0) or 0.0,
+            rtol=getattr(args, "score_rtol", 0.0) or 0.0,
+            ulps=getattr(args, "score_ulps", 0) or 0,
+        )
+    except ValueError as exc:
+        if parser is None:
+            raise
+        parser.error(str(exc))
+
+
+def _artifact_store(args: argparse.Namespace) -> ArtifactStore | None:
+    root = getattr(args, "artifact_store", None)
+    return ArtifactStore(root) if root else None
 
 
 def _redact_kwargs(args: argparse.Namespace) -> dict[str, Any]:
@@ -621,15 +1957,17 @@ def _coerce_run_config(payload: dict[str, Any]) -> dict[str, Any]:
 
 def _coerce_determinism(payload: dict[str, Any]) -> dict[str, Any]:
     if "schema_version" not in payload:
-        payload = _wrap_artifact("determinism_applied", payload)
+        payload = wrap_artifact("determinism_applied", payload)
     return DeterminismAppliedRecord.from_dict(payload).to_dict()
 
 
-def _coerce_trace_rows(rows: list[dict[str, Any]]) -> list[dict[str, Any]]:
-    return [TokenTraceRow.from_dict(row).to_dict() for row in rows]
+def _coerce_trace_row(row: dict[str, Any]) -> dict[str, Any]:
+    return TokenTraceRow.from_dict(row).to_dict()
 
 
-def _write_unsupported(out_dir: str, runs: int, decision, validate_schema: bool = False) -> None:
+def _write_unsupported(
+    args: argparse.Namespace, runs: int, decision, validate_schema: bool = False
+) -> Report:
     report = Report(
         status="FAIL",
         category="UNSUPPORTED_REQUEST",
@@ -639,40 +1977,38 @@ def _write_unsupported(out_dir: str, runs: int, decision, validate_schema: bool
             "notes": getattr(decision, "notes", []),
         },
     )
-    report_payload = _wrap_artifact("report", report.to_dict())
+    report_payload = wrap_artifact("report", report.to_dict())
     if validate_schema:
         validate_artifact(report_payload)
-    dump_json(os.path.join(out_dir, "report.json"), report_payload)
-    report_text = render_report(report)
-    with open(os.path.join(out_dir, "report.txt"), "w", encoding="utf-8") as handle:
-        handle.write(report_text)
+    _write_json(args, os.path.join(args.out, "report.json"), report_payload)
+    _write_text(args, os.path.join(args.out, "report.txt"), render_report(report))
+    return report
 
 
 def _write_env_mismatch(
-    out_dir: str,
+    args: argparse.Namespace,
     runs: int,
-    run_index: int,
+    run_index: int | None,
     baseline_fingerprint: str,
     current_env: dict[str, Any],
     validate_schema: bool = False,
-) -> None:
-    report = Report(
-        status="FAIL",
-        category="ENV_MISMATCH",
-        details={
-            "runs": runs,
-            "run_index": run_index,
-            "baseline_fingerprint": baseline_fingerprint,
-            "current_fingerprint": current_env.get("fingerprint"),
-        },
-    )
-    report_payload = _wrap_artifact("report", report.to_dict())
+    batch_size: int | None = None,
+) -> Report:
+    details = {
+        "runs": runs,
+        "run_index": run_index,
+        "baseline_fingerprint": baseline_fingerprint,
+        "current_fingerprint": current_env.get("fingerprint"),
+    }
+    if batch_size is not None:
+        details["batch_size"] = batch_size
+    report = Report(status="FAIL", category="ENV_MISMATCH", details=details)
+    report_payload = wrap_artifact("report", report.to_dict())
     if validate_schema:
         validate_artifact(report_payload)
-    dump_json(os.path.join(out_dir, "report.json"), report_payload)
-    report_text = render_report(report)
-    with open(os.path.join(out_dir, "report.txt"), "w", encoding="utf-8") as handle:
-        handle.write(report_text)
+    _write_json(args, os.path.join(args.out, "report.json"), report_payload)
+    _write_text(args, os.path.join(args.out, "report.txt"), render_report(report))
+    return report
 
 
 def _parse_vary_batch(value: str | None) -> list[int]:
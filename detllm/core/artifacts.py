@@ -12,14 +12,33 @@ SCHEMA_MAP = {
     "run_config": "run_config",
     "determinism_applied": "determinism_applied",
     "report": "report",
+    "divergence_analysis": "divergence_analysis",
+    "metrics": "metrics",
+    "bench": "bench",
+    "shard": "shard",
+    "checkpoint": "checkpoint",
+    "matrix": "matrix",
 }
 
 
+def wrap_artifact(artifact_type: str, payload: dict[str, Any]) -> dict[str, Any]:
+    from detllm.version import __version__
+
+    return {
+        "schema_version": "1.0",
+        "detllm_version": __version__,
+        "artifact_type": artifact_type,
+        **payload,
+    }
+
+
 def load_json(path: str) -> dict[str, Any]:
     import json
 
+    from detllm.core.store import resolve_artifact
+
     with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
+        data = resolve_artifact(path, json.load(f))
 
     missing = REQUIRED_HEADER_FIELDS - set(data.keys())
     if missing:
@@ -43,9 +62,11 @@ def load_schema(name: str) -> dict[str, Any]:
     import json
 
     schema_path = f"{name}.json"
-    with resources.files("detllm.schemas").joinpath(schema_path).open(
-        "r", encoding="utf-8"
-    ) as handle:
+    with (
+        resources.files("detllm.schemas")
+        .joinpath(schema_path)
+        .open("r", encoding="utf-8") as handle
+    ):
         return json.load(handle)
 
 
@@ -0,0 +1,87 @@
+"""Runs and checks executing off an asyncio event loop (``arun``/``acheck``)."""
+
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+import threading
+from typing import Any, AsyncIterator, Callable
+
+from detllm.core.deterministic import GENERATION_LOCK
+from detllm.core.events import ProgressEvent, RunCancelled
+
+
+class AsyncJob:
+    """A ``run`` or ``check`` executing off the event loop.
+
+    Await the job for its result, or iterate it (once) for its progress
+    events. ``cancel()`` stops the work at its next event, leaving the
+    artifacts written so far consistent; awaiting a cancelled job raises
+    ``asyncio.CancelledError``, as does cancelling the task awaiting it.
+    Jobs wait for each other's generation (determinism controls are
+    process-wide), so many can share one loop.
+    """
+
+    def __init__(
+        self,
+        func: Callable[..., Any],
+        kwargs: dict[str, Any],
+        executor: Executor | None = None,
+    ):
+        self._loop = asyncio.get_running_loop()
+        self._events: asyncio.Queue[ProgressEvent | None] = asyncio.Queue()
+        self._cancelled = threading.Event()
+        self._on_event = kwargs.pop("on_event", None)
+        self._future = self._loop.run_in_executor(executor, self._call, func, kwargs)
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def done(self) -> bool:
+        return self._future.done()
+
+    def __await__(self):
+        return self._result().__await__()
+
+    def __aiter__(self) -> AsyncIterator[ProgressEvent]:
+        return self._iter_events()
+
+    async def _iter_events(self) -> AsyncIterator[ProgressEvent]:
+        while True:
+            event = await self._events.get()
+            if event is None:
+                return
+            yield event
+
+    async def _result(self) -> Any:
+        try:
+            return await asyncio.shield(self._future)
+        except asyncio.CancelledError:
+            # Let the worker reach its next event so partial artifacts are consistent.
+            self.cancel()
+            await asyncio.wait([self._future])
+            raise
+        except RunCancelled as exc:
+            raise asyncio.CancelledError() from exc
+
+    def _call(self, func: Callable[..., Any], kwargs: dict[str, Any]) -> Any:
+        try:
+            with GENERATION_LOCK:
+                if self._cancelled.is_set():
+                    raise RunCancelled("cancelled before it started")
+                return func(on_event=self._emit, **kwargs)
+        except RunCancelled:
+            self._publish(ProgressEvent("cancelled", None))
+            raise
+        finally:
+            self._loop.call_soon_threadsafe(self._events.put_nowait, None)
+
+    def _emit(self, event: ProgressEvent) -> None:
+        self._publish(event)
+        if self._cancelled.is_set() and event.kind != "finished":
+            raise RunCancelled(f"cancelled at {event.kind} of {event.task}")
+
+    def _publish(self, event: ProgressEvent) -> None:
+        if self._on_event is not None:
+            self._on_event(event)
+        self._loop.call_soon_threadsafe(self._events.put_nowait, event)
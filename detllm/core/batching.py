@@ -0,0 +1,73 @@
+"""Batch planning for generation."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+import json
+from typing import Any, Sequence
+
+BATCHING_STRATEGIES = ("sequential", "length")
+
+
+@dataclass(frozen=True)
+class BatchPlan:
+    """Fixed order in which prompts are fed to the backend.
+
+    Batches are consecutive ``batch_size`` slices of ``order``; rows are always
+    written back in prompt-file order, so only generation context depends on it.
+    """
+
+    strategy: str
+    order: tuple[int, ...]
+    length_source: str | None = None
+
+    @property
+    def plan_id(self) -> str | None:
+        # File-order batching keeps traces identical to those written before plans existed.
+        if self.strategy == "sequential":
+            return None
+        encoded = json.dumps(
+            {"strategy": self.strategy, "order": list(self.order)},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        return hashlib.sha256(encoded).hexdigest()
+
+    def batches(self, batch_size: int) -> list[list[int]]:
+        batch_size = max(1, batch_size)
+        return [
+            list(self.order[start : start + batch_size])
+            for start in range(0, len(self.order), batch_size)
+        ]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "length_source": self.length_source,
+            "plan_id": self.plan_id,
+        }
+
+
+def plan_batches(
+    prompts: Sequence[str],
+    strategy: str = "sequential",
+    lengths: Sequence[int] | None = None,
+) -> BatchPlan:
+    """Build a batch plan; ``length`` groups prompts of similar length together.
+
+    Lengths default to UTF-8 byte counts when the backend cannot tokenize.
+    """
+
+    if strategy not in BATCHING_STRATEGIES:
+        raise ValueError(f"Unsupported batching strategy: {strategy}")
+    if strategy == "sequential":
+        return BatchPlan(strategy="sequential", order=tuple(range(len(prompts))))
+
+    length_source = "tokens"
+    if lengths is None:
+        lengths = [len(prompt.encode("utf-8")) for prompt in prompts]
+        length_source = "bytes"
+    if len(lengths) != len(prompts):
+        raise ValueError("lengths must match prompts")
+    order = sorted(range(len(prompts)), key=lambda idx: (lengths[idx], idx))
+    return BatchPlan(strategy=strategy, order=tuple(order), length_source=length_source)
@@ -0,0 +1,109 @@
+"""Progress checkpoints for ``check`` (``checkpoint.json``) and ``--resume``.
+
+A check records its identity (run config, environment fingerprint, prompt
+set and check parameters) when it starts, then the state of every task:
+``partial`` with the rows written so far after each batch, ``complete`` with
+the trace and determinism record once the task finishes. Traces, env
+snapshots and ``metrics.json`` are the data; the checkpoint only says how far
+they got. A resumed check must have the same identity.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from typing import Any
+
+from detllm.core.artifacts import load_json
+from detllm.core.store import canonical_json
+from detllm.version import __version__
+
+CHECKPOINT_FILENAME = "checkpoint.json"
+
+
+class CheckpointMismatch(ValueError):
+    """A checkpoint that belongs to a different check than the one resuming it."""
+
+
+def checkpoint_identity(
+    run_config: dict[str, Any],
+    env_fingerprint: str | None,
+    prompt_set_digest: str,
+    params: dict[str, Any],
+) -> dict[str, Any]:
+    """What a resumed check must match; ``params`` are check options outside the run config."""
+    return {
+        "run_config_digest": hashlib.sha256(canonical_json(run_config)).hexdigest(),
+        "env_fingerprint": env_fingerprint,
+        "prompt_set_digest": prompt_set_digest,
+        "params": dict(params),
+    }
+
+
+class Checkpoint:
+    """Task progress of one check, rewritten atomically on every update."""
+
+    def __init__(
+        self,
+        path: str,
+        identity: dict[str, Any],
+        tasks: dict[str, dict[str, Any]] | None = None,
+        resumed: bool = False,
+    ):
+        self.path = path
+        self.identity = dict(identity)
+        self.tasks: dict[str, dict[str, Any]] = dict(tasks or {})
+        self.resumed = resumed
+
+    @classmethod
+    def load(cls, path: str) -> "Checkpoint | None":
+        if not os.path.exists(path):
+            return None
+        payload = load_json(path)
+        identity = {
+            key: payload[key]
+            for key in ("run_config_digest", "env_fingerprint", "prompt_set_digest", "params")
+        }
+        return cls(path, identity, payload["tasks"], resumed=True)
+
+    def validate(self, identity: dict[str, Any]) -> None:
+        """Raise ``CheckpointMismatch`` naming what differs from ``identity``."""
+        differing = [key for key, value in identity.items() if self.identity.get(key) != value]
+        if "params" in differing:
+            params = self.identity.get("params") or {}
+            differing.remove("params")
+            differing.extend(
+                key for key, value in identity["params"].items() if params.get(key) != value
+            )
+        if differing:
+            raise CheckpointMismatch(
+                f"{self.path} belongs to a different check ({', '.join(differing)} differ)"
+            )
+
+    def completed(self, label: str) -> dict[str, Any] | None:
+        state = self.tasks.get(label)
+        return state if state is not None and state["status"] == "complete" else None
+
+    def record(self, label: str, status: str, rows: int, **fields: Any) -> None:
+        """Set the state of task ``label`` and save."""
+        self.tasks[label] = {"status": status, "rows": rows, **fields}
+        self.save()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {**self.identity, "tasks": self.tasks}
+
+    def save(self) -> None:
+        payload = {
+            "schema_version": "1.0",
+            "detllm_version": __version__,
+            "artifact_type": "checkpoint",
+            **self.to_dict(),
+        }
+        tmp_path = f"{self.path}.tmp"
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        # Readers and resumes only ever see a complete checkpoint.
+        os.replace(tmp_path, self.path)
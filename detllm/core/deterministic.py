@@ -6,8 +6,13 @@ from contextlib import AbstractContextManager
 from dataclasses import asdict, dataclass, field
 import os
 import random
+import threading
 from typing import Any
 
+# Determinism controls are process-wide: threads that generate side by side
+# (``detllm serve``, the async API) take turns on this lock.
+GENERATION_LOCK = threading.Lock()
+
 
 @dataclass
 class DeterminismApplied:
@@ -2,7 +2,12 @@
 
 from __future__ import annotations
 
+import copy
+import functools
 import hashlib
+import importlib
+from importlib import metadata
+import importlib.util
 import json
 import os
 import platform
@@ -23,14 +28,23 @@ ENV_VARS = (
 
 
 def _get_version(module_name: str) -> str | None:
+    # Distribution metadata avoids importing heavy packages just to read a version.
     try:
-        module = __import__(module_name)
+        return metadata.version(module_name)
+    except metadata.PackageNotFoundError:
+        pass
+    if importlib.util.find_spec(module_name) is None:
+        return None
+    try:
+        module = importlib.import_module(module_name)
     except Exception:
         return None
     return getattr(module, "__version__", None)
 
 
 def _torch_device_info() -> dict[str, Any] | None:
+    if importlib.util.find_spec("torch") is None:
+        return None
     try:
         import torch
     except Exception:
@@ -62,14 +76,10 @@ def _canonical_fingerprint(payload: dict[str, Any]) -> str:
     return hashlib.sha256(encoded).hexdigest()
 
 
-def capture_env(
-    *,
-    redact: bool = False,
-    redact_env_vars: list[str] | None = None,
-) -> dict[str, Any]:
-    """Capture a deterministic environment snapshot."""
-
-    snapshot: dict[str, Any] = {
+@functools.lru_cache(maxsize=None)
+def _static_sections() -> dict[str, Any]:
+    """Parts of the snapshot that cannot change within a process, captured once."""
+    return {
         "schema_version": "1.0",
         "detllm_version": __version__,
         "artifact_type": "env_snapshot",
@@ -90,18 +100,87 @@ def capture_env(
             "version": _get_version("transformers"),
         },
         "device": _torch_device_info(),
-        "env_vars": {name: os.environ.get(name) for name in ENV_VARS},
         # TODO: Consider capturing driver/toolkit versions and CPU metadata.
-        # TODO: Add a redaction/allowlist mechanism for sensitive fields.
     }
 
+
+@functools.lru_cache(maxsize=None)
+def _encoded_static(redact: bool) -> tuple[tuple[str, bytes], ...]:
+    # Canonical JSON members ('"key":value') of the static sections, encoded once.
+    sections = _static_sections()
     if redact:
-        snapshot["python"]["executable"] = "<redacted>"
-        redact_keys = set(redact_env_vars or snapshot["env_vars"].keys())
+        sections = {**sections, "python": {**sections["python"], "executable": "<redacted>"}}
+    return tuple((key, _encode_member(key, value)) for key, value in sections.items())
+
+
+def _encode_member(key: str, value: Any) -> bytes:
+    return json.dumps({key: value}, sort_keys=True, separators=(",", ":")).encode("utf-8")[1:-1]
+
+
+def _incremental_fingerprint(redact: bool, volatile: dict[str, Any]) -> str:
+    """Same digest as ``_canonical_fingerprint`` over the full snapshot.
+
+    Top-level members of canonical JSON are independent, so only the volatile
+    ones are encoded here; the static ones come pre-encoded.
+    """
+    members = list(_encoded_static(redact))
+    members.extend((key, _encode_member(key, value)) for key, value in volatile.items())
+    members.sort()
+    return hashlib.sha256(b"{" + b",".join(member for _, member in members) + b"}").hexdigest()
+
+
+def env_identity() -> dict[str, Any]:
+    """Snapshot fields that are cheap to read: everything but the device inventory.
+
+    Used to tell whether two processes would record the same environment
+    without importing torch to probe devices.
+    """
+    return {
+        "detllm_version": __version__,
+        "python": {
+            "version": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "executable": sys.executable,
+        },
+        "platform": {
+            "system": platform.system(),
+            "release": platform.release(),
+            "machine": platform.machine(),
+        },
+        "torch": {"version": _get_version("torch")},
+        "transformers": {"version": _get_version("transformers")},
+        "env_vars": {name: os.environ.get(name) for name in ENV_VARS},
+    }
+
+
+def clear_env_cache() -> None:
+    """Forget the memoised static snapshot (e.g. after installing packages)."""
+    _static_sections.cache_clear()
+    _encoded_static.cache_clear()
+
+
+def capture_env(
+    *,
+    redact: bool = False,
+    redact_env_vars: list[str] | None = None,
+) -> dict[str, Any]:
+    """Capture a deterministic environment snapshot.
+
+    Python, platform, package versions and the device inventory are memoised
+    per process; every call re-reads only the environment variables.
+    """
+    env_vars = {name: os.environ.get(name) for name in ENV_VARS}
+    # TODO: Add a redaction/allowlist mechanism for sensitive fields.
+    if redact:
+        redact_keys = set(redact_env_vars or env_vars.keys())
         for key in redact_keys:
-            if key in snapshot["env_vars"]:
-                snapshot["env_vars"][key] = "<redacted>"
+            if key in env_vars:
+                env_vars[key] = "<redacted>"
 
-    fingerprint_payload = dict(snapshot)
-    snapshot["fingerprint"] = _canonical_fingerprint(fingerprint_payload)
+    volatile = {"env_vars": env_vars}
+    snapshot = copy.deepcopy(_static_sections())
+    if redact:
+        snapshot["python"]["executable"] = "<redacted>"
+    snapshot.update(volatile)
+    snapshot["fingerprint"] = _incremental_fingerprint(redact, volatile)
     return snapshot
@@ -0,0 +1,55 @@
+"""Progress events of ``run``/``check`` (the ``on_event`` callback).
+
+Events are emitted from the thread doing the work, at points where every
+artifact written so far is complete: a callback may raise ``RunCancelled``
+to stop there. A stopped check keeps its partial traces and checkpoint, so
+it can be resumed (``resume=True``).
+
+Kinds, with their ``data``:
+
+- ``run_started``: ``prompts``, ``resumed_rows`` (rows already written);
+- ``batch_done``: ``batch``, ``size``, ``wall_s``, ``rows`` (written so far);
+- ``divergence``: ``status``, ``first_divergence`` of a task against run 0;
+- ``run_finished``: ``rows``, ``status`` (None for run 0 and ``run``);
+- ``artifact_written``: ``path``;
+- ``finished``: ``status``, ``category`` of the report;
+- ``cancelled``: emitted by the async API when a job stops early.
+
+With ``workers`` > 1, tasks run in other processes and only their
+``run_finished``, ``divergence`` and ``artifact_written`` events are seen.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import time
+from typing import Any, Callable
+
+EVENT_KINDS = (
+    "run_started",
+    "batch_done",
+    "divergence",
+    "run_finished",
+    "artifact_written",
+    "finished",
+    "cancelled",
+)
+
+
+class RunCancelled(Exception):
+    """Raised from an ``on_event`` callback to stop a run or check."""
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    kind: str
+    # Task label (run_0, batch_4, run), None for check-wide events.
+    task: str | None
+    data: dict[str, Any] = field(default_factory=dict)
+    time: float = field(default_factory=time.time)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"kind": self.kind, "task": self.task, "data": self.data, "time": self.time}
+
+
+EventCallback = Callable[[ProgressEvent], None]
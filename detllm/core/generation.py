@@ -0,0 +1,149 @@
+"""Prompt loading and batch generation shared by ``run``, ``check`` and ``bench``.
+
+Rows are built here exactly as they are written to traces, so every caller
+hashes, digests and stamps them the same way.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import time
+from typing import Any, Iterator
+
+from detllm.backends.base import BackendAdapter
+from detllm.core.batching import BatchPlan, plan_batches
+from detllm.core.metrics import RunMetrics
+from detllm.core.profiling import BatchProfiler
+from detllm.trace.digest import output_digest
+
+
+def load_prompts(args: argparse.Namespace) -> list[str]:
+    if args.prompt:
+        return [args.prompt]
+
+    if args.prompt_file:
+        prompts: list[str] = []
+        with open(args.prompt_file, "r", encoding="utf-8") as handle:
+            for line in handle:
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                if isinstance(data, str):
+                    prompts.append(data)
+                elif isinstance(data, dict):
+                    prompt = data.get("prompt") or data.get("text")
+                    if prompt is None:
+                        raise ValueError("Prompt file entries must include 'prompt' or 'text'")
+                    prompts.append(prompt)
+                else:
+                    raise ValueError("Prompt file entries must be JSON objects or strings")
+        return prompts
+
+    return []
+
+
+def hash_prompt(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+def hash_token_ids(token_ids: list[int]) -> str:
+    encoded = json.dumps(token_ids, separators=(",", ":"), sort_keys=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def iter_generation(
+    backend: BackendAdapter,
+    prompts: list[str],
+    args: argparse.Namespace,
+    capture_scores: bool = False,
+    plan: BatchPlan | None = None,
+    reference_rows: list[dict[str, Any]] | None = None,
+    metrics: RunMetrics | None = None,
+    profiler: BatchProfiler | None = None,
+    skip_below: int = 0,
+) -> Iterator[tuple[list[int], list[dict[str, Any]]]]:
+    """Generate batch by batch, yielding prompt indices with their trace rows.
+
+    A sampled batch stays profiled until the caller asks for the next one, so
+    the profile covers how the caller writes and compares its rows. Batches
+    whose prompt indices are all below ``skip_below`` (already written) are
+    skipped.
+    """
+    plan = plan or plan_batches(prompts)
+    step_stopping = reference_rows is not None and backend.capabilities().supports_step_stopping
+    for batch_number, batch_indices in enumerate(plan.batches(args.batch_size)):
+        if max(batch_indices) < skip_below:
+            continue
+        if profiler is not None:
+            profiler.start(batch_number)
+        try:
+            yield _generate_batch(
+                backend,
+                prompts,
+                batch_indices,
+                args,
+                capture_scores,
+                plan,
+                reference_rows if step_stopping else None,
+                metrics,
+            )
+        finally:
+            if profiler is not None:
+                profiler.stop()
+
+
+def _generate_batch(
+    backend: BackendAdapter,
+    prompts: list[str],
+    batch_indices: list[int],
+    args: argparse.Namespace,
+    capture_scores: bool,
+    plan: BatchPlan,
+    reference_rows: list[dict[str, Any]] | None,
+    metrics: RunMetrics | None,
+) -> tuple[list[int], list[dict[str, Any]]]:
+    """Generate one batch; ``reference_rows`` enables per-step divergence stopping."""
+    batch = [prompts[idx] for idx in batch_indices]
+    generate_kwargs: dict[str, Any] = {}
+    if reference_rows is not None:
+        generate_kwargs["reference_output_ids"] = [
+            reference_rows[idx]["generated_token_ids"] for idx in batch_indices
+        ]
+    started = time.perf_counter()
+    results = backend.generate(
+        batch,
+        max_new_tokens=args.max_new_tokens,
+        do_sample=False,
+        capture_scores=capture_scores,
+        **generate_kwargs,
+    )
+    if metrics is not None:
+        metrics.add_batch(
+            results,
+            time.perf_counter() - started,
+            getattr(backend, "last_batch_stats", None),
+        )
+    batch_rows = [
+        {
+            "prompt_id": hash_prompt(item["prompt"]),
+            "input_token_ids": item["input_ids"],
+            # TODO: Add a privacy mode to store only token hashes/redacted ids.
+            "input_token_ids_hash": hash_token_ids(item["input_ids"]),
+            "generated_token_ids": item["output_ids"],
+            "scores": item.get("scores"),
+            "tokenizer_id": item.get("tokenizer_id") or args.model,
+            "decoding_max_new_tokens": args.max_new_tokens,
+            "decoding_do_sample": False,
+            "decoding_temperature": args.temperature,
+            "decoding_top_p": args.top_p,
+            "decoding_top_k": args.top_k,
+            "batch_plan_id": plan.plan_id,
+            "output_digest": output_digest(
+                {"generated_token_ids": item["output_ids"], "scores": item.get("scores")}
+            ),
+        }
+        for item in results
+    ]
+    return batch_indices, batch_rows
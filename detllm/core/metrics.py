@@ -0,0 +1,136 @@
+"""Per-run performance metrics (``metrics.json``).
+
+Wall time is split into backend load and per-batch generation. Backends may
+refine a batch by exposing ``last_batch_stats`` after ``generate`` (see
+``BATCH_STAT_FIELDS``); otherwise token counts are derived from the results,
+assuming prompts are padded to the longest one in the batch.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+import sys
+import time
+from typing import Any, Iterator
+
+# Optional keys a backend may report in ``last_batch_stats``.
+BATCH_STAT_FIELDS = (
+    "tokenize_s",
+    "prefill_s",
+    "decode_s",
+    "input_tokens",
+    "padding_tokens",
+    "generated_tokens",
+)
+
+
+def peak_rss_bytes() -> int | None:
+    """Peak resident set size of this process, or None where unsupported."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return int(peak) if sys.platform == "darwin" else int(peak) * 1024
+
+
+class RunMetrics:
+    """Collects timings and token counts for one run or batch sweep."""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.load_s = 0.0
+        self.batches: list[dict[str, Any]] = []
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+    @contextmanager
+    def time_load(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.load_s += time.perf_counter() - start
+
+    def add_batch(
+        self,
+        results: list[dict[str, Any]],
+        wall_s: float,
+        stats: dict[str, Any] | None = None,
+    ) -> None:
+        stats = {key: value for key, value in (stats or {}).items() if key in BATCH_STAT_FIELDS}
+        lengths = [len(item.get("input_ids") or ()) for item in results]
+        input_tokens = stats.get("input_tokens", sum(lengths))
+        padding_tokens = stats.get(
+            "padding_tokens", max(lengths, default=0) * len(lengths) - sum(lengths)
+        )
+        generated = stats.get(
+            "generated_tokens", sum(len(item.get("output_ids") or ()) for item in results)
+        )
+        batch = {
+            "index": len(self.batches),
+            "size": len(results),
+            "wall_s": wall_s,
+            "input_tokens": input_tokens,
+            "padding_tokens": padding_tokens,
+            "generated_tokens": generated,
+            "padding_ratio": _ratio(padding_tokens, input_tokens + padding_tokens),
+            "tokens_per_s": _ratio(generated, wall_s),
+        }
+        for key in ("tokenize_s", "prefill_s", "decode_s"):
+            batch[key] = stats.get(key)
+        self.batches.append(batch)
+
+    def to_dict(self) -> dict[str, Any]:
+        wall_s = time.perf_counter() - self._wall_start
+        generate_s = sum(batch["wall_s"] for batch in self.batches)
+        input_tokens = sum(batch["input_tokens"] for batch in self.batches)
+        padding = sum(batch["padding_tokens"] for batch in self.batches)
+        generated = sum(batch["generated_tokens"] for batch in self.batches)
+        return {
+            "label": self.label,
+            "wall_s": wall_s,
+            "cpu_s": time.process_time() - self._cpu_start,
+            "load_s": self.load_s,
+            "generate_s": generate_s,
+            "tokenize_s": _phase_total(self.batches, "tokenize_s"),
+            "prefill_s": _phase_total(self.batches, "prefill_s"),
+            "decode_s": _phase_total(self.batches, "decode_s"),
+            "input_tokens": input_tokens,
+            "padding_tokens": padding,
+            "generated_tokens": generated,
+            "padding_ratio": _ratio(padding, input_tokens + padding),
+            "tokens_per_s": _ratio(generated, generate_s),
+            "peak_rss_bytes": peak_rss_bytes(),
+            "batches": self.batches,
+        }
+
+
+def summarize_metrics(runs: list[dict[str, Any]]) -> dict[str, Any]:
+    """Totals across runs, as surfaced in the report."""
+    generate_s = sum(run["generate_s"] for run in runs)
+    generated = sum(run["generated_tokens"] for run in runs)
+    input_tokens = sum(run["input_tokens"] for run in runs)
+    padding = sum(run["padding_tokens"] for run in runs)
+    peaks = [run["peak_rss_bytes"] for run in runs if run["peak_rss_bytes"] is not None]
+    return {
+        "runs": len(runs),
+        "wall_s": sum(run["wall_s"] for run in runs),
+        "cpu_s": sum(run["cpu_s"] for run in runs),
+        "load_s": sum(run["load_s"] for run in runs),
+        "generate_s": generate_s,
+        "generated_tokens": generated,
+        "tokens_per_s": _ratio(generated, generate_s),
+        "padding_ratio": _ratio(padding, input_tokens + padding),
+        "peak_rss_bytes": max(peaks) if peaks else None,
+    }
+
+
+def _phase_total(batches: list[dict[str, Any]], key: str) -> float | None:
+    values = [batch[key] for batch in batches if batch[key] is not None]
+    return sum(values) if values else None
+
+
+def _ratio(numerator: float, denominator: float) -> float | None:
+    return numerator / denominator if denominator else None
@@ -90,6 +90,8 @@ class TokenTraceRow:
     decoding_temperature: float | None = None
     decoding_top_p: float | None = None
     decoding_top_k: int | None = None
+    batch_plan_id: str | None = None
+    output_digest: str | None = None
 
     @classmethod
     def from_dict(cls, data: dict[str, Any]) -> "TokenTraceRow":
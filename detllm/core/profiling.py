@@ -0,0 +1,122 @@
+"""Opt-in profiling of generation batches (``--profile``).
+
+A sampled batch is profiled from the backend ``generate`` call until the
+caller asks for the next batch, so trace writing and on-the-fly diffing of
+that batch are included. Only the first ``batches`` batches of a run are
+sampled, which keeps the overhead bounded on long prompt files.
+
+Files land in ``<out>/profiles``:
+
+- ``cprofile``: ``<label>.pstats`` (load with ``pstats.Stats``) and a
+  ``<label>.txt`` top-N summary by cumulative time;
+- ``torch``: one Chrome trace per sampled batch
+  (``<label>.batch<N>.trace.json``) and a ``<label>.txt`` top-N summary.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import os
+from typing import Any
+
+PROFILERS = ("cprofile", "torch")
+PROFILE_DIR = "profiles"
+
+
+def profiler_available(kind: str) -> bool:
+    if kind == "torch":
+        return importlib.util.find_spec("torch") is not None
+    return kind in PROFILERS
+
+
+class BatchProfiler:
+    """Profiles the first ``batches`` batches of one run."""
+
+    def __init__(self, kind: str, out_dir: str, label: str, batches: int = 1, top: int = 30):
+        if kind not in PROFILERS:
+            raise ValueError(f"Unsupported profiler: {kind}")
+        if kind == "torch" and not profiler_available(kind):
+            raise RuntimeError("torch is required for --profile torch")
+        self.kind = kind
+        self.out_dir = os.path.join(out_dir, PROFILE_DIR)
+        self.label = label
+        self.batches = batches
+        self.top = top
+        self.sampled: list[int] = []
+        self._active: Any = None
+        self._cprofile: Any = None
+        self._summaries: list[str] = []
+        self._files: list[str] = []
+
+    def start(self, batch: int) -> bool:
+        """Start profiling ``batch`` if it is sampled; returns whether it is."""
+        if batch >= self.batches or self._active is not None:
+            return False
+        if self.kind == "cprofile":
+            import cProfile
+
+            if self._cprofile is None:
+                self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+            self._active = self._cprofile
+        else:
+            from torch import profiler as torch_profiler
+
+            activities = [torch_profiler.ProfilerActivity.CPU]
+            if _cuda_available():
+                activities.append(torch_profiler.ProfilerActivity.CUDA)
+            self._active = torch_profiler.profile(activities=activities)
+            self._active.__enter__()
+        self.sampled.append(batch)
+        return True
+
+    def stop(self) -> None:
+        active, self._active = self._active, None
+        if active is None:
+            return
+        if self.kind == "cprofile":
+            active.disable()
+            return
+        active.__exit__(None, None, None)
+        batch = self.sampled[-1]
+        os.makedirs(self.out_dir, exist_ok=True)
+        trace_path = os.path.join(self.out_dir, f"{self.label}.batch{batch}.trace.json")
+        active.export_chrome_trace(trace_path)
+        self._files.append(trace_path)
+        sort_by = "self_cuda_time_total" if _cuda_available() else "self_cpu_time_total"
+        table = active.key_averages().table(sort_by=sort_by, row_limit=self.top)
+        self._summaries.append(f"batch {batch}\n{table}")
+
+    def save(self) -> dict[str, Any] | None:
+        """Write the collected profiles; returns their description, None if nothing ran."""
+        self.stop()
+        if not self.sampled:
+            return None
+        os.makedirs(self.out_dir, exist_ok=True)
+        summary_path = os.path.join(self.out_dir, f"{self.label}.txt")
+        if self.kind == "cprofile":
+            import pstats
+
+            stats_path = os.path.join(self.out_dir, f"{self.label}.pstats")
+            self._cprofile.dump_stats(stats_path)
+            self._files.append(stats_path)
+            buffer = io.StringIO()
+            stats = pstats.Stats(self._cprofile, stream=buffer)
+            stats.sort_stats("cumulative").print_stats(self.top)
+            self._summaries.append(buffer.getvalue())
+        with open(summary_path, "w", encoding="utf-8") as handle:
+            handle.write(f"{self.label}: {self.kind}, batches {self.sampled}\n\n")
+            handle.write("\n".join(self._summaries))
+        self._files.append(summary_path)
+        return {
+            "label": self.label,
+            "batches": list(self.sampled),
+            "files": [os.path.relpath(path, os.path.dirname(self.out_dir)) for path in self._files],
+        }
+
+
+def _cuda_available() -> bool:
+    import torch
+
+    return bool(torch.cuda.is_available())
@@ -0,0 +1,148 @@
+"""Prompt sharding (``--shard i/n``) and merging of shard artifacts.
+
+A prompt belongs to shard ``int(prompt_id[:16], 16) % n``, so assignment
+depends only on the prompt text and every host computes the same split.
+Shards keep prompt-file order and record the original position of each of
+their prompts in ``shard.json``; merging interleaves shard traces back into
+prompt-file order.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import hashlib
+import heapq
+import os
+from typing import Any, Iterator, Sequence
+
+from detllm.core.artifacts import load_json
+from detllm.trace.io import iter_trace
+
+SHARD_FILENAME = "shard.json"
+
+
+class ShardMergeError(ValueError):
+    """Shard artifacts that cannot be merged into one result."""
+
+
+@dataclass(frozen=True)
+class ShardSpec:
+    index: int
+    count: int
+
+    def __post_init__(self) -> None:
+        if self.count < 1 or not 0 <= self.index < self.count:
+            raise ValueError("Shard must look like i/n with 0 <= i < n")
+
+    @classmethod
+    def parse(cls, value: str) -> "ShardSpec":
+        index, sep, count = value.partition("/")
+        if not sep:
+            raise ValueError("Shard must look like i/n with 0 <= i < n")
+        try:
+            return cls(int(index), int(count))
+        except ValueError as exc:
+            raise ValueError("Shard must look like i/n with 0 <= i < n") from exc
+
+    def owns(self, prompt_id: str) -> bool:
+        return int(prompt_id[:16], 16) % self.count == self.index
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"index": self.index, "count": self.count}
+
+
+def prompt_set_digest(prompt_ids: Sequence[str]) -> str:
+    """Digest of the full, unsharded prompt list (ids in prompt-file order)."""
+    hasher = hashlib.sha256()
+    for prompt_id in prompt_ids:
+        hasher.update(prompt_id.encode("ascii"))
+        hasher.update(b"\n")
+    return hasher.hexdigest()
+
+
+def shard_positions(prompt_ids: Sequence[str], spec: ShardSpec) -> list[int]:
+    """Prompt-file positions owned by ``spec``, ascending."""
+    return [position for position, prompt_id in enumerate(prompt_ids) if spec.owns(prompt_id)]
+
+
+def shard_metadata(
+    spec: ShardSpec,
+    command: str,
+    prompt_ids: Sequence[str],
+    positions: Sequence[int],
+    traces: dict[str, str],
+    trace_format: str,
+    complete: bool = True,
+) -> dict[str, Any]:
+    """Payload of ``shard.json``; ``traces`` maps trace labels to paths relative to the shard."""
+    return {
+        "shard": spec.to_dict(),
+        "command": command,
+        "prompts_total": len(prompt_ids),
+        "prompt_set_digest": prompt_set_digest(prompt_ids),
+        "positions": list(positions),
+        "traces": dict(traces),
+        "trace_format": trace_format,
+        "complete": complete,
+    }
+
+
+def load_shards(shard_dirs: Sequence[str]) -> list[tuple[str, dict[str, Any]]]:
+    """Load and cross-check ``shard.json`` from each directory, ordered by shard index."""
+    shards = []
+    for shard_dir in shard_dirs:
+        path = os.path.join(shard_dir, SHARD_FILENAME)
+        if not os.path.exists(path):
+            raise ShardMergeError(f"Not a shard output (no {SHARD_FILENAME}): {shard_dir}")
+        shards.append((shard_dir, load_json(path)))
+    shards.sort(key=lambda item: item[1]["shard"]["index"])
+
+    first = shards[0][1]
+    count = first["shard"]["count"]
+    for shard_dir, meta in shards:
+        for key in ("command", "prompts_total", "prompt_set_digest", "trace_format"):
+            if meta[key] != first[key]:
+                raise ShardMergeError(f"Shard {shard_dir} differs from the others in {key}")
+        if meta["shard"]["count"] != count:
+            raise ShardMergeError(
+                f"Shard {shard_dir} belongs to a {meta['shard']['count']}-way split"
+            )
+        if sorted(meta["traces"]) != sorted(first["traces"]):
+            raise ShardMergeError(
+                f"Shard {shard_dir} has different traces: {sorted(meta['traces'])}"
+            )
+        if not meta["complete"]:
+            raise ShardMergeError(f"Shard {shard_dir} did not complete")
+    indices = [meta["shard"]["index"] for _, meta in shards]
+    if indices != list(range(count)):
+        missing = sorted(set(range(count)) - set(indices))
+        duplicated = sorted({index for index in indices if indices.count(index) > 1})
+        raise ShardMergeError(
+            f"Shards do not cover 0..{count - 1}: missing {missing}, duplicated {duplicated}"
+        )
+    covered = sum(len(meta["positions"]) for _, meta in shards)
+    if covered != first["prompts_total"]:
+        raise ShardMergeError(f"Shards cover {covered} of {first['prompts_total']} prompts")
+    return shards
+
+
+def iter_merged_trace(
+    shards: Sequence[tuple[str, dict[str, Any]]], label: str
+) -> Iterator[dict[str, Any]]:
+    """Rows of trace ``label`` from every shard, in prompt-file order."""
+
+    def positioned(shard_dir: str, meta: dict[str, Any]) -> Iterator[tuple[int, dict[str, Any]]]:
+        path = os.path.join(shard_dir, meta["traces"][label])
+        positions = meta["positions"]
+        rows = iter_trace(path)
+        for position in positions:
+            row = next(rows, None)
+            if row is None:
+                raise ShardMergeError(f"{path} has fewer than {len(positions)} rows")
+            yield position, row
+        if next(rows, None) is not None:
+            raise ShardMergeError(f"{path} has more than {len(positions)} rows")
+
+    streams = [positioned(shard_dir, meta) for shard_dir, meta in shards]
+    for _, row in heapq.merge(*streams, key=lambda item: item[0]):
+        yield row
@@ -0,0 +1,52 @@
+"""In-memory artifacts of ``run``/``check`` (``write_artifacts=False``).
+
+A ``MemorySink`` takes the place of the output directory: every artifact is
+kept under the path it would have relative to ``--out`` (``env.json``,
+``envs/run_1.json``, ``traces/run_0.jsonl``, ``report.txt``...). JSON
+payloads are held as built and traces as row lists, so nothing is
+serialized until ``save()`` writes the directory a normal run produces.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any
+
+from detllm.core.artifacts import dump_json
+from detllm.trace.io import MemoryTraceWriter, TraceWriter
+
+
+class MemorySink:
+    def __init__(self, trace_format: str = "jsonl"):
+        self.trace_format = trace_format
+        self.files: dict[str, dict[str, Any] | str] = {}
+        self.traces: dict[str, list[dict[str, Any]]] = {}
+
+    def write_json(self, path: str, payload: dict[str, Any]) -> None:
+        self.files[path] = payload
+
+    def write_text(self, path: str, text: str) -> None:
+        self.files[path] = text
+
+    def trace_writer(self, path: str, validate_rows: bool = False) -> MemoryTraceWriter:
+        """A writer whose rows become the trace at ``path``."""
+        writer = MemoryTraceWriter(validate_rows=validate_rows)
+        self.traces[path] = writer.trace
+        return writer
+
+    def save(self, out_dir: str) -> None:
+        """Write every artifact under ``out_dir``; traces in this sink's trace format."""
+        for path, content in self.files.items():
+            target = os.path.join(out_dir, path)
+            if isinstance(content, str):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                with open(target, "w", encoding="utf-8") as handle:
+                    handle.write(content)
+            else:
+                dump_json(target, content)
+        for path, rows in self.traces.items():
+            target = os.path.join(out_dir, path)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with TraceWriter(target, trace_format=self.trace_format) as writer:
+                for row in rows:
+                    writer.write(row)
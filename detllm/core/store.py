@@ -0,0 +1,129 @@
+"""Content-addressed artifact store.
+
+Objects live under ``<root>/objects/<2 hex>/<62 hex>`` keyed by the SHA-256 of
+their bytes, so identical env snapshots and trace rows from repeated runs (and
+from separate check directories sharing a store) are written once. Output
+directories hold small reference files that point back into the store.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Iterable, Iterator
+
+from detllm.version import __version__
+
+REF_ARTIFACT_TYPE = "artifact_ref"
+MANIFEST_ARTIFACT_TYPE = "trace_manifest"
+_CHUNK = 1 << 20
+
+
+class ArtifactStore:
+    def __init__(self, root: str):
+        self.root = root
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.root, "objects", digest[:2], digest[2:])
+
+    def contains(self, digest: str) -> bool:
+        return os.path.exists(self.object_path(digest))
+
+    def put_bytes(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        if not self.contains(digest):
+            self._commit(digest, [data])
+        return digest
+
+    def put_lines(self, lines: Iterable[str]) -> str:
+        """Store newline-terminated lines without holding them all in memory."""
+        hasher = hashlib.sha256()
+        with tempfile.TemporaryFile() as spool:
+            for line in lines:
+                encoded = f"{line}\n".encode("utf-8")
+                hasher.update(encoded)
+                spool.write(encoded)
+            digest = hasher.hexdigest()
+            if not self.contains(digest):
+                spool.seek(0)
+                self._commit(digest, iter(lambda: spool.read(_CHUNK), b""))
+        return digest
+
+    def get_bytes(self, digest: str) -> bytes:
+        with open(self.object_path(digest), "rb") as handle:
+            data = handle.read()
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"Artifact store object is corrupt: {digest}")
+        return data
+
+    def iter_lines(self, digest: str) -> Iterator[str]:
+        with open(self.object_path(digest), "r", encoding="utf-8") as handle:
+            for line in handle:
+                line = line.strip()
+                if line:
+                    yield line
+
+    def put_json(self, payload: Any) -> str:
+        return self.put_bytes(canonical_json(payload))
+
+    def get_json(self, digest: str) -> Any:
+        return json.loads(self.get_bytes(digest))
+
+    def _commit(self, digest: str, chunks: Iterable[bytes]) -> None:
+        path = self.object_path(digest)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Concurrent writers of the same object race harmlessly: both renames install equal bytes.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as handle:
+                for chunk in chunks:
+                    handle.write(chunk)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def canonical_json(payload: Any) -> bytes:
+    return json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+def store_reference(path: str, store: ArtifactStore) -> str:
+    """Store root as recorded in a reference file: relative, so archives can move."""
+    return os.path.relpath(os.path.abspath(store.root), os.path.dirname(os.path.abspath(path)))
+
+
+def resolve_store(path: str, payload: dict[str, Any]) -> ArtifactStore:
+    root = payload["store"]
+    if not os.path.isabs(root):
+        root = os.path.join(os.path.dirname(os.path.abspath(path)), root)
+    return ArtifactStore(os.path.normpath(root))
+
+
+def dump_artifact(path: str, payload: dict[str, Any], store: ArtifactStore | None) -> None:
+    """Write ``payload`` to ``path``, or a reference to it when a store is configured."""
+    from detllm.core.artifacts import dump_json
+
+    if store is None:
+        dump_json(path, payload)
+        return
+    dump_json(
+        path,
+        {
+            "schema_version": "1.0",
+            "detllm_version": __version__,
+            "artifact_type": REF_ARTIFACT_TYPE,
+            "ref_type": payload.get("artifact_type"),
+            "digest": store.put_json(payload),
+            "store": store_reference(path, store),
+        },
+    )
+
+
+def resolve_artifact(path: str, payload: dict[str, Any]) -> dict[str, Any]:
+    if payload.get("artifact_type") != REF_ARTIFACT_TYPE:
+        return payload
+    return resolve_store(path, payload).get_json(payload["digest"])
@@ -0,0 +1,158 @@
+"""Process-pool execution of check runs and batch sweeps."""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass
+import os
+from typing import Any, Iterator, Sequence
+
+from detllm.core.batching import BatchPlan
+from detllm.core.capabilities import CapabilityDecision
+from detllm.diff.diff import DiffResult
+from detllm.logging import get_logger
+
+logger = get_logger("core.workers")
+
+# Per-process state populated by the pool initializer.
+_WORKER_STATE: dict[str, Any] = {}
+
+
+@dataclass(frozen=True)
+class GenerationTask:
+    kind: str
+    index: int
+    batch_size: int
+    profile: bool = False
+    # Continue the task's partial trace left by an interrupted check.
+    resume: bool = False
+
+    @property
+    def label(self) -> str:
+        return f"{self.kind}_{self.index}"
+
+
+@dataclass(frozen=True)
+class GenerationOutcome:
+    task: GenerationTask
+    env: dict[str, Any] | None
+    env_mismatch: bool
+    determinism: dict[str, Any] | None
+    decision: CapabilityDecision | None
+    rows: list[dict[str, Any] | None] | None
+    divergence: DiffResult | None = None
+    trace_path: str | None = None
+    rows_written: int = 0
+    metrics: dict[str, Any] | None = None
+    profile: dict[str, Any] | None = None
+
+
+def partition_cpus(workers: int) -> list[tuple[int, ...]]:
+    """Split the CPUs available to this process into one contiguous slice per worker."""
+    if hasattr(os, "sched_getaffinity"):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    workers = max(1, min(workers, len(cpus)))
+    size, extra = divmod(len(cpus), workers)
+    slices: list[tuple[int, ...]] = []
+    start = 0
+    for idx in range(workers):
+        end = start + size + (1 if idx < extra else 0)
+        slices.append(tuple(cpus[start:end]))
+        start = end
+    return slices
+
+
+def run_parallel(
+    args: argparse.Namespace,
+    prompts: Sequence[str],
+    tasks: Sequence[GenerationTask],
+    workers: int,
+    baseline_fingerprint: str | None,
+    plan: BatchPlan | None = None,
+    backend_adapter: Any = None,
+) -> Iterator[GenerationOutcome]:
+    """Run tasks in worker processes and yield outcomes in task order."""
+    # Imported here so commands that never fan out skip multiprocessing's import cost.
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+
+    slices = partition_cpus(workers)
+    context = multiprocessing.get_context("spawn")
+    slot_queue = context.Queue()
+    for cpus in slices:
+        slot_queue.put(cpus)
+
+    worker_args = argparse.Namespace(**vars(args))
+    # Event callbacks stay in this process; workers' tasks are reported as they finish.
+    worker_args.on_event = None
+    logger.info("Running %s tasks on %s worker processes", len(tasks), len(slices))
+    with ProcessPoolExecutor(
+        max_workers=len(slices),
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(slot_queue,),
+    ) as executor:
+        futures = [
+            executor.submit(
+                _run_task,
+                worker_args,
+                list(prompts),
+                task,
+                baseline_fingerprint,
+                plan,
+                backend_adapter,
+            )
+            for task in tasks
+        ]
+        try:
+            for future in futures:
+                yield future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+def _init_worker(slot_queue: Any) -> None:
+    cpus = slot_queue.get()
+    if hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as exc:
+            logger.debug("Could not pin worker to CPUs %s: %s", cpus, exc)
+    try:
+        import torch
+
+        torch.set_num_threads(len(cpus))
+    except Exception:
+        pass
+    _WORKER_STATE["cpus"] = cpus
+    _WORKER_STATE["pool"] = None
+
+
+def _run_task(
+    args: argparse.Namespace,
+    prompts: list[str],
+    task: GenerationTask,
+    baseline_fingerprint: str | None,
+    plan: BatchPlan | None,
+    backend_adapter: Any,
+) -> GenerationOutcome:
+    from detllm.backends.pool import BackendPool
+    from detllm.cli import main as cli_main
+
+    pool = _WORKER_STATE.get("pool")
+    if pool is None and not getattr(args, "reload_per_run", False):
+        pool = BackendPool()
+        _WORKER_STATE["pool"] = pool
+    return cli_main._generate_task(
+        args,
+        prompts,
+        task,
+        baseline_fingerprint,
+        plan,
+        pool=pool,
+        backend_adapter=backend_adapter,
+        capture_task_env=True,
+    )
@@ -0,0 +1,95 @@
+"""N-way divergence analysis across every run of a check.
+
+Each row's outputs (generated tokens and scores) are reduced to a digest, so
+runs are grouped into equivalence classes by comparing digests in
+O(runs x rows) rather than diffing every pair of traces.
+"""
+
+from __future__ import annotations
+
+from collections import Counter
+import hashlib
+from typing import Any, Iterable
+
+from detllm.diff.diff import first_token_divergence
+from detllm.trace.digest import output_digest
+
+
+class DivergenceAnalyzer:
+    """Accumulates per-row output digests for each trace, baseline first."""
+
+    def __init__(self) -> None:
+        self.labels: list[str] = []
+        self._digests: list[list[str]] = []
+        self._prompt_ids: list[str | None] = []
+        self._baseline_tokens: list[list[int]] = []
+        # row index -> (trace position, first differing token or None if score-only).
+        self._divergences: dict[int, list[tuple[int, int | None]]] = {}
+
+    def add_trace(self, label: str, rows: Iterable[dict[str, Any]]) -> None:
+        position = len(self.labels)
+        digests: list[str] = []
+        for idx, row in enumerate(rows):
+            digest = row.get("output_digest") or output_digest(row, allow_nan=True)
+            digests.append(digest)
+            tokens = row.get("generated_token_ids") or []
+            if position == 0:
+                self._prompt_ids.append(row.get("prompt_id"))
+                self._baseline_tokens.append(tokens)
+            elif idx < len(self._digests[0]) and digest != self._digests[0][idx]:
+                token_index = first_token_divergence(self._baseline_tokens[idx], tokens)
+                self._divergences.setdefault(idx, []).append((position, token_index))
+        self.labels.append(label)
+        self._digests.append(digests)
+
+    def result(self) -> dict[str, Any]:
+        total = len(self._digests[0]) if self._digests else 0
+        per_prompt = []
+        histogram: Counter[int] = Counter()
+        score_only = 0
+        for idx in sorted(self._divergences):
+            divergences = self._divergences[idx]
+            outputs = {digests[idx] for digests in self._digests if idx < len(digests)}
+            token_positions = [pos for _, pos in divergences if pos is not None]
+            histogram.update(token_positions)
+            score_only += len(divergences) - len(token_positions)
+            per_prompt.append(
+                {
+                    "index": idx,
+                    "prompt_id": self._prompt_ids[idx],
+                    "distinct_outputs": len(outputs),
+                    "runs_diverged": [self.labels[position] for position, _ in divergences],
+                    "first_token_index": min(token_positions) if token_positions else None,
+                }
+            )
+
+        return {
+            "baseline": self.labels[0] if self.labels else None,
+            "traces": [
+                {"label": label, "rows": len(digests)}
+                for label, digests in zip(self.labels, self._digests, strict=True)
+            ],
+            "clusters": self._clusters(),
+            "prompts": {
+                "total": total,
+                "diverged": len(per_prompt),
+                "per_prompt": per_prompt,
+            },
+            "positions": {
+                "histogram": [
+                    {"token_index": token_index, "count": count}
+                    for token_index, count in sorted(histogram.items())
+                ],
+                "score_only": score_only,
+            },
+        }
+
+    def _clusters(self) -> list[dict[str, Any]]:
+        groups: dict[str, list[str]] = {}
+        for label, digests in zip(self.labels, self._digests, strict=True):
+            key = hashlib.sha256("\n".join(digests).encode("ascii")).hexdigest()
+            groups.setdefault(key, []).append(label)
+        # Insertion order puts the baseline's cluster first.
+        return [
+            {"digest": key, "size": len(labels), "traces": labels} for key, labels in groups.items()
+        ]
@@ -0,0 +1,235 @@
+"""Persistent diff result cache.
+
+Results are keyed by the identity of both traces (their write-time digest, or
+a hash of the file bytes for older traces), the diff parameters and the detLLM
+version, so repeating a diff against the same baseline is a single file read.
+Baselines that are not already binary are also kept as binary traces (with an
+index) so a new right-hand trace is compared without reparsing JSON.
+
+Everything lives under one directory and is evicted least-recently-used first
+once the directory grows past ``max_bytes``. A size ledger tracks the bytes
+written, so the directory is only walked when the ledger crosses the budget;
+eviction then trims it to ``EVICT_TO`` of the budget.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Callable
+
+from detllm.core.store import canonical_json
+from detllm.diff.diff import DiffResult
+from detllm.diff.files import diff_trace_files, score_drift_files
+from detllm.diff.tolerance import ScoreTolerance
+from detllm.trace.binary import is_binary_trace
+from detllm.trace.digest import file_sha256
+from detllm.trace.io import convert_trace, trace_digest
+from detllm.version import __version__
+
+CACHE_VERSION = 1
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Fraction of ``max_bytes`` an eviction trims the cache down to.
+EVICT_TO = 0.9
+LEDGER_FILENAME = "ledger.json"
+
+
+class DiffCache:
+    def __init__(self, root: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+
+    def trace_key(self, path: str) -> str:
+        """Identity of a trace: its write-time digest, else a hash of its bytes.
+
+        The digest is read without scanning the trace (binary and manifest
+        headers, or a JSONL sidecar bound by ``file_stamp``); only traces
+        without one are hashed in full.
+        """
+        digest = trace_digest(path)
+        if digest is not None:
+            return f"rows:{digest}"
+        return f"file:{file_sha256(path)}"
+
+    def lookup(self, kind: str, params: dict[str, Any]) -> Any | None:
+        return self._read_json(self._entry_path("results", self._key(kind, params), ".json"))
+
+    def store(self, kind: str, params: dict[str, Any], payload: Any) -> None:
+        path = self._entry_path("results", self._key(kind, params), ".json")
+        self._write_json(path, payload)
+        self._account(os.path.getsize(path))
+
+    def memo(self, kind: str, params: dict[str, Any], compute: Callable[[], Any]) -> Any:
+        payload = self.lookup(kind, params)
+        if payload is None:
+            payload = compute()
+            self.store(kind, params, payload)
+        return payload
+
+    def baseline(self, path: str, key: str | None = None) -> str:
+        """Path of a cached binary (indexed) copy of the trace at ``path``."""
+        if is_binary_trace(path):
+            return path
+        key = key or self.trace_key(path)
+        cached = self._entry_path("traces", _hash(key.encode("utf-8")), ".dtrace")
+        if os.path.exists(cached):
+            os.utime(cached)
+            return cached
+        os.makedirs(os.path.dirname(cached), exist_ok=True)
+        # Converted under a temporary name so a crash never leaves a partial cached trace.
+        tmp_path = os.path.join(
+            os.path.dirname(cached), f".tmp-{os.getpid()}-{os.path.basename(cached)}"
+        )
+        try:
+            convert_trace(path, tmp_path, "binary", index=True)
+            os.replace(f"{tmp_path}.idx", f"{cached}.idx")
+            os.replace(tmp_path, cached)
+        finally:
+            for leftover in (tmp_path, f"{tmp_path}.idx"):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        self._account(os.path.getsize(cached) + os.path.getsize(f"{cached}.idx"))
+        return cached
+
+    def evict(self, target: int | None = None) -> None:
+        """Remove least recently used entries until the cache fits ``target`` (``max_bytes``)."""
+        target = self.max_bytes if target is None else target
+        ledger = self._ledger_path()
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if path == ledger:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, path))
+                total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._write_json(ledger, {"bytes": total})
+
+    def _account(self, added: int) -> None:
+        # The ledger is approximate under concurrent writers; every eviction walk resets it.
+        try:
+            with open(self._ledger_path(), "r", encoding="utf-8") as handle:
+                total = json.load(handle)["bytes"] + added
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            # No ledger yet (or a cache from an older version): measure the directory once.
+            self.evict()
+            return
+        if total > self.max_bytes:
+            self.evict(int(self.max_bytes * EVICT_TO))
+        else:
+            self._write_json(self._ledger_path(), {"bytes": total})
+
+    def _ledger_path(self) -> str:
+        return os.path.join(self.root, LEDGER_FILENAME)
+
+    def _key(self, kind: str, params: dict[str, Any]) -> str:
+        return _hash(
+            canonical_json(
+                {
+                    "kind": kind,
+                    "cache_version": CACHE_VERSION,
+                    "detllm_version": __version__,
+                    **params,
+                }
+            )
+        )
+
+    def _entry_path(self, section: str, key: str, suffix: str) -> str:
+        return os.path.join(self.root, section, key[:2], f"{key[2:]}{suffix}")
+
+    def _read_json(self, path: str) -> Any | None:
+        try:
+            with open(path, "r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Reads refresh the entry's position in the LRU order.
+        os.utime(path)
+        return payload
+
+    def _write_json(self, path: str, payload: Any) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as handle:
+                json.dump(payload, handle, sort_keys=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def cached_diff_trace_files(
+    cache: DiffCache,
+    left: str,
+    right: str,
+    align: str = "position",
+    engine: str = "auto",
+    tolerance: ScoreTolerance | None = None,
+) -> DiffResult:
+    """``diff_trace_files`` through ``cache``; the left trace is treated as the baseline."""
+    left_key = cache.trace_key(left)
+    params = _params(left_key, cache.trace_key(right), align, tolerance)
+
+    def compute() -> dict[str, Any]:
+        result = diff_trace_files(
+            cache.baseline(left, left_key), right, align=align, engine=engine, tolerance=tolerance
+        )
+        return {
+            "status": result.status,
+            "category": result.category,
+            "first_divergence": result.first_divergence,
+        }
+
+    return DiffResult(**cache.memo("diff", params, compute))
+
+
+def cached_score_drift_files(
+    cache: DiffCache,
+    left: str,
+    right: str,
+    align: str = "position",
+    tolerance: ScoreTolerance | None = None,
+) -> dict[str, Any]:
+    """``score_drift_files`` through ``cache``."""
+    left_key = cache.trace_key(left)
+    params = _params(left_key, cache.trace_key(right), align, tolerance)
+    return cache.memo(
+        "score_drift",
+        params,
+        lambda: score_drift_files(
+            cache.baseline(left, left_key), right, align=align, tolerance=tolerance
+        ),
+    )
+
+
+def _params(
+    left_key: str, right_key: str, align: str, tolerance: ScoreTolerance | None
+) -> dict[str, Any]:
+    # The engine is not part of the key: every engine returns identical results.
+    return {
+        "left": left_key,
+        "right": right_key,
+        "align": align,
+        "tolerance": (tolerance or ScoreTolerance()).to_dict(),
+    }
+
+
+def _hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
@@ -2,8 +2,24 @@
 
 from __future__ import annotations
 
+from collections import defaultdict, deque
 from dataclasses import dataclass
-from typing import Any, Iterable
+from typing import Any, Iterable, Iterator, Sequence
+
+from detllm.diff.tolerance import ScoreDrift, ScoreTolerance
+
+ALIGN_MODES = ("position", "prompt_id")
+DIFF_ENGINES = ("auto", "python", "numpy")
+# Below this many rows, packing arrays costs more than the Python loop saves.
+NUMPY_MIN_ROWS = 1024
+CONTEXT_FIELDS = (
+    "decoding_max_new_tokens",
+    "decoding_do_sample",
+    "decoding_temperature",
+    "decoding_top_p",
+    "decoding_top_k",
+    "batch_plan_id",
+)
 
 
 @dataclass(frozen=True)
@@ -26,103 +42,276 @@ def first_token_divergence(a: list[int], b: list[int]) -> int | None:
 def diff_traces(
     base: list[dict[str, Any]],
     other: list[dict[str, Any]],
+    align: str = "position",
+    engine: str = "auto",
+    tolerance: ScoreTolerance | None = None,
 ) -> DiffResult:
+    """Compare two traces row by row.
+
+    ``align="prompt_id"`` pairs rows by prompt id instead of position, so
+    reordered traces compare equal and missing prompts are reported by id.
+    ``engine`` picks the pure-Python or NumPy implementation of positional
+    diffs; ``auto`` uses NumPy for large traces when it is installed.
+    ``tolerance`` relaxes score comparison (exact by default).
+    """
+    if align not in ALIGN_MODES:
+        raise ValueError(f"Unsupported alignment: {align}")
+    if engine not in DIFF_ENGINES:
+        raise ValueError(f"Unsupported diff engine: {engine}")
+    if align == "position" and _use_numpy(engine, len(base)):
+        from detllm.diff.vectorized import diff_traces_vectorized
+
+        return diff_traces_vectorized(base, other, tolerance=tolerance)
+    if align == "prompt_id":
+        pairs = pair_by_prompt_id(
+            [row.get("prompt_id") for row in base],
+            [row.get("prompt_id") for row in other],
+        )
+        for left_idx, right_idx in pairs:
+            result = diff_pair(
+                left_idx,
+                right_idx,
+                base[left_idx] if left_idx is not None else None,
+                other[right_idx] if right_idx is not None else None,
+                tolerance=tolerance,
+            )
+            if result is not None:
+                return result
+        return DiffResult(status="PASS", category="PASS", first_divergence=None)
+
     if len(base) != len(other):
+        return _length_mismatch(len(base), len(other))
+
+    for idx, (left, right) in enumerate(zip(base, other)):
+        result = diff_row(idx, left, right, tolerance)
+        if result is not None:
+            return result
+
+    return DiffResult(status="PASS", category="PASS", first_divergence=None)
+
+
+def pair_by_prompt_id(
+    left_ids: Sequence[str | None],
+    right_ids: Sequence[str | None],
+) -> Iterator[tuple[int | None, int | None]]:
+    """Pair row positions with equal prompt ids; repeated ids pair up in order.
+
+    Yields every left row in order (with None when unmatched), then the
+    leftover right rows.
+    """
+    positions: dict[str | None, deque[int]] = defaultdict(deque)
+    for right_idx, prompt_id in enumerate(right_ids):
+        positions[prompt_id].append(right_idx)
+    for left_idx, prompt_id in enumerate(left_ids):
+        queue = positions.get(prompt_id)
+        yield left_idx, queue.popleft() if queue else None
+    for right_idx in sorted(idx for queue in positions.values() for idx in queue):
+        yield None, right_idx
+
+
+def diff_pair(
+    left_idx: int | None,
+    right_idx: int | None,
+    left: dict[str, Any] | None,
+    right: dict[str, Any] | None,
+    tolerance: ScoreTolerance | None = None,
+) -> DiffResult | None:
+    """Compare rows paired by prompt id; an unpaired side is a context mismatch."""
+    if left is None or right is None:
+        missing_from = "left" if left is None else "right"
+        present = right if left is None else left
         return DiffResult(
             status="FAIL",
             category="GEN_CONTEXT_MISMATCH",
             first_divergence={
-                "reason": "trace lengths differ",
-                "left_len": len(base),
-                "right_len": len(other),
+                "index": left_idx,
+                "right_index": right_idx,
+                "reason": f"prompt_id missing from {missing_from} trace",
+                "prompt_id": present.get("prompt_id") if present else None,
             },
         )
+    result = diff_row(left_idx, left, right, tolerance)
+    if result is None or left_idx == right_idx:
+        return result
+    return DiffResult(
+        status=result.status,
+        category=result.category,
+        first_divergence={**(result.first_divergence or {}), "right_index": right_idx},
+    )
 
-    for idx, (left, right) in enumerate(zip(base, other)):
-        if left.get("prompt_id") != right.get("prompt_id"):
-            return DiffResult(
-                status="FAIL",
-                category="GEN_CONTEXT_MISMATCH",
-                first_divergence={
-                    "index": idx,
-                    "reason": "prompt_id mismatch",
-                    "left_prompt_id": left.get("prompt_id"),
-                    "right_prompt_id": right.get("prompt_id"),
-                },
-            )
 
-        if left.get("input_token_ids_hash") != right.get("input_token_ids_hash"):
-            return DiffResult(
-                status="FAIL",
-                category="TOKENIZATION_MISMATCH",
-                first_divergence={
-                    "index": idx,
-                    "reason": "input_token_ids_hash mismatch",
-                    "left_hash": left.get("input_token_ids_hash"),
-                    "right_hash": right.get("input_token_ids_hash"),
-                },
-            )
+class TraceComparator:
+    """Incrementally compare rows against a resident baseline trace.
+
+    Rows may arrive in any order (e.g. length-bucketed batches); ``result()``
+    reports the same divergence ``diff_traces`` would for the full trace.
+    Every paired row also feeds ``drift``, when given.
+    """
+
+    def __init__(
+        self,
+        baseline: Sequence[dict[str, Any]],
+        tolerance: ScoreTolerance | None = None,
+        drift: ScoreDrift | None = None,
+        label: str | None = None,
+    ):
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.drift = drift
+        self.label = label
+        self.rows_seen = 0
+        self._failure: tuple[int, DiffResult] | None = None
+
+    def add(self, idx: int, row: dict[str, Any]) -> DiffResult | None:
+        """Compare one row; returns its failure, if any."""
+        self.rows_seen += 1
+        if idx >= len(self.baseline):
+            return None
+        if self.drift is not None:
+            self.drift.add(idx, self.baseline[idx], row, self.label)
+        result = diff_row(idx, self.baseline[idx], row, self.tolerance)
+        if result is not None and (self._failure is None or idx < self._failure[0]):
+            self._failure = (idx, result)
+        return result
+
+    @property
+    def failure(self) -> DiffResult | None:
+        """Lowest-index row failure seen so far."""
+        return self._failure[1] if self._failure is not None else None
+
+    def result(self) -> DiffResult:
+        if self.rows_seen != len(self.baseline):
+            return _length_mismatch(len(self.baseline), self.rows_seen)
+        if self._failure is not None:
+            return self._failure[1]
+        return DiffResult(status="PASS", category="PASS", first_divergence=None)
 
-        if _field_mismatch(left, right, "tokenizer_id"):
-            return DiffResult(
-                status="FAIL",
-                category="TOKENIZATION_MISMATCH",
-                first_divergence={
-                    "index": idx,
-                    "reason": "tokenizer_id mismatch",
-                    "left_tokenizer_id": left.get("tokenizer_id"),
-                    "right_tokenizer_id": right.get("tokenizer_id"),
-                },
-            )
 
-        decoding_fields = (
-            "decoding_max_new_tokens",
-            "decoding_do_sample",
-            "decoding_temperature",
-            "decoding_top_p",
-            "decoding_top_k",
+def diff_trace_stream(
+    base: Sequence[dict[str, Any]],
+    other: Iterable[dict[str, Any]],
+    tolerance: ScoreTolerance | None = None,
+    drift: ScoreDrift | None = None,
+    label: str | None = None,
+) -> DiffResult:
+    """Like ``diff_traces`` but consumes ``other`` lazily."""
+    comparator = TraceComparator(base, tolerance=tolerance, drift=drift, label=label)
+    for idx, row in enumerate(other):
+        comparator.add(idx, row)
+    return comparator.result()
+
+
+def diff_row(
+    idx: int,
+    left: dict[str, Any],
+    right: dict[str, Any],
+    tolerance: ScoreTolerance | None = None,
+) -> DiffResult | None:
+    """Compare one pair of trace rows; returns the failing result or None."""
+    if left.get("prompt_id") != right.get("prompt_id"):
+        return DiffResult(
+            status="FAIL",
+            category="GEN_CONTEXT_MISMATCH",
+            first_divergence={
+                "index": idx,
+                "reason": "prompt_id mismatch",
+                "left_prompt_id": left.get("prompt_id"),
+                "right_prompt_id": right.get("prompt_id"),
+            },
         )
-        for field_name in decoding_fields:
-            if _field_mismatch(left, right, field_name):
-                return DiffResult(
-                    status="FAIL",
-                    category="GEN_CONTEXT_MISMATCH",
-                    first_divergence={
-                        "index": idx,
-                        "reason": f"{field_name} mismatch",
-                        "left_value": left.get(field_name),
-                        "right_value": right.get(field_name),
-                    },
-                )
-
-        divergence = first_token_divergence(
-            left.get("generated_token_ids", []),
-            right.get("generated_token_ids", []),
+
+    if left.get("input_token_ids_hash") != right.get("input_token_ids_hash"):
+        return DiffResult(
+            status="FAIL",
+            category="TOKENIZATION_MISMATCH",
+            first_divergence={
+                "index": idx,
+                "reason": "input_token_ids_hash mismatch",
+                "left_hash": left.get("input_token_ids_hash"),
+                "right_hash": right.get("input_token_ids_hash"),
+            },
         )
-        if divergence is not None:
-            return DiffResult(
-                status="FAIL",
-                category="RUN_VARIANCE_FIXED_BATCH",
-                first_divergence={
-                    "index": idx,
-                    "token_index": divergence,
-                    "left_token": _safe_token(left, divergence),
-                    "right_token": _safe_token(right, divergence),
-                },
-            )
 
-        score_divergence = _first_score_divergence(left.get("scores"), right.get("scores"))
-        if score_divergence is not None:
+    if _field_mismatch(left, right, "tokenizer_id"):
+        return DiffResult(
+            status="FAIL",
+            category="TOKENIZATION_MISMATCH",
+            first_divergence={
+                "index": idx,
+                "reason": "tokenizer_id mismatch",
+                "left_tokenizer_id": left.get("tokenizer_id"),
+                "right_tokenizer_id": right.get("tokenizer_id"),
+            },
+        )
+
+    for field_name in CONTEXT_FIELDS:
+        if _field_mismatch(left, right, field_name):
             return DiffResult(
                 status="FAIL",
-                category="SCORE_VARIANCE",
+                category="GEN_CONTEXT_MISMATCH",
                 first_divergence={
                     "index": idx,
-                    "score_index": score_divergence,
+                    "reason": f"{field_name} mismatch",
+                    "left_value": left.get(field_name),
+                    "right_value": right.get(field_name),
                 },
             )
 
-    return DiffResult(status="PASS", category="PASS", first_divergence=None)
+    # Equal output digests mean equal tokens and scores; skip the element-wise pass.
+    digest = left.get("output_digest")
+    if digest is not None and digest == right.get("output_digest"):
+        return None
+
+    divergence = first_token_divergence(
+        left.get("generated_token_ids", []),
+        right.get("generated_token_ids", []),
+    )
+    if divergence is not None:
+        return DiffResult(
+            status="FAIL",
+            category="RUN_VARIANCE_FIXED_BATCH",
+            first_divergence={
+                "index": idx,
+                "token_index": divergence,
+                "left_token": _safe_token(left, divergence),
+                "right_token": _safe_token(right, divergence),
+            },
+        )
+
+    score_divergence = _first_score_divergence(left.get("scores"), right.get("scores"), tolerance)
+    if score_divergence is not None:
+        return DiffResult(
+            status="FAIL",
+            category="SCORE_VARIANCE",
+            first_divergence={
+                "index": idx,
+                "score_index": score_divergence,
+            },
+        )
+
+    return None
+
+
+def _use_numpy(engine: str, rows: int) -> bool:
+    if engine == "python":
+        return False
+    if engine == "numpy":
+        return True
+    from detllm.diff.vectorized import numpy_available
+
+    return rows >= NUMPY_MIN_ROWS and numpy_available()
+
+
+def _length_mismatch(left_len: int, right_len: int) -> DiffResult:
+    return DiffResult(
+        status="FAIL",
+        category="GEN_CONTEXT_MISMATCH",
+        first_divergence={
+            "reason": "trace lengths differ",
+            "left_len": left_len,
+            "right_len": right_len,
+        },
+    )
 
 
 def _safe_token(row: dict[str, Any], index: int) -> int | None:
@@ -135,13 +324,19 @@ def _safe_token(row: dict[str, Any], index: int) -> int | None:
 def _first_score_divergence(
     left_scores: list[float] | None,
     right_scores: list[float] | None,
+    tolerance: ScoreTolerance | None = None,
 ) -> int | None:
     if left_scores is None or right_scores is None:
         return None
     n = min(len(left_scores), len(right_scores))
-    for i in range(n):
-        if left_scores[i] != right_scores[i]:
-            return i
+    if tolerance is not None and not tolerance.exact:
+        for i in range(n):
+            if not tolerance.close(left_scores[i], right_scores[i]):
+                return i
+    else:
+        for i in range(n):
+            if left_scores[i] != right_scores[i]:
+                return i
     if len(left_scores) != len(right_scores):
         return n
     return None
@@ -0,0 +1,138 @@
+"""Diffing trace files, using their index sidecars when both have one."""
+
+from __future__ import annotations
+
+from typing import Any
+
+from detllm.diff.diff import (
+    ALIGN_MODES,
+    DIFF_ENGINES,
+    DiffResult,
+    _length_mismatch,
+    diff_pair,
+    diff_row,
+    diff_trace_stream,
+    diff_traces,
+    pair_by_prompt_id,
+)
+from detllm.diff.tolerance import ScoreDrift, ScoreTolerance
+from detllm.diff.vectorized import diff_binary_traces, numpy_available
+from detllm.trace.binary import is_binary_trace
+from detllm.trace.index import StaleIndexError, TraceIndex
+from detllm.trace.io import iter_trace, read_trace, trace_digest
+
+
+def diff_trace_files(
+    left: str,
+    right: str,
+    align: str = "position",
+    engine: str = "auto",
+    tolerance: ScoreTolerance | None = None,
+) -> DiffResult:
+    """Diff two trace files; same result as ``diff_traces`` on their rows.
+
+    Traces with equal write-time digests pass without reading a row. With
+    current indexes on both sides, rows whose digests match are skipped
+    and only differing rows are read from disk (a row that no longer matches
+    its index entry falls back to the unindexed diff). Two binary traces are diffed
+    straight from their mapped buffers by the NumPy engine when it is available;
+    other positional diffs stream the right-hand trace unless ``engine="numpy"``.
+    """
+    if align not in ALIGN_MODES:
+        raise ValueError(f"Unsupported alignment: {align}")
+    if engine not in DIFF_ENGINES:
+        raise ValueError(f"Unsupported diff engine: {engine}")
+    if same_trace_digest(left, right):
+        return DiffResult(status="PASS", category="PASS", first_divergence=None)
+    left_index = TraceIndex.load(left)
+    right_index = TraceIndex.load(right)
+    if left_index is not None and right_index is not None:
+        try:
+            return _diff_indexed(left_index, right_index, align, tolerance)
+        except StaleIndexError:
+            pass
+    if align == "position" and engine != "python":
+        if (
+            is_binary_trace(left)
+            and is_binary_trace(right)
+            and (engine == "numpy" or numpy_available())
+        ):
+            return diff_binary_traces(left, right, tolerance)
+        if engine == "numpy":
+            return diff_traces(
+                read_trace(left), read_trace(right), engine="numpy", tolerance=tolerance
+            )
+    if align == "position":
+        return diff_trace_stream(read_trace(left), iter_trace(right), tolerance)
+    return diff_traces(read_trace(left), read_trace(right), align=align, tolerance=tolerance)
+
+
+def score_drift_files(
+    left: str,
+    right: str,
+    align: str = "position",
+    tolerance: ScoreTolerance | None = None,
+) -> dict[str, Any]:
+    """Score drift statistics over every paired row of two trace files.
+
+    Positional drift is only defined for traces of equal length; a length
+    mismatch raises ``ValueError``.
+    """
+    drift = ScoreDrift(tolerance)
+    if same_trace_digest(left, right):
+        drift.add_equal_rows(iter_trace(left))
+    elif align == "position":
+        pairs = zip(iter_trace(left), iter_trace(right), strict=True)
+        for idx, (left_row, right_row) in enumerate(pairs):
+            drift.add(idx, left_row, right_row)
+    else:
+        left_rows, right_rows = read_trace(left), read_trace(right)
+        pairs = pair_by_prompt_id(
+            [row.get("prompt_id") for row in left_rows],
+            [row.get("prompt_id") for row in right_rows],
+        )
+        for left_idx, right_idx in pairs:
+            if left_idx is not None and right_idx is not None:
+                drift.add(left_idx, left_rows[left_idx], right_rows[right_idx])
+    return drift.to_dict()
+
+
+def same_trace_digest(left: str, right: str) -> bool:
+    left_digest = trace_digest(left)
+    return left_digest is not None and left_digest == trace_digest(right)
+
+
+def _diff_indexed(
+    left: TraceIndex, right: TraceIndex, align: str, tolerance: ScoreTolerance | None
+) -> DiffResult:
+    if align == "position":
+        if len(left.entries) != len(right.entries):
+            return _length_mismatch(len(left.entries), len(right.entries))
+        pairs = [(idx, idx) for idx in range(len(left.entries))]
+    else:
+        pairs = pair_by_prompt_id(
+            [entry.prompt_id for entry in left.entries],
+            [entry.prompt_id for entry in right.entries],
+        )
+
+    for left_idx, right_idx in pairs:
+        left_entry = left.entries[left_idx] if left_idx is not None else None
+        right_entry = right.entries[right_idx] if right_idx is not None else None
+        if left_entry is None or right_entry is None:
+            return diff_pair(
+                left_idx,
+                right_idx,
+                {"prompt_id": left_entry.prompt_id} if left_entry else None,
+                {"prompt_id": right_entry.prompt_id} if right_entry else None,
+            )
+        if left_entry.digest == right_entry.digest:
+            continue
+        (left_row,) = left.read([left_entry])
+        (right_row,) = right.read([right_entry])
+        if align == "position":
+            result = diff_row(left_idx, left_row, right_row, tolerance)
+        else:
+            result = diff_pair(left_idx, right_idx, left_row, right_row, tolerance)
+        if result is not None:
+            return result
+    return DiffResult(status="PASS", category="PASS", first_divergence=None)
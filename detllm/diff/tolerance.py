@@ -0,0 +1,256 @@
+"""Score tolerances and score drift statistics.
+
+Scores compare exactly by default. A ``ScoreTolerance`` accepts differences
+within an absolute/relative bound or a number of ULPs (units in the last
+place), so a Tier 2 gate can ignore last-bit noise. ``ScoreDrift`` measures
+how far paired scores actually moved, over every row, in one pass.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import heapq
+import math
+import struct
+from typing import Any, Sequence
+
+_INT64_MIN = -(2**63)
+
+
+@dataclass(frozen=True)
+class ScoreTolerance:
+    """Scores ``a`` (left/baseline) and ``b`` match if equal, if
+    ``|a - b| <= atol + rtol * |a|``, or if they are at most ``ulps`` apart.
+    NaN never matches."""
+
+    atol: float = 0.0
+    rtol: float = 0.0
+    ulps: int = 0
+
+    def __post_init__(self) -> None:
+        if self.atol < 0 or self.rtol < 0 or self.ulps < 0:
+            raise ValueError("Score tolerances must be non-negative")
+
+    @property
+    def exact(self) -> bool:
+        return not (self.atol or self.rtol or self.ulps)
+
+    def close(self, a: float, b: float) -> bool:
+        if a == b:
+            return True
+        if (self.atol or self.rtol) and abs(a - b) <= self.atol + self.rtol * abs(a):
+            return True
+        return bool(self.ulps) and math.isfinite(a - b) and ulp_distance(a, b) <= self.ulps
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"atol": self.atol, "rtol": self.rtol, "ulps": self.ulps}
+
+
+def ulp_distance(a: float, b: float) -> int:
+    """Number of representable doubles between ``a`` and ``b`` (huge for NaN)."""
+    return abs(_ordered_bits(a) - _ordered_bits(b))
+
+
+def _ordered_bits(value: float) -> int:
+    # Map IEEE-754 bit patterns onto integers that order like the floats (-0.0 == 0.0).
+    (bits,) = struct.unpack("<q", struct.pack("<d", value))
+    return _INT64_MIN - bits if bits < 0 else bits
+
+
+class ScoreDrift:
+    """Single-pass drift statistics over paired score rows.
+
+    Values are buffered and reduced in chunks, vectorised with NumPy when it is
+    installed. Only positions both rows have are compared; rows whose output
+    digests match count as compared without being read.
+    """
+
+    def __init__(
+        self,
+        tolerance: ScoreTolerance | None = None,
+        top_k: int = 5,
+        chunk_values: int = 1 << 16,
+    ):
+        self.tolerance = tolerance or ScoreTolerance()
+        self.top_k = top_k
+        self.chunk_values = chunk_values
+        self.values_compared = 0
+        self.values_differing = 0
+        self.beyond_tolerance = 0
+        self.non_finite = 0
+        self.max_ulps = 0
+        self._abs_sum = 0.0
+        self._finite = 0
+        self._max_abs = 0.0
+        self._buckets: dict[int, int] = {}
+        # Min-heap of (abs_diff, order, position) for the largest drifts seen.
+        self._largest: list[tuple[float, int, dict[str, Any]]] = []
+        self._order = 0
+        self._left: list[float] = []
+        self._right: list[float] = []
+        self._positions: list[tuple[str | None, int, int]] = []
+
+    def add(
+        self,
+        idx: int,
+        left: dict[str, Any],
+        right: dict[str, Any],
+        label: str | None = None,
+    ) -> None:
+        left_scores = left.get("scores")
+        right_scores = right.get("scores")
+        if left_scores is None or right_scores is None:
+            return
+        count = min(len(left_scores), len(right_scores))
+        digest = left.get("output_digest")
+        if digest is not None and digest == right.get("output_digest"):
+            self._add_equal(count)
+            return
+        self.values_compared += count
+        self._left.extend(left_scores[:count])
+        self._right.extend(right_scores[:count])
+        self._positions.extend((label, idx, pos) for pos in range(count))
+        if len(self._left) >= self.chunk_values:
+            self._flush()
+
+    def add_equal_rows(self, rows: Sequence[dict[str, Any]]) -> None:
+        """Account for a trace known to equal ``rows`` (e.g. by trace digest)."""
+        for row in rows:
+            self._add_equal(len(row.get("scores") or ()))
+
+    def to_dict(self) -> dict[str, Any]:
+        self._flush()
+        largest = [entry for _, _, entry in sorted(self._largest, key=lambda item: -item[0])]
+        return {
+            "values_compared": self.values_compared,
+            "values_differing": self.values_differing,
+            "beyond_tolerance": self.beyond_tolerance,
+            "non_finite": self.non_finite,
+            "max_abs_diff": self._max_abs,
+            "mean_abs_diff": self._abs_sum / self._finite if self._finite else 0.0,
+            "max_ulps": self.max_ulps,
+            "ulp_histogram": [
+                {"ulps": _bucket_label(bucket), "count": count}
+                for bucket, count in sorted(self._buckets.items())
+            ],
+            "largest": largest,
+            "tolerance": self.tolerance.to_dict(),
+        }
+
+    def _add_equal(self, count: int) -> None:
+        if count:
+            self.values_compared += count
+            self._finite += count
+            self._buckets[0] = self._buckets.get(0, 0) + count
+
+    def _flush(self) -> None:
+        if not self._left:
+            return
+        try:
+            import numpy as np
+        except ImportError:
+            self._reduce_python()
+        else:
+            self._reduce_numpy(np)
+        self._left.clear()
+        self._right.clear()
+        self._positions.clear()
+
+    def _reduce_numpy(self, np) -> None:
+        left = np.asarray(self._left, dtype=np.float64)
+        right = np.asarray(self._right, dtype=np.float64)
+        count = len(left)
+        with np.errstate(invalid="ignore", over="ignore"):
+            abs_diff = np.abs(left - right)
+        finite = np.isfinite(abs_diff)
+        # Equal infinities are not drift.
+        finite |= left == right
+        abs_diff[left == right] = 0.0
+        left_bits = _ordered_numpy(np, left)
+        right_bits = _ordered_numpy(np, right)
+        # Wrapping int64 subtraction viewed as uint64 is the exact distance.
+        ulps = np.where(
+            left_bits >= right_bits, left_bits - right_bits, right_bits - left_bits
+        ).view(np.uint64)
+        ulps[~finite] = 0
+        within = left == right
+        tolerance = self.tolerance
+        if tolerance.atol or tolerance.rtol:
+            with np.errstate(invalid="ignore"):
+                within |= abs_diff <= tolerance.atol + tolerance.rtol * np.abs(left)
+        if tolerance.ulps:
+            within |= finite & (ulps <= tolerance.ulps)
+
+        self.values_differing += int(count - np.count_nonzero(left == right))
+        self.beyond_tolerance += int(count - np.count_nonzero(within))
+        self.non_finite += int(count - np.count_nonzero(finite))
+        finite_diffs = abs_diff[finite]
+        self._finite += len(finite_diffs)
+        self._abs_sum += float(finite_diffs.sum())
+        if len(finite_diffs):
+            self._max_abs = max(self._max_abs, float(finite_diffs.max()))
+        finite_ulps = ulps[finite]
+        if len(finite_ulps):
+            self.max_ulps = max(self.max_ulps, int(finite_ulps.max()))
+            # frexp's exponent is the bit length, i.e. the power-of-two bucket.
+            _, buckets = np.frexp(finite_ulps.astype(np.float64))
+            values, counts = np.unique(buckets, return_counts=True)
+            for bucket, bucket_count in zip(values.tolist(), counts.tolist(), strict=True):
+                self._buckets[bucket] = self._buckets.get(bucket, 0) + bucket_count
+
+        candidates = np.flatnonzero(finite & (abs_diff > 0))
+        if len(candidates) > self.top_k:
+            top = np.argpartition(abs_diff[candidates], -self.top_k)[-self.top_k :]
+            candidates = candidates[top]
+        for pos in candidates.tolist():
+            self._keep_largest(pos, float(abs_diff[pos]), int(ulps[pos]))
+
+    def _reduce_python(self) -> None:
+        for pos, (a, b) in enumerate(zip(self._left, self._right, strict=True)):
+            if a != b:
+                self.values_differing += 1
+            if not self.tolerance.close(a, b):
+                self.beyond_tolerance += 1
+            diff = 0.0 if a == b else abs(a - b)
+            if not math.isfinite(diff):
+                self.non_finite += 1
+                continue
+            ulps = ulp_distance(a, b)
+            self._finite += 1
+            self._abs_sum += diff
+            self._max_abs = max(self._max_abs, diff)
+            self.max_ulps = max(self.max_ulps, ulps)
+            bucket = ulps.bit_length()
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+            if diff > 0:
+                self._keep_largest(pos, diff, ulps)
+
+    def _keep_largest(self, pos: int, abs_diff: float, ulps: int) -> None:
+        if len(self._largest) >= self.top_k and abs_diff <= self._largest[0][0]:
+            return
+        label, idx, score_index = self._positions[pos]
+        entry: dict[str, Any] = {
+            "index": idx,
+            "score_index": score_index,
+            "abs_diff": abs_diff,
+            "ulps": ulps,
+        }
+        if label is not None:
+            entry["trace"] = label
+        self._order += 1
+        item = (abs_diff, self._order, entry)
+        if len(self._largest) < self.top_k:
+            heapq.heappush(self._largest, item)
+        else:
+            heapq.heapreplace(self._largest, item)
+
+
+def _ordered_numpy(np, values):
+    bits = values.view(np.int64)
+    return np.where(bits < 0, np.int64(_INT64_MIN) - bits, bits)
+
+
+def _bucket_label(bucket: int) -> str:
+    if bucket <= 1:
+        return str(bucket)
+    return f"{2 ** (bucket - 1)}-{2**bucket - 1}"
@@ -0,0 +1,174 @@
+"""Vectorised (NumPy) trace diff engine.
+
+Binary traces are compared straight from their mapped buffers: token ids and
+scores are flat arrays with per-row offsets, and the first divergence of every
+row is found in a handful of array operations. Rows flagged this way are then
+re-checked with ``diff_row``, in order, so results are identical to the
+pure-Python engine.
+"""
+
+from __future__ import annotations
+
+import operator
+from typing import Any, Callable, Sequence
+
+from detllm.diff.diff import CONTEXT_FIELDS, DiffResult, _length_mismatch, diff_row
+from detllm.diff.tolerance import ScoreTolerance
+
+# Scalar row fields compared with ``!=`` before tokens and scores (see ``diff_row``).
+ROW_FIELDS = ("prompt_id", "input_token_ids_hash", "tokenizer_id", *CONTEXT_FIELDS)
+_BINARY_FIXED = {"prompt_id": "prompt_ids", "input_token_ids_hash": "input_hashes"}
+_FLOAT_FIELDS = ("decoding_temperature", "decoding_top_p")
+_PRESENT = 2
+
+
+def numpy_available() -> bool:
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError as exc:
+        raise RuntimeError("numpy is required for the numpy diff engine") from exc
+    return np
+
+
+def diff_traces_vectorized(
+    base: Sequence[dict[str, Any]],
+    other: Sequence[dict[str, Any]],
+    tolerance: ScoreTolerance | None = None,
+) -> DiffResult:
+    """Positional diff of two in-memory traces; same result as ``diff_traces``.
+
+    Packing Python lists into arrays costs more than comparing them, so rows are
+    screened with C-level dict equality instead and only unequal rows are
+    re-checked. Dict equality treats a NaN shared by both rows as equal while
+    ``diff_row`` does not, so rows holding a NaN score or decoding float are
+    re-checked too.
+    """
+    np = _numpy()
+    if len(base) != len(other):
+        return _length_mismatch(len(base), len(other))
+
+    rows = len(base)
+    suspects = np.fromiter(map(operator.ne, base, other), dtype=bool, count=rows)
+    # A NaN can only be shared if it is in ``base``, so screening one side is enough.
+    suspects |= np.isnan(np.fromiter(map(_score_sum, base), dtype=np.float64, count=rows))
+    for field in _FLOAT_FIELDS:
+        values = list(map(operator.methodcaller("get", field), base))
+        suspects |= np.fromiter(map(operator.ne, values, values), dtype=bool, count=rows)
+    return _confirm(np, suspects, lambda idx: (base[idx], other[idx]), tolerance)
+
+
+def diff_binary_traces(
+    left_path: str, right_path: str, tolerance: ScoreTolerance | None = None
+) -> DiffResult:
+    """Positional diff of two binary traces, reading token and score buffers in place."""
+    from detllm.trace.binary import BinaryTrace
+
+    np = _numpy()
+    with BinaryTrace(left_path) as left, BinaryTrace(right_path) as right:
+        if len(left) != len(right):
+            return _length_mismatch(len(left), len(right))
+
+        suspects = np.zeros(len(left), dtype=bool)
+        for field in ROW_FIELDS:
+            if field in _BINARY_FIXED:
+                suspects |= _fixed_mismatch(np, left, right, field)
+            else:
+                suspects |= _column_mismatch(
+                    np, _extra_column(left, field), _extra_column(right, field)
+                )
+        suspects |= (
+            _first_divergence(
+                np, *_binary_ragged(np, left, "generated"), *_binary_ragged(np, right, "generated")
+            )
+            >= 0
+        )
+        compared = (left.numpy("scores_state") == _PRESENT) & (
+            right.numpy("scores_state") == _PRESENT
+        )
+        score_div = _first_divergence(
+            np, *_binary_ragged(np, left, "score"), *_binary_ragged(np, right, "score")
+        )
+        suspects |= compared & (score_div >= 0)
+        return _confirm(np, suspects, lambda idx: (left.row(idx), right.row(idx)), tolerance)
+
+
+def _confirm(
+    np,
+    suspects,
+    load: Callable[[int], tuple[dict[str, Any], dict[str, Any]]],
+    tolerance: ScoreTolerance | None = None,
+):
+    # Exact screening over-approximates a tolerant comparison; diff_row decides.
+    for idx in np.flatnonzero(suspects).tolist():
+        result = diff_row(idx, *load(idx), tolerance)
+        if result is not None:
+            return result
+    return DiffResult(status="PASS", category="PASS", first_divergence=None)
+
+
+def _first_divergence(np, left_flat, left_offsets, right_flat, right_offsets):
+    """Per-row index of the first differing element (or the shorter length), else -1."""
+    left_lens = np.diff(left_offsets)
+    right_lens = np.diff(right_offsets)
+    common = np.minimum(left_lens, right_lens)
+    rows = np.repeat(np.arange(len(common)), common)
+    starts = np.cumsum(common) - common
+    positions = np.arange(int(common.sum()), dtype=np.int64) - np.repeat(starts, common)
+    differs = (
+        left_flat[left_offsets[:-1][rows] + positions]
+        != right_flat[right_offsets[:-1][rows] + positions]
+    )
+
+    result = np.where(left_lens != right_lens, common, -1)
+    hits = np.flatnonzero(differs)
+    bad_rows, first = np.unique(rows[hits], return_index=True)
+    result[bad_rows] = positions[hits[first]]
+    return result
+
+
+def _score_sum(row: dict[str, Any]) -> float:
+    # NaN anywhere in the scores (or inf - inf) makes the sum NaN.
+    return float(sum(row.get("scores") or ()))
+
+
+def _column_mismatch(np, left: Sequence[Any], right: Sequence[Any]):
+    mismatches = (a != b for a, b in zip(left, right, strict=True))
+    return np.fromiter(mismatches, dtype=bool, count=len(left))
+
+
+def _fixed_mismatch(np, left, right, field: str):
+    section = _BINARY_FIXED[field]
+    left_present = left.numpy(f"{field}_state") == _PRESENT
+    right_present = right.numpy(f"{field}_state") == _PRESENT
+    left_values = _fixed_values(np, left, section)
+    right_values = _fixed_values(np, right, section)
+    return (left_present != right_present) | (
+        left_present & right_present & (left_values != right_values)
+    )
+
+
+def _fixed_values(np, trace, section: str):
+    meta = trace.header["sections"][section]
+    width = meta["width"]
+    if width == 0:
+        return np.zeros(len(trace), dtype="S1")
+    return np.frombuffer(trace._mmap, dtype=f"S{width}", count=len(trace), offset=meta["offset"])
+
+
+def _extra_column(trace, field: str) -> list[Any]:
+    const = trace.header["fields"].get("const")
+    if const is not None:
+        return [const.get(field)] * len(trace)
+    return [trace._extras(idx).get(field) for idx in range(len(trace))]
+
+
+def _binary_ragged(np, trace, prefix: str):
+    return trace.numpy(f"{prefix}_values"), trace.numpy(f"{prefix}_offsets")
@@ -0,0 +1,247 @@
+"""Run matrices (``detllm matrix``): the cross product of ``check`` options.
+
+A spec is a JSON or TOML object with ``base`` (options shared by every
+cell) and ``matrix`` (option -> list of values); options are ``check``
+CLI options, with dashes or underscores::
+
+    {
+      "base": {"backend": "hf", "runs": 3, "prompt_file": "prompts.jsonl"},
+      "matrix": {"model": ["gpt2", "distilgpt2"], "dtype": ["float32", "float16"],
+                 "batch_size": [1, 8], "tier": [1, 2]}
+    }
+
+Cells are executed grouped by loaded model (backend, model, device, dtype,
+tokenizer revision), in spec order within a group, against one
+``BackendPool``: each model is loaded once however many cells use it. Every
+cell writes a normal check directory under ``cells/<id>``; ``matrix.json``
+(schema ``matrix``) indexes their parameters, statuses and timings and is
+rewritten after each cell.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import itertools
+import json
+import os
+import time
+from typing import Any
+
+from detllm.backends.pool import BackendKey, BackendPool
+from detllm.core.artifacts import dump_json, load_json, validate_artifact, wrap_artifact
+from detllm.logging import get_logger
+
+logger = get_logger("matrix")
+
+MATRIX_FILENAME = "matrix.json"
+# Set per cell by the matrix itself.
+_RESERVED_OPTIONS = ("out", "server", "resume")
+_REPEATED_OPTIONS = ("redact_env_var",)
+
+
+@dataclass(frozen=True)
+class MatrixCell:
+    id: str
+    params: dict[str, Any]
+    argv: tuple[str, ...]
+    backend_key: BackendKey
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "params": self.params,
+            "argv": list(self.argv),
+            "backend_key": _key_dict(self.backend_key),
+        }
+
+
+def load_spec(path: str) -> dict[str, Any]:
+    """Read a ``.toml`` (Python 3.11+ or ``tomli``) or JSON matrix spec."""
+    if path.endswith(".toml"):
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError as exc:
+                raise ValueError("TOML specs need Python 3.11+ or the tomli package") from exc
+        with open(path, "rb") as handle:
+            return tomllib.load(handle)
+    with open(path, "r", encoding="utf-8") as handle:
+        return json.load(handle)
+
+
+def expand_matrix(spec: dict[str, Any]) -> list[MatrixCell]:
+    """Cells of ``spec`` in spec order; raises ``ValueError`` for invalid options.
+
+    Every cell goes through the same option checks as ``detllm check``.
+    """
+    from detllm.cli.main import _validate_check_args, build_parser
+
+    unknown = set(spec) - {"base", "matrix"}
+    if unknown:
+        raise ValueError(f"Unknown matrix spec keys: {sorted(unknown)}")
+    base = {_option_name(key): value for key, value in (spec.get("base") or {}).items()}
+    axes = {_option_name(key): values for key, values in (spec.get("matrix") or {}).items()}
+    for name in _RESERVED_OPTIONS:
+        if name in base or name in axes:
+            raise ValueError(f"Matrix specs cannot set {name!r}")
+    for name, values in axes.items():
+        if not isinstance(values, list) or not values:
+            raise ValueError(f"Matrix axis {name!r} must be a non-empty list")
+
+    parser = build_parser()
+    cells = []
+    for number, values in enumerate(itertools.product(*axes.values())):
+        params = {**base, **dict(zip(axes, values, strict=True))}
+        argv = _cell_argv(params)
+        try:
+            args = parser.parse_args(argv)
+            _validate_check_args(parser, args)
+        except SystemExit as exc:
+            raise ValueError(f"Invalid matrix cell {params}: detllm {' '.join(argv)}") from exc
+        cells.append(
+            MatrixCell(f"cell_{number:03d}", params, tuple(argv), BackendKey.from_args(args))
+        )
+    return cells
+
+
+def plan_matrix(cells: list[MatrixCell]) -> list[MatrixCell]:
+    """Order ``cells`` so each loaded model serves all of its cells back to back."""
+    groups: dict[BackendKey, list[MatrixCell]] = {}
+    for cell in cells:
+        groups.setdefault(cell.backend_key, []).append(cell)
+    return [cell for group in groups.values() for cell in group]
+
+
+def run_matrix(
+    spec: dict[str, Any],
+    out_dir: str,
+    dry_run: bool = False,
+    validate_schema: bool = False,
+) -> dict[str, Any]:
+    """Execute every cell of ``spec`` under ``out_dir`` and return the ``matrix.json`` payload."""
+    from detllm.cli.main import _dispatch, build_parser
+
+    plan = plan_matrix(expand_matrix(spec))
+    os.makedirs(out_dir, exist_ok=True)
+    pool = BackendPool()
+    parser = build_parser()
+    results: list[dict[str, Any]] = [_planned(cell) for cell in plan]
+
+    def write() -> dict[str, Any]:
+        payload = wrap_artifact(
+            "matrix",
+            {
+                "spec": spec,
+                "cells": results,
+                "groups": _groups(plan),
+                "backend_loads": pool.loads,
+                "summary": _summary(results),
+            },
+        )
+        if validate_schema:
+            validate_artifact(payload)
+        dump_json(os.path.join(out_dir, MATRIX_FILENAME), payload)
+        return payload
+
+    if dry_run:
+        return write()
+    try:
+        for position, (cell, result) in enumerate(zip(plan, results, strict=True)):
+            logger.info("Matrix cell %s (%s/%s): %s", cell.id, position + 1, len(plan), cell.params)
+            args = parser.parse_args(list(cell.argv))
+            args.out = os.path.join(out_dir, result["dir"])
+            if validate_schema:
+                args.validate_schema = True
+            started = time.perf_counter()
+            try:
+                result["exit_code"] = _dispatch(parser, args, pool=pool)
+            except SystemExit as exc:
+                # An option rejected at run time must not take the remaining cells down.
+                logger.error("Matrix cell %s rejected its options", cell.id)
+                result.update(
+                    status="ERROR",
+                    category="ERROR",
+                    exit_code=exc.code if isinstance(exc.code, int) else 1,
+                    error=f"SystemExit: {exc.code}",
+                )
+            except Exception as exc:
+                logger.exception("Matrix cell %s failed", cell.id)
+                result.update(
+                    status="ERROR", category="ERROR", error=f"{type(exc).__name__}: {exc}"
+                )
+            else:
+                report = load_json(os.path.join(args.out, "report.json"))
+                result.update(status=report["status"], category=report["category"])
+                metrics_path = os.path.join(args.out, "metrics.json")
+                if os.path.exists(metrics_path):
+                    result["metrics"] = load_json(metrics_path)["summary"]
+            result["seconds"] = time.perf_counter() - started
+            write()
+    finally:
+        pool.clear()
+    return write()
+
+
+def _planned(cell: MatrixCell) -> dict[str, Any]:
+    return {
+        **cell.to_dict(),
+        "dir": os.path.join("cells", cell.id),
+        "status": "PENDING",
+        "category": None,
+        "exit_code": None,
+        "seconds": None,
+        "metrics": None,
+        "error": None,
+    }
+
+
+def _groups(plan: list[MatrixCell]) -> list[dict[str, Any]]:
+    groups: dict[BackendKey, list[str]] = {}
+    for cell in plan:
+        groups.setdefault(cell.backend_key, []).append(cell.id)
+    return [{"backend_key": _key_dict(key), "cells": ids} for key, ids in groups.items()]
+
+
+def _summary(results: list[dict[str, Any]]) -> dict[str, Any]:
+    statuses: dict[str, int] = {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    return {
+        "cells": len(results),
+        "statuses": statuses,
+        "seconds": sum(result["seconds"] or 0.0 for result in results),
+    }
+
+
+def _key_dict(key: BackendKey) -> dict[str, Any]:
+    return {
+        "backend": key.backend,
+        "model": key.model,
+        "device": key.device,
+        "dtype": key.dtype,
+        "tokenizer_revision": key.tokenizer_revision,
+    }
+
+
+def _option_name(key: str) -> str:
+    return key.lstrip("-").replace("-", "_")
+
+
+def _cell_argv(params: dict[str, Any]) -> list[str]:
+    argv = ["check"]
+    for name, value in params.items():
+        option = "--" + name.replace("_", "-")
+        if value is True:
+            argv.append(option)
+        elif value is False or value is None:
+            continue
+        elif isinstance(value, list) and name in _REPEATED_OPTIONS:
+            for item in value:
+                argv.extend([option, str(item)])
+        elif isinstance(value, list):
+            argv.extend([option, ",".join(str(item) for item in value)])
+        else:
+            argv.extend([option, str(value)])
+    return argv
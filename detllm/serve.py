@@ -0,0 +1,396 @@
+"""Long-lived job server (``detllm serve``) and its thin client.
+
+The server keeps loaded backends in a ``BackendPool`` across jobs, so a
+``check`` submitted to it skips interpreter startup, framework imports and
+model loading. Jobs are CLI argument lists for ``run``, ``check`` or
+``diff``; they are queued and executed by ``jobs`` worker threads and write
+the usual artifact directories. Determinism controls are process-wide, so
+``run``/``check`` jobs generate one at a time; ``diff`` jobs run alongside.
+
+Jobs run in the server's environment, which is what their ``env.json``
+records. Clients send their own ``env_identity`` and a job whose environment
+differs (determinism env vars, Python, platform or package versions) is
+refused rather than silently recorded under the server's.
+
+The protocol is JSON over HTTP, on localhost or a Unix socket:
+
+- ``POST /jobs`` with ``{"argv": [...], "cwd": "...", "env": {...}}`` queues a
+  job (202);
+- ``GET /jobs/<id>?wait=S`` returns its state, waiting up to ``S`` seconds
+  for it to finish;
+- ``GET /health`` reports the version, pool and job counts.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+import http.client
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import os
+import queue
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Sequence
+from urllib.parse import parse_qs, urlsplit
+
+from detllm.backends.pool import BackendPool
+from detllm.core.deterministic import GENERATION_LOCK
+from detllm.core.env import env_identity
+from detllm.logging import get_logger
+from detllm.version import __version__
+
+logger = get_logger("serve")
+
+SERVED_COMMANDS = ("run", "check", "diff")
+DEFAULT_PORT = 8765
+
+# Path options resolved against the submitting client's working directory.
+_PATH_ARGS = ("out", "prompt_file", "artifact_store", "left", "right", "cache_dir")
+_GENERATING_COMMANDS = ("run", "check")
+# Finished jobs kept for status queries.
+_MAX_FINISHED = 1000
+_POLL_S = 30.0
+
+
+def parse_address(value: str) -> tuple[str, Any]:
+    """Split a server address: ``unix:PATH`` or an absolute path, else ``[http://]host:port``."""
+    if value.startswith("unix:"):
+        path = value[len("unix:") :]
+        return "unix", path[2:] if path.startswith("//") else path
+    if value.startswith("/"):
+        return "unix", value
+    netloc = urlsplit(value if "://" in value else f"http://{value}").netloc
+    host, sep, port = netloc.rpartition(":")
+    if not sep or not port.isdigit():
+        raise ValueError(f"Server address must be unix:PATH or host:port, got {value!r}")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+
+class Job:
+    """One submitted CLI invocation and its outcome."""
+
+    def __init__(self, job_id: str, argv: list[str], cwd: str, command: str):
+        self.id = job_id
+        self.argv = argv
+        self.cwd = cwd
+        self.command = command
+        self.status = "queued"
+        self.exit_code: int | None = None
+        self.error: str | None = None
+        self.out: str | None = None
+        self.report: dict[str, Any] | None = None
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "id": self.id,
+            "command": self.command,
+            "argv": self.argv,
+            "status": self.status,
+            "exit_code": self.exit_code,
+            "error": self.error,
+            "out": self.out,
+            "report": self.report,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobServer:
+    """Queue and execute CLI jobs against a shared pool of warm backends."""
+
+    def __init__(
+        self,
+        address: str | None = None,
+        jobs: int = 1,
+        queue_size: int = 64,
+        max_backends: int = 1,
+        pool_max_bytes: int | None = None,
+    ):
+        if jobs < 1 or queue_size < 1:
+            raise ValueError("jobs and queue_size must be at least 1")
+        self.kind, self.address = parse_address(address or f"127.0.0.1:{DEFAULT_PORT}")
+        self.pool = BackendPool(max_entries=max_backends, max_bytes=pool_max_bytes)
+        self.jobs = jobs
+        self._queue: queue.Queue[Job | None] = queue.Queue(maxsize=queue_size)
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._threads: list[threading.Thread] = []
+        self._httpd: socketserver.BaseServer | None = None
+        self.env = env_identity()
+
+    @property
+    def url(self) -> str:
+        if self.kind == "unix":
+            return f"unix:{self.address}"
+        host, port = self._httpd.server_address[:2] if self._httpd else self.address
+        return f"http://{host}:{port}"
+
+    def start(self) -> None:
+        """Bind the socket and start the job threads; ``serve_forever`` then answers requests."""
+        if self.kind == "unix":
+            if os.path.exists(self.address):
+                os.remove(self.address)
+            self._httpd = _UnixHTTPServer(self.address, _Handler)
+        else:
+            self._httpd = ThreadingHTTPServer(self.address, _Handler)
+        self._httpd.job_server = self
+        for idx in range(self.jobs):
+            thread = threading.Thread(target=self._work, name=f"detllm-job-{idx}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info("detllm server listening on %s (%s job threads)", self.url, self.jobs)
+
+    def serve_forever(self) -> None:
+        if self._httpd is None:
+            self.start()
+        self._httpd.serve_forever()
+
+    def shutdown(self) -> None:
+        """Stop accepting requests, finish the running jobs and unload backends."""
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads.clear()
+        self.pool.clear()
+        if self.kind == "unix" and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def submit(self, argv: Sequence[str], cwd: str, env: dict[str, Any] | None = None) -> Job:
+        """Queue a job; raises ``ValueError`` for unserved commands or a client ``env``
+        (``env_identity``) that differs from the server's, ``queue.Full`` when busy.
+        """
+        argv = [str(item) for item in argv]
+        command = next((item for item in argv if not item.startswith("-")), None)
+        if command not in SERVED_COMMANDS:
+            raise ValueError(f"Only {', '.join(SERVED_COMMANDS)} jobs can be served")
+        differences = _env_differences(env, self.env) if env is not None else []
+        if differences:
+            raise ValueError(
+                "The job's environment differs from the server's, which its env.json would "
+                f"record ({'; '.join(differences)}); run it locally or restart the server "
+                "in the same environment"
+            )
+        with self._lock:
+            job = Job(str(next(self._ids)), argv, cwd, command)
+            self._queue.put_nowait(job)
+            self._jobs[job.id] = job
+            self._prune()
+        return job
+
+    def job(self, job_id: str) -> Job | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def health(self) -> dict[str, Any]:
+        with self._lock:
+            counts: dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+        return {
+            "status": "ok",
+            "detllm_version": __version__,
+            "pool": self.pool.stats(),
+            "jobs": counts,
+        }
+
+    def _work(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            try:
+                self._execute(job)
+            finally:
+                job.finished_at = time.time()
+                job.done.set()
+
+    def _execute(self, job: Job) -> None:
+        from detllm.cli.main import _dispatch, build_parser
+
+        job.status = "running"
+        job.started_at = time.time()
+        logger.info("Job %s: detllm %s", job.id, " ".join(job.argv))
+        parser = build_parser()
+        try:
+            args = parser.parse_args(job.argv)
+            _resolve_paths(args, job.cwd)
+            if job.command in _GENERATING_COMMANDS:
+                # The pool is only used under the lock too.
+                with GENERATION_LOCK:
+                    job.exit_code = _dispatch(parser, args, pool=self.pool)
+            else:
+                job.exit_code = _dispatch(parser, args)
+        except SystemExit as exc:
+            # parser.error(); the message went to the server's stderr.
+            job.status = "failed"
+            job.exit_code = exc.code if isinstance(exc.code, int) else 2
+            job.error = "invalid arguments"
+            return
+        except Exception as exc:
+            logger.exception("Job %s failed", job.id)
+            job.status = "failed"
+            job.exit_code = 1
+            job.error = f"{type(exc).__name__}: {exc}"
+            return
+        job.out = args.out
+        report_path = os.path.join(args.out, "report.json")
+        if job.command != "run" and os.path.exists(report_path):
+            with open(report_path, "r", encoding="utf-8") as handle:
+                payload = json.load(handle)
+            job.report = {"status": payload["status"], "category": payload["category"]}
+        job.status = "finished"
+        logger.info("Job %s finished with exit code %s", job.id, job.exit_code)
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.done.is_set()]
+        for job_id in finished[: max(0, len(finished) - _MAX_FINISHED)]:
+            del self._jobs[job_id]
+
+
+def submit_job(address: str, argv: Sequence[str], cwd: str | None = None) -> dict[str, Any] | None:
+    """Run ``argv`` on the server at ``address`` and wait for it; None if it is not reachable.
+
+    Raises ``RuntimeError`` when the server refuses the job or is lost while
+    the job is queued or running.
+    """
+    payload = {"argv": list(argv), "cwd": cwd or os.getcwd(), "env": env_identity()}
+    try:
+        job = _request(address, "POST", "/jobs", payload)
+    except OSError as exc:
+        logger.warning("detllm server at %s is not reachable (%s); running locally", address, exc)
+        return None
+    logger.info("Submitted job %s to %s", job["id"], address)
+    while job["status"] in ("queued", "running"):
+        try:
+            job = _request(address, "GET", f"/jobs/{job['id']}?wait={_POLL_S:g}")
+        except (OSError, http.client.HTTPException, ValueError) as exc:
+            raise RuntimeError(
+                f"Lost the detllm server at {address} while job {job['id']} was "
+                f"{job['status']} ({type(exc).__name__}: {exc}); its artifacts may be incomplete"
+            ) from exc
+    return job
+
+
+def _env_differences(client: dict[str, Any], server: dict[str, Any], prefix: str = "") -> list[str]:
+    differences = []
+    for key in sorted(set(client) | set(server)):
+        left, right = client.get(key), server.get(key)
+        if isinstance(left, dict) and isinstance(right, dict):
+            differences.extend(_env_differences(left, right, f"{prefix}{key}."))
+        elif left != right:
+            differences.append(f"{prefix}{key}: {left!r} here, {right!r} on the server")
+    return differences
+
+
+def _resolve_paths(args: Any, cwd: str) -> None:
+    for name in _PATH_ARGS:
+        value = getattr(args, name, None)
+        if isinstance(value, str) and not os.path.isabs(value):
+            setattr(args, name, os.path.join(cwd, value))
+
+
+def _request(
+    address: str, method: str, path: str, payload: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    kind, target = parse_address(address)
+    if kind == "unix":
+        connection: http.client.HTTPConnection = _UnixHTTPConnection(target)
+    else:
+        connection = http.client.HTTPConnection(*target, timeout=_POLL_S + 30)
+    try:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        connection.request(method, path, body=body, headers=headers)
+        response = connection.getresponse()
+        data = json.loads(response.read() or b"{}")
+    finally:
+        connection.close()
+    if response.status >= 400:
+        raise RuntimeError(f"detllm server: {data.get('error', response.reason)}")
+    return data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = f"detllm/{__version__}"
+
+    def do_GET(self) -> None:
+        jobs: JobServer = self.server.job_server
+        url = urlsplit(self.path)
+        if url.path == "/health":
+            self._reply(200, jobs.health())
+            return
+        if url.path.startswith("/jobs/"):
+            job = jobs.job(url.path[len("/jobs/") :])
+            if job is None:
+                self._reply(404, {"error": "unknown job"})
+                return
+            wait = parse_qs(url.query).get("wait")
+            if wait:
+                job.done.wait(min(float(wait[0]), _POLL_S))
+            self._reply(200, job.to_dict())
+            return
+        self._reply(404, {"error": "not found"})
+
+    def do_POST(self) -> None:
+        jobs: JobServer = self.server.job_server
+        if urlsplit(self.path).path != "/jobs":
+            self._reply(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            job = jobs.submit(
+                payload["argv"], payload.get("cwd") or os.getcwd(), payload.get("env")
+            )
+        except queue.Full:
+            self._reply(503, {"error": "job queue is full"})
+            return
+        except (KeyError, TypeError, ValueError) as exc:
+            self._reply(400, {"error": str(exc)})
+            return
+        self._reply(202, job.to_dict())
+
+    def _reply(self, status: int, payload: dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        logger.debug("%s", format % args)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = super().get_request()
+        # BaseHTTPRequestHandler expects a (host, port) client address.
+        return request, ("unix", 0)
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str):
+        super().__init__("localhost", timeout=_POLL_S + 30)
+        self._socket_path = path
+
+    def connect(self) -> None:
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._socket_path)
@@ -0,0 +1,449 @@
+"""Columnar, memory-mappable binary trace format.
+
+Layout (all integers little-endian)::
+
+    b"DLLMTRC1" | u64 header length | JSON header (space padded to 8 bytes) | sections
+
+Token ids are stored as one flat int32 buffer (int64 when ids do not fit) with an
+int64 offsets array per column, scores as a flat float64 buffer (bit-exact with the
+JSON floats they came from), and prompt ids / input hashes / output digests as
+fixed-width ASCII.
+Every section is 8-byte aligned so it can be mapped with ``memoryview.cast`` or
+``numpy.frombuffer`` without copying. Remaining row fields are stored once in the
+header when every row agrees, otherwise as one JSON line per row.
+"""
+
+from __future__ import annotations
+
+from array import array
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from typing import IO, Any, Callable, Iterable, Iterator
+
+from detllm.version import __version__
+
+MAGIC = b"DLLMTRC1"
+FORMAT_VERSION = "1.0"
+
+# Field state markers stored in the ``*_state`` sections.
+_MISSING = 0
+_NULL = 1
+_PRESENT = 2
+
+_ARRAY_FIELDS = {
+    "generated_token_ids": "generated",
+    "input_token_ids": "input",
+    "scores": "score",
+}
+_FIXED_FIELDS = {
+    "prompt_id": "prompt_ids",
+    "input_token_ids_hash": "input_hashes",
+    "output_digest": "output_digests",
+}
+_INT32_MIN = -(2**31)
+_INT32_MAX = 2**31 - 1
+_TYPECODES = {"<i4": "i", "<i8": "q", "<f8": "d", "|u1": "B", "<u4": "I"}
+_COPY_CHUNK = 1 << 20
+
+
+def is_binary_trace(path: str) -> bool:
+    try:
+        with open(path, "rb") as handle:
+            return handle.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write_binary_trace(path: str, rows: Iterable[dict[str, Any]]) -> None:
+    """Write rows to ``path`` in the binary trace format (atomically)."""
+    writer = BinaryTraceWriter(path)
+    try:
+        for row in rows:
+            writer.write(row)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+
+
+class BinaryTraceWriter:
+    """Streaming binary trace writer.
+
+    Each section is spooled to an anonymous temp file as rows arrive and the
+    sections are stitched behind the header on ``close()``, so memory stays
+    bounded by ``flush_rows`` regardless of trace size.
+    """
+
+    def __init__(self, path: str, flush_rows: int = 4096):
+        self.path = path
+        self.rows = 0
+        self._flush_rows = flush_rows
+        self._dir = os.path.dirname(os.path.abspath(path))
+        self._spools: dict[str, IO[bytes]] = {}
+        self._pending: dict[str, array] = {}
+        self._totals = {name: 0 for name in _ARRAY_FIELDS}
+        self._int_bounds: dict[str, tuple[int, int] | None] = {
+            name: None for name in _ARRAY_FIELDS if name != "scores"
+        }
+        self._widths = {name: 0 for name in _FIXED_FIELDS}
+        self._extras_first: str | None = None
+        self._extras_uniform = True
+        self._extras_bytes = 0
+        for prefix in _ARRAY_FIELDS.values():
+            self._append(f"{prefix}_offsets", "q", 0)
+
+    def write(self, row: dict[str, Any]) -> None:
+        for name, prefix in _ARRAY_FIELDS.items():
+            value = row.get(name, ...)
+            self._append(f"{name}_state", "B", _state(value))
+            if isinstance(value, list) and value:
+                typecode = "d" if name == "scores" else "q"
+                self._extend(f"{prefix}_values", typecode, value)
+                self._totals[name] += len(value)
+                if name != "scores":
+                    low, high = min(value), max(value)
+                    bounds = self._int_bounds[name]
+                    if bounds is not None:
+                        low, high = min(low, bounds[0]), max(high, bounds[1])
+                    self._int_bounds[name] = (low, high)
+            self._append(f"{prefix}_offsets", "q", self._totals[name])
+        for name, section in _FIXED_FIELDS.items():
+            value = row.get(name, ...)
+            self._append(f"{name}_state", "B", _state(value))
+            encoded = value.encode("ascii") if isinstance(value, str) else b""
+            self._spool(section).write(encoded)
+            self._append(f"{section}_lengths", "I", len(encoded))
+            self._widths[name] = max(self._widths[name], len(encoded))
+
+        extras = {
+            key: value
+            for key, value in row.items()
+            if key not in _ARRAY_FIELDS and key not in _FIXED_FIELDS
+        }
+        encoded_extras = json.dumps(extras, sort_keys=True, separators=(",", ":"))
+        if self._extras_first is None:
+            self._extras_first = encoded_extras
+        elif encoded_extras != self._extras_first:
+            self._extras_uniform = False
+        line = encoded_extras.encode("utf-8") + b"\n"
+        self._spool("extra_rows").write(line)
+        if self.rows == 0:
+            self._append("extra_offsets", "q", 0)
+        self._extras_bytes += len(line)
+        self._append("extra_offsets", "q", self._extras_bytes)
+
+        self.rows += 1
+        if self.rows % self._flush_rows == 0:
+            self._flush()
+
+    def close(self, metadata: dict[str, Any] | None = None) -> None:
+        """Write the trace; ``metadata`` entries are added to the header."""
+        self._flush()
+        sections = self._sections()
+        header: dict[str, Any] = {
+            **(metadata or {}),
+            "schema_version": FORMAT_VERSION,
+            "detllm_version": __version__,
+            "artifact_type": "trace_binary",
+            "rows": self.rows,
+            "fields": {"const": json.loads(self._extras_first or "{}")}
+            if self._extras_uniform
+            else {"per_row": True},
+            "sections": {},
+        }
+        # Section offsets depend on the header size, so settle the header length first.
+        header_len = 0
+        while True:
+            offset = _align(len(MAGIC) + 8 + header_len)
+            for name, dtype, nbytes, extra, _ in sections:
+                header["sections"][name] = {
+                    "offset": offset,
+                    "nbytes": nbytes,
+                    "dtype": dtype,
+                    **extra,
+                }
+                offset = _align(offset + nbytes)
+            encoded = json.dumps(header, sort_keys=True, separators=(",", ":")).encode("utf-8")
+            if len(encoded) <= header_len:
+                break
+            header_len = _align(len(encoded))
+        encoded = encoded.ljust(header_len, b" ")
+
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, "wb") as handle:
+                handle.write(MAGIC)
+                handle.write(struct.pack("<Q", header_len))
+                handle.write(encoded)
+                for name, _, _, _, produce in sections:
+                    handle.seek(header["sections"][name]["offset"])
+                    produce(handle)
+                handle.truncate(offset)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            self._close_spools()
+
+    def abort(self) -> None:
+        self._close_spools()
+
+    def _sections(
+        self,
+    ) -> list[tuple[str, str, int, dict[str, Any], Callable[[IO[bytes]], None]]]:
+        sections = []
+        for name, prefix in _ARRAY_FIELDS.items():
+            sections.append(self._copy_section(f"{prefix}_offsets", "<i8", 8))
+            if name == "scores":
+                sections.append(self._copy_section(f"{prefix}_values", "<f8", 8))
+                continue
+            bounds = self._int_bounds[name]
+            if bounds is not None and (bounds[0] < _INT32_MIN or bounds[1] > _INT32_MAX):
+                sections.append(self._copy_section(f"{prefix}_values", "<i8", 8))
+            else:
+                sections.append(self._narrow_section(f"{prefix}_values"))
+        for name, section in _FIXED_FIELDS.items():
+            sections.append(self._fixed_section(section, self._widths[name]))
+        for name in (*_ARRAY_FIELDS, *_FIXED_FIELDS):
+            sections.append(self._copy_section(f"{name}_state", "|u1", 1))
+        if not self._extras_uniform:
+            sections.append(self._copy_section("extra_rows", "|u1", 1))
+            sections.append(self._copy_section("extra_offsets", "<i8", 8))
+        return sections
+
+    def _copy_section(self, name: str, dtype: str, itemsize: int):
+        spool = self._spools.get(name)
+        nbytes = _spool_size(spool)
+
+        def produce(handle: IO[bytes]) -> None:
+            if spool is None:
+                return
+            spool.seek(0)
+            while True:
+                chunk = spool.read(_COPY_CHUNK)
+                if not chunk:
+                    break
+                handle.write(chunk)
+
+        return name, dtype, nbytes, {}, produce
+
+    def _narrow_section(self, name: str):
+        spool = self._spools.get(name)
+        nbytes = _spool_size(spool) // 2
+
+        def produce(handle: IO[bytes]) -> None:
+            if spool is None:
+                return
+            spool.seek(0)
+            while True:
+                chunk = spool.read(_COPY_CHUNK * 8)
+                if not chunk:
+                    break
+                handle.write(_le_bytes(array("i", _from_le("q", chunk))))
+
+        return name, "<i4", nbytes, {}, produce
+
+    def _fixed_section(self, name: str, width: int):
+        values = self._spools.get(name)
+        lengths = self._spools.get(f"{name}_lengths")
+        nbytes = width * self.rows
+
+        def produce(handle: IO[bytes]) -> None:
+            if values is None or lengths is None:
+                return
+            values.seek(0)
+            lengths.seek(0)
+            while True:
+                chunk = lengths.read(4 * 4096)
+                if not chunk:
+                    break
+                for length in _from_le("I", chunk):
+                    handle.write(values.read(length).ljust(width, b"\0"))
+
+        return name, f"S{width}", nbytes, {"width": width}, produce
+
+    def _spool(self, name: str) -> IO[bytes]:
+        spool = self._spools.get(name)
+        if spool is None:
+            spool = tempfile.TemporaryFile(dir=self._dir)
+            self._spools[name] = spool
+        return spool
+
+    def _append(self, name: str, typecode: str, value: Any) -> None:
+        pending = self._pending.get(name)
+        if pending is None:
+            pending = self._pending[name] = array(typecode)
+        pending.append(value)
+
+    def _extend(self, name: str, typecode: str, values: list[Any]) -> None:
+        pending = self._pending.get(name)
+        if pending is None:
+            pending = self._pending[name] = array(typecode)
+        pending.extend(values)
+
+    def _flush(self) -> None:
+        for name, pending in self._pending.items():
+            if pending:
+                self._spool(name).write(_le_bytes(pending))
+                del pending[:]
+
+    def _close_spools(self) -> None:
+        for spool in self._spools.values():
+            spool.close()
+        self._spools.clear()
+        self._pending.clear()
+
+
+class BinaryTrace:
+    """Read-only, memory-mapped view of a binary trace."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._handle = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except BaseException:
+            self._handle.close()
+            raise
+        if self._mmap[: len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"Not a detLLM binary trace: {path}")
+        (header_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.header: dict[str, Any] = json.loads(self._mmap[start : start + header_len])
+        self._const_fields: dict[str, Any] | None = self.header["fields"].get("const")
+        self._views: dict[str, memoryview] = {}
+
+    def __len__(self) -> int:
+        return int(self.header["rows"])
+
+    def __enter__(self) -> "BinaryTrace":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.close()
+        return False
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        for idx in range(len(self)):
+            yield self.row(idx)
+
+    def close(self) -> None:
+        for view in self._views.values():
+            view.release()
+        self._views.clear()
+        if not self._mmap.closed:
+            self._mmap.close()
+        self._handle.close()
+
+    def section(self, name: str) -> memoryview:
+        """Zero-copy typed view of a numeric section."""
+        view = self._views.get(name)
+        if view is not None:
+            return view
+        meta = self.header["sections"][name]
+        raw = memoryview(self._mmap)[meta["offset"] : meta["offset"] + meta["nbytes"]]
+        typecode = _TYPECODES[meta["dtype"]]
+        if sys.byteorder == "little" or typecode == "B":
+            view = raw.cast(typecode)
+        else:
+            view = memoryview(_from_le(typecode, raw.tobytes()))
+            raw.release()
+        self._views[name] = view
+        return view
+
+    def numpy(self, name: str):
+        """Zero-copy NumPy array over a numeric section (requires numpy)."""
+        import numpy as np
+
+        meta = self.header["sections"][name]
+        dtype = np.dtype(meta["dtype"])
+        return np.frombuffer(
+            self._mmap, dtype=dtype, count=meta["nbytes"] // dtype.itemsize, offset=meta["offset"]
+        )
+
+    def fixed_width(self, name: str, idx: int) -> str:
+        meta = self.header["sections"][name]
+        width = meta["width"]
+        start = meta["offset"] + idx * width
+        return self._mmap[start : start + width].rstrip(b"\0").decode("ascii")
+
+    def row(self, idx: int) -> dict[str, Any]:
+        if not 0 <= idx < len(self):
+            raise IndexError(idx)
+        row: dict[str, Any] = {}
+        for name, section in _FIXED_FIELDS.items():
+            if f"{name}_state" not in self.header["sections"]:
+                # Written before this column existed.
+                continue
+            state = self.section(f"{name}_state")[idx]
+            if state != _MISSING:
+                row[name] = self.fixed_width(section, idx) if state == _PRESENT else None
+        for name, prefix in _ARRAY_FIELDS.items():
+            state = self.section(f"{name}_state")[idx]
+            if state == _MISSING:
+                continue
+            if state == _NULL:
+                row[name] = None
+                continue
+            offsets = self.section(f"{prefix}_offsets")
+            row[name] = self.section(f"{prefix}_values")[offsets[idx] : offsets[idx + 1]].tolist()
+        row.update(self._extras(idx))
+        return row
+
+    def _extras(self, idx: int) -> dict[str, Any]:
+        if self._const_fields is not None:
+            return dict(self._const_fields)
+        offsets = self.section("extra_offsets")
+        base = self.header["sections"]["extra_rows"]["offset"]
+        return json.loads(self._mmap[base + offsets[idx] : base + offsets[idx + 1]])
+
+
+def read_binary_trace(path: str) -> list[dict[str, Any]]:
+    return list(iter_binary_trace(path))
+
+
+def iter_binary_trace(path: str) -> Iterator[dict[str, Any]]:
+    with BinaryTrace(path) as trace:
+        yield from trace
+
+
+def _state(value: Any) -> int:
+    if value is ...:
+        return _MISSING
+    if value is None:
+        return _NULL
+    return _PRESENT
+
+
+def _spool_size(spool: IO[bytes] | None) -> int:
+    if spool is None:
+        return 0
+    spool.seek(0, os.SEEK_END)
+    return spool.tell()
+
+
+def _le_bytes(values: array) -> bytes:
+    if sys.byteorder == "little":
+        return values.tobytes()
+    swapped = array(values.typecode, values)
+    swapped.byteswap()
+    return swapped.tobytes()
+
+
+def _from_le(typecode: str, payload: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(payload)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _align(offset: int) -> int:
+    return (offset + 7) & ~7
@@ -0,0 +1,95 @@
+"""Content digests for trace rows and whole traces.
+
+Digests are only ever used to prove equality. Rows holding a NaN never get
+one, because NaN compares unequal to itself while its encoding is stable.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import secrets
+from typing import Any
+
+from detllm.core.store import canonical_json
+
+DIGEST_SUFFIX = ".digest"
+_CHUNK = 1 << 20
+
+
+def digest_path(trace_path: str) -> str:
+    """Sidecar holding a JSONL trace's digest (binary traces and manifests embed it)."""
+    return f"{trace_path}{DIGEST_SUFFIX}"
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file's bytes: the identity of a trace that records no digest."""
+    hasher = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(_CHUNK), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def file_stamp(path: str) -> dict[str, int]:
+    """Size and modification time that bind a sidecar to the trace it describes."""
+    stat = os.stat(path)
+    return {"trace_size": stat.st_size, "trace_mtime_ns": stat.st_mtime_ns}
+
+
+def stamp_trace(path: str) -> None:
+    """Move a just-written trace's mtime forward by a random sub-millisecond amount.
+
+    Timestamps advance in clock ticks, so a rewrite in the same tick could keep
+    both size and mtime. No later write lands on the randomized value, which
+    makes ``file_stamp`` a reliable check without rehashing the file.
+    """
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1 + secrets.randbelow(999_999)))
+
+
+def stamp_matches(payload: dict[str, Any], path: str) -> bool:
+    return all(payload.get(key) == value for key, value in file_stamp(path).items())
+
+
+def output_digest(row: dict[str, Any], allow_nan: bool = False) -> str | None:
+    """Digest of a row's generated tokens and scores.
+
+    Returns None for rows with a NaN score unless ``allow_nan`` is set (for
+    grouping identical outputs rather than proving equality).
+    """
+    encoded = canonical_json(
+        {
+            "generated_token_ids": row.get("generated_token_ids") or [],
+            "scores": row.get("scores"),
+        }
+    )
+    if not allow_nan and b"NaN" in encoded:
+        return None
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def row_digest(row: dict[str, Any]) -> str:
+    """Digest of a row's canonical JSON (every field)."""
+    return hashlib.sha256(canonical_json(row)).hexdigest()
+
+
+class TraceDigest:
+    """Running digest over a trace's row digests, in row order.
+
+    Format independent: the same rows give the same digest whether written as
+    JSONL, binary or a manifest.
+    """
+
+    def __init__(self) -> None:
+        self._hasher = hashlib.sha256()
+        self.valid = True
+
+    def update(self, encoded_row: bytes, digest: str) -> None:
+        if b"NaN" in encoded_row:
+            self.valid = False
+        self._hasher.update(digest.encode("ascii"))
+        self._hasher.update(b"\n")
+
+    def hexdigest(self) -> str | None:
+        return self._hasher.hexdigest() if self.valid else None
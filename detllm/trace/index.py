@@ -0,0 +1,165 @@
+"""Prompt-id index sidecars for random access into traces.
+
+``<trace>.idx`` is JSONL: a header line followed by one entry per row with the
+row's prompt id, position, byte range (JSONL traces only) and a SHA-256 digest
+of the row's canonical JSON. Row digests let two indexed traces be compared
+without reading rows that are identical.
+
+The header binds the index to its trace without reading it: binary traces and
+manifests by the trace digest they embed, JSONL traces by size and
+modification time (see ``file_stamp``). Rows read through the index are also
+checked against their entry digests.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+import json
+import os
+from typing import IO, Any, Iterable
+
+from detllm.core.store import resolve_store
+from detllm.trace.binary import BinaryTrace
+from detllm.trace.digest import file_stamp, row_digest, stamp_matches
+from detllm.version import __version__
+
+INDEX_SUFFIX = ".idx"
+
+
+class StaleIndexError(ValueError):
+    """A row read through an index is not the row the index recorded."""
+
+
+@dataclass(frozen=True)
+class IndexEntry:
+    prompt_id: str | None
+    row: int
+    digest: str
+    offset: int | None = None
+    length: int | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "prompt_id": self.prompt_id,
+            "row": self.row,
+            "digest": self.digest,
+            "offset": self.offset,
+            "length": self.length,
+        }
+
+
+def index_path(trace_path: str) -> str:
+    return f"{trace_path}{INDEX_SUFFIX}"
+
+
+class TraceIndexWriter:
+    """Streams index entries to a temp file; ``commit()`` installs it next to the trace."""
+
+    def __init__(self, trace_path: str, trace_format: str):
+        self.trace_path = trace_path
+        self.trace_format = trace_format
+        self._tmp_path = f"{index_path(trace_path)}.tmp"
+        self._handle: IO[str] = open(self._tmp_path, "w", encoding="utf-8")
+
+    def add(self, entry: IndexEntry) -> None:
+        self._handle.write(json.dumps(entry.to_dict(), sort_keys=True))
+        self._handle.write("\n")
+
+    def commit(self, trace_digest: str | None = None) -> None:
+        """Call once the trace itself is in place, with the digest it embeds (if any)."""
+        self._handle.close()
+        header = {
+            "schema_version": "1.0",
+            "detllm_version": __version__,
+            "artifact_type": "trace_index",
+            "trace_format": self.trace_format,
+            "trace_digest": trace_digest,
+            **file_stamp(self.trace_path),
+        }
+        final_tmp = f"{self._tmp_path}.final"
+        try:
+            with (
+                open(final_tmp, "w", encoding="utf-8") as out,
+                open(self._tmp_path, "r", encoding="utf-8") as entries,
+            ):
+                out.write(json.dumps(header, sort_keys=True))
+                out.write("\n")
+                for line in entries:
+                    out.write(line)
+            os.replace(final_tmp, index_path(self.trace_path))
+        finally:
+            for path in (self._tmp_path, final_tmp):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def abort(self) -> None:
+        self._handle.close()
+        if os.path.exists(self._tmp_path):
+            os.remove(self._tmp_path)
+
+
+class TraceIndex:
+    def __init__(self, trace_path: str, header: dict[str, Any], entries: list[IndexEntry]):
+        self.trace_path = trace_path
+        self.header = header
+        self.entries = entries
+
+    @classmethod
+    def load(cls, trace_path: str) -> "TraceIndex | None":
+        """Load the sidecar index, or None when it is missing or stale."""
+        path = index_path(trace_path)
+        if not os.path.exists(path) or not os.path.exists(trace_path):
+            return None
+        with open(path, "r", encoding="utf-8") as handle:
+            header = json.loads(handle.readline())
+            if not _is_current(header, trace_path):
+                return None
+            entries = [IndexEntry(**json.loads(line)) for line in handle if line.strip()]
+        return cls(trace_path, header, entries)
+
+    def lookup(self, prompt_ids: Iterable[str]) -> list[IndexEntry]:
+        wanted = set(prompt_ids)
+        return [entry for entry in self.entries if entry.prompt_id in wanted]
+
+    def read(self, entries: Iterable[IndexEntry]) -> list[dict[str, Any]]:
+        """Fetch the rows for ``entries`` by seeking, without scanning the trace.
+
+        Raises ``StaleIndexError`` when a row read is not the one indexed.
+        """
+        entries = list(entries)
+        trace_format = self.header["trace_format"]
+        if trace_format == "binary":
+            with BinaryTrace(self.trace_path) as trace:
+                rows = [trace.row(entry.row) for entry in entries]
+        elif trace_format == "manifest":
+            # Rows are fetched by their digest, so they cannot differ from the index.
+            with open(self.trace_path, "r", encoding="utf-8") as handle:
+                store = resolve_store(self.trace_path, json.load(handle))
+            return [store.get_json(entry.digest) for entry in entries]
+        else:
+            rows = []
+            with open(self.trace_path, "rb") as handle:
+                for entry in entries:
+                    handle.seek(entry.offset)
+                    try:
+                        rows.append(json.loads(handle.read(entry.length)))
+                    except ValueError as exc:
+                        raise StaleIndexError(f"Stale index for {self.trace_path}") from exc
+        for entry, row in zip(entries, rows, strict=True):
+            if row_digest(row) != entry.digest:
+                raise StaleIndexError(f"Stale index for {self.trace_path}")
+        return rows
+
+
+def _is_current(header: dict[str, Any], trace_path: str) -> bool:
+    # A trace digest is part of the trace itself; JSONL traces carry none.
+    recorded = header.get("trace_digest")
+    if recorded is None or header.get("trace_format") == "jsonl":
+        return stamp_matches(header, trace_path)
+    if header.get("trace_size") != os.path.getsize(trace_path):
+        return False
+    if header["trace_format"] == "binary":
+        with BinaryTrace(trace_path) as trace:
+            return trace.header.get("trace_digest") == recorded
+    with open(trace_path, "r", encoding="utf-8") as handle:
+        return json.load(handle).get("trace_digest") == recorded
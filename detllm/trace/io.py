@@ -2,32 +2,404 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
-from typing import Any, Iterable
+import os
+from typing import IO, Any, Iterable, Iterator
 
 from detllm.core.artifacts import load_schema, validate_json
+from detllm.core.store import (
+    MANIFEST_ARTIFACT_TYPE,
+    ArtifactStore,
+    canonical_json,
+    resolve_store,
+    store_reference,
+)
+from detllm.trace.binary import BinaryTrace, BinaryTraceWriter, is_binary_trace, iter_binary_trace
+from detllm.trace.digest import TraceDigest, digest_path, file_stamp, stamp_matches, stamp_trace
+from detllm.trace.index import IndexEntry, StaleIndexError, TraceIndex, TraceIndexWriter, index_path
+from detllm.version import __version__
+
+TRACE_FORMATS = ("jsonl", "binary")
+# Manifests are not selectable directly: they are written when an artifact store is in use.
+TRACE_SUFFIXES = {"jsonl": ".jsonl", "binary": ".dtrace", "manifest": ".manifest.json"}
+
+
+def trace_filename(stem: str, trace_format: str = "jsonl") -> str:
+    return f"{stem}{TRACE_SUFFIXES[trace_format]}"
+
+
+class TraceWriter:
+    """Append-only trace writer; the file only appears once ``close()`` commits it.
+
+    Rows are validated and serialized as they arrive, so memory stays flat no
+    matter how many rows are written. ``put()`` accepts rows keyed by prompt index
+    in any order and holds back only those that arrive ahead of a gap. Used as a
+    context manager, an exception discards the partial file.
+
+    The ``manifest`` format stores each row in ``store`` and writes only the list
+    of row digests. ``index=True`` also writes a prompt-id index sidecar.
+
+    The whole trace gets a digest of its rows (see ``trace_digest``); rows are
+    written as given, so per-row ``output_digest`` fields come from the caller.
+
+    JSONL traces can outlive an interruption: ``keep_partial=True`` keeps the
+    rows written so far (``partial_trace_path``) when the writer is aborted, and
+    ``resume=True`` continues such a partial trace. Rows put again for prompt
+    indices that are already written are then ignored.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        trace_format: str = "jsonl",
+        validate_rows: bool = False,
+        store: ArtifactStore | None = None,
+        index: bool = False,
+        resume: bool = False,
+        keep_partial: bool = False,
+    ):
+        if trace_format not in TRACE_SUFFIXES:
+            raise ValueError(f"Unsupported trace format: {trace_format}")
+        if (trace_format == "manifest") != (store is not None):
+            raise ValueError("Trace manifests are written if and only if an artifact store is set")
+        self.path = path
+        self.trace_format = trace_format
+        self.rows = 0
+        self._pending: dict[int, dict[str, Any]] = {}
+        self._next_index = 0
+        self._schema = load_schema("trace_row") if validate_rows else None
+        self._tmp_path = partial_trace_path(path)
+        self._keep_partial = keep_partial and trace_format == "jsonl"
+        self._binary: BinaryTraceWriter | None = None
+        self._handle: IO[str] | None = None
+        self._store = store
+        self._offset = 0
+        self._digest = TraceDigest()
+        self._index = TraceIndexWriter(path, trace_format) if index else None
+        if trace_format == "binary":
+            self._binary = BinaryTraceWriter(path)
+        elif resume and trace_format == "jsonl" and os.path.exists(self._tmp_path):
+            self._restore()
+            self._handle = open(self._tmp_path, "a", encoding="utf-8")
+        else:
+            # Write to a sibling temp file and rename so readers never see a partial trace.
+            self._handle = open(self._tmp_path, "w", encoding="utf-8")
+
+    def __enter__(self) -> "TraceWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def write(self, row: dict[str, Any]) -> None:
+        if self._schema is not None:
+            validate_json(row, self._schema)
+        offset = length = None
+        encoded = canonical_json(row)
+        digest = hashlib.sha256(encoded).hexdigest()
+        self._digest.update(encoded, digest)
+        if self._binary is not None:
+            self._binary.write(row)
+        elif self._store is not None:
+            assert self._handle is not None
+            self._store.put_bytes(encoded)
+            self._handle.write(digest)
+            self._handle.write("\n")
+        else:
+            assert self._handle is not None
+            line = json.dumps(row, sort_keys=True)
+            offset, length = self._offset, len(line.encode("utf-8"))
+            self._handle.write(line)
+            self._handle.write("\n")
+            self._offset += length + 1
+        if self._index is not None:
+            self._index.add(
+                IndexEntry(
+                    prompt_id=row.get("prompt_id"),
+                    row=self.rows,
+                    digest=digest,
+                    offset=offset,
+                    length=length,
+                )
+            )
+        self.rows += 1
+
+    def put(self, idx: int, row: dict[str, Any]) -> None:
+        """Buffer ``row`` until every lower prompt index has been written."""
+        if idx < self._next_index:
+            return
+        self._pending[idx] = row
+        while self._next_index in self._pending:
+            self.write(self._pending.pop(self._next_index))
+            self._next_index += 1
+
+    def flush(self) -> None:
+        """Push written rows to the OS, e.g. before recording a checkpoint."""
+        if self._handle is not None and not self._handle.closed:
+            self._handle.flush()
+
+    def _restore(self) -> None:
+        # Replay the complete rows of a partial trace; a torn last line is cut off.
+        end = 0
+        for row, end in _partial_rows(self._tmp_path):
+            encoded = canonical_json(row)
+            digest = hashlib.sha256(encoded).hexdigest()
+            self._digest.update(encoded, digest)
+            if self._index is not None:
+                self._index.add(
+                    IndexEntry(
+                        prompt_id=row.get("prompt_id"),
+                        row=self.rows,
+                        digest=digest,
+                        offset=self._offset,
+                        length=end - self._offset - 1,
+                    )
+                )
+            self._offset = end
+            self.rows += 1
+        with open(self._tmp_path, "r+b") as handle:
+            handle.truncate(end)
+        self._next_index = self.rows
+
+    def close(self) -> None:
+        try:
+            # Rows stranded behind a gap (an aborted run) are still written, in index order.
+            for idx in sorted(self._pending):
+                self.write(self._pending.pop(idx))
+            trace_digest = self._digest.hexdigest()
+            if self._binary is not None:
+                self._binary.close({"trace_digest": trace_digest})
+            elif self._store is not None and self._handle is not None:
+                self._handle.close()
+                self._write_manifest(trace_digest)
+            elif self._handle is not None and not self._handle.closed:
+                self._handle.close()
+                os.replace(self._tmp_path, self.path)
+            stamp_trace(self.path)
+            if self._binary is None and self._store is None:
+                self._write_digest(trace_digest)
+            if self._index is not None:
+                self._index.commit(trace_digest)
+            elif os.path.exists(index_path(self.path)):
+                # An index left over from an earlier trace at this path is now stale.
+                os.remove(index_path(self.path))
+        except BaseException:
+            self.abort()
+            raise
+
+    def _write_digest(self, trace_digest: str | None) -> None:
+        path = digest_path(self.path)
+        if trace_digest is None:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        payload = {"trace_digest": trace_digest, "rows": self.rows, **file_stamp(self.path)}
+        with open(f"{path}.tmp", "w", encoding="utf-8") as handle:
+            json.dump(payload, handle, sort_keys=True)
+            handle.write("\n")
+        os.replace(f"{path}.tmp", path)
+
+    def _write_manifest(self, trace_digest: str | None) -> None:
+        assert self._store is not None
+        with open(self._tmp_path, "r", encoding="utf-8") as handle:
+            rows_digest = self._store.put_lines(line.strip() for line in handle)
+        manifest = {
+            "schema_version": "1.0",
+            "detllm_version": __version__,
+            "artifact_type": MANIFEST_ARTIFACT_TYPE,
+            "rows": self.rows,
+            "rows_digest": rows_digest,
+            "trace_digest": trace_digest,
+            "store": store_reference(self.path, self._store),
+        }
+        with open(self._tmp_path, "w", encoding="utf-8") as handle:
+            json.dump(manifest, handle, indent=2, sort_keys=True)
+            handle.write("\n")
+        os.replace(self._tmp_path, self.path)
+
+    def abort(self) -> None:
+        self._pending.clear()
+        if self._index is not None:
+            self._index.abort()
+            self._index = None
+        if self._binary is not None:
+            self._binary.abort()
+            return
+        if self._handle is not None:
+            self._handle.close()
+        if os.path.exists(self._tmp_path) and not self._keep_partial:
+            os.remove(self._tmp_path)
 
 
 def write_trace(
     path: str,
     rows: Iterable[dict[str, Any]],
     validate_rows: bool = False,
+    trace_format: str = "jsonl",
+    store: ArtifactStore | None = None,
+    index: bool = False,
 ) -> None:
-    schema = load_schema("trace_row") if validate_rows else None
-    with open(path, "w", encoding="utf-8") as handle:
+    with TraceWriter(
+        path, trace_format=trace_format, validate_rows=validate_rows, store=store, index=index
+    ) as writer:
         for row in rows:
-            if schema is not None:
-                validate_json(row, schema)
-            handle.write(json.dumps(row, sort_keys=True))
-            handle.write("\n")
+            writer.write(row)
+
+
+class MemoryTraceWriter:
+    """``TraceWriter`` counterpart keeping the rows in ``trace`` instead of a file.
+
+    Rows are held as given: nothing is serialized unless they are validated.
+    """
+
+    def __init__(self, validate_rows: bool = False):
+        self.trace: list[dict[str, Any]] = []
+        self._pending: dict[int, dict[str, Any]] = {}
+        self._schema = load_schema("trace_row") if validate_rows else None
+
+    @property
+    def rows(self) -> int:
+        return len(self.trace)
+
+    def __enter__(self) -> "MemoryTraceWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        if exc_type is None:
+            self.close()
+        return False
+
+    def write(self, row: dict[str, Any]) -> None:
+        if self._schema is not None:
+            validate_json(row, self._schema)
+        self.trace.append(row)
+
+    def put(self, idx: int, row: dict[str, Any]) -> None:
+        """Buffer ``row`` until every lower prompt index has been written."""
+        if idx < len(self.trace):
+            return
+        self._pending[idx] = row
+        while len(self.trace) in self._pending:
+            self.write(self._pending.pop(len(self.trace)))
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        for idx in sorted(self._pending):
+            self.write(self._pending.pop(idx))
 
 
 def read_trace(path: str) -> list[dict[str, Any]]:
-    rows: list[dict[str, Any]] = []
+    return list(iter_trace(path))
+
+
+def iter_trace(path: str) -> Iterator[dict[str, Any]]:
+    """Yield trace rows one at a time without loading the whole file."""
+    if is_binary_trace(path):
+        yield from iter_binary_trace(path)
+        return
+    if is_trace_manifest(path):
+        yield from iter_manifest_trace(path)
+        return
     with open(path, "r", encoding="utf-8") as handle:
         for line in handle:
             line = line.strip()
             if not line:
                 continue
-            rows.append(json.loads(line))
-    return rows
+            yield json.loads(line)
+
+
+def partial_trace_path(path: str) -> str:
+    """Where a JSONL trace's rows accumulate until the writer commits it."""
+    return f"{path}.tmp"
+
+
+def iter_partial_trace(path: str) -> Iterator[dict[str, Any]]:
+    """Complete rows of the partial JSONL trace for ``path`` (none if there is none)."""
+    tmp_path = partial_trace_path(path)
+    if not os.path.exists(tmp_path):
+        return
+    for row, _ in _partial_rows(tmp_path):
+        yield row
+
+
+def _partial_rows(tmp_path: str) -> Iterator[tuple[dict[str, Any], int]]:
+    # Yields each complete row with the byte offset just past its line.
+    end = 0
+    with open(tmp_path, "rb") as handle:
+        for line in handle:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                row = json.loads(line)
+            except ValueError:
+                return
+            end += len(line)
+            yield row, end
+
+
+def read_rows(path: str, prompt_ids: Iterable[str]) -> list[dict[str, Any]]:
+    """Rows whose prompt id is in ``prompt_ids``, in trace order.
+
+    Seeks via the index sidecar when one is current; otherwise scans the trace.
+    """
+    wanted = set(prompt_ids)
+    index = TraceIndex.load(path)
+    if index is not None:
+        try:
+            return index.read(index.lookup(wanted))
+        except StaleIndexError:
+            pass
+    return [row for row in iter_trace(path) if row.get("prompt_id") in wanted]
+
+
+def trace_digest(path: str) -> str | None:
+    """Digest of a trace's rows recorded at write time, or None.
+
+    None when the trace predates digests, holds a NaN, or (JSONL) its digest
+    sidecar is missing or was written for a trace of another size or
+    modification time (see ``stamp_trace``). Equal digests mean equal rows.
+    """
+    if is_binary_trace(path):
+        with BinaryTrace(path) as trace:
+            return trace.header.get("trace_digest")
+    if is_trace_manifest(path):
+        with open(path, "r", encoding="utf-8") as handle:
+            return json.load(handle).get("trace_digest")
+    sidecar = digest_path(path)
+    if not os.path.exists(sidecar) or not os.path.exists(path):
+        return None
+    with open(sidecar, "r", encoding="utf-8") as handle:
+        payload = json.load(handle)
+    if not stamp_matches(payload, path):
+        return None
+    return payload.get("trace_digest")
+
+
+def is_trace_manifest(path: str) -> bool:
+    return path.endswith(TRACE_SUFFIXES["manifest"])
+
+
+def iter_manifest_trace(path: str) -> Iterator[dict[str, Any]]:
+    """Resolve a trace manifest's row digests against its artifact store."""
+    with open(path, "r", encoding="utf-8") as handle:
+        manifest = json.load(handle)
+    if manifest.get("artifact_type") != MANIFEST_ARTIFACT_TYPE:
+        raise ValueError(f"Not a detLLM trace manifest: {path}")
+    store = resolve_store(path, manifest)
+    for digest in store.iter_lines(manifest["rows_digest"]):
+        yield store.get_json(digest)
+
+
+def convert_trace(src: str, dst: str, trace_format: str | None = None, index: bool = False) -> str:
+    """Convert a trace between formats; the target format defaults to dst's suffix."""
+    if trace_format is None:
+        trace_format = "binary" if dst.endswith(TRACE_SUFFIXES["binary"]) else "jsonl"
+    write_trace(dst, iter_trace(src), trace_format=trace_format, index=index)
+    return trace_format
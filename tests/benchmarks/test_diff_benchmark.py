@@ -0,0 +1,65 @@
+"""Diff engine benchmark: ``pytest -m benchmark -s tests/benchmarks``."""
+
+import time
+
+import pytest
+
+from detllm.diff.diff import diff_traces
+from detllm.trace.io import write_trace
+
+np = pytest.importorskip("numpy")
+
+from detllm.diff.vectorized import diff_binary_traces  # noqa: E402
+
+pytestmark = [pytest.mark.benchmark]
+
+ROWS = 100_000
+TOKENS = 32
+
+
+def _trace(last_token):
+    rows = []
+    for idx in range(ROWS):
+        tokens = [(idx + step) % 50_000 for step in range(TOKENS)]
+        rows.append(
+            {
+                "prompt_id": f"{idx:064x}",
+                "input_token_ids_hash": f"{idx:064x}",
+                "generated_token_ids": tokens,
+                "scores": [-0.25] * TOKENS,
+                "tokenizer_id": "tok",
+                "decoding_max_new_tokens": TOKENS,
+                "decoding_temperature": 0.0,
+            }
+        )
+    tokens = rows[-1]["generated_token_ids"]
+    rows[-1] = {**rows[-1], "generated_token_ids": [*tokens[:-1], last_token]}
+    return rows
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def test_numpy_engine_speedup_on_100k_rows(tmp_path):
+    base, other = _trace(0), _trace(1)
+    python_result, python_time = _timed(lambda: diff_traces(base, other, engine="python"))
+    numpy_result, numpy_time = _timed(lambda: diff_traces(base, other, engine="numpy"))
+    assert numpy_result == python_result
+    assert python_result.first_divergence["index"] == ROWS - 1
+
+    left, right = tmp_path / "left.dtrace", tmp_path / "right.dtrace"
+    write_trace(str(left), base, trace_format="binary")
+    write_trace(str(right), other, trace_format="binary")
+    binary_result, binary_time = _timed(lambda: diff_binary_traces(str(left), str(right)))
+    assert binary_result == python_result
+
+    print(
+        f"\n{ROWS} rows x {TOKENS} tokens: python {python_time:.3f}s, "
+        f"numpy {numpy_time:.3f}s ({python_time / numpy_time:.1f}x), "
+        f"binary buffers {binary_time:.3f}s ({python_time / binary_time:.1f}x)"
+    )
+    assert numpy_time < python_time
+    assert binary_time < python_time
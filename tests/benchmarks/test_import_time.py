@@ -0,0 +1,44 @@
+"""CLI start-up budget: ``pytest -m benchmark -s tests/benchmarks``."""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytestmark = [pytest.mark.benchmark]
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Total import time of ``detllm diff --help`` (interpreter start-up excluded).
+IMPORT_BUDGET_US = 300_000
+HEAVY_MODULES = ("torch", "transformers", "vllm", "numpy")
+
+
+def _import_times() -> tuple[dict[str, int], set[str]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-m", "detllm.cli.main", "diff", "--help"],
+        check=True,
+        capture_output=True,
+        text=True,
+        cwd=ROOT,
+    )
+    # Lines look like "import time:  self | cumulative | <indent>module"; only
+    # top-level imports are summed so nested ones are not counted twice.
+    times = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        imported.add(name.strip())
+        if not name.startswith("  "):
+            times[name.strip()] = int(cumulative)
+    return times, imported
+
+
+def test_diff_help_import_budget():
+    runs = [_import_times() for _ in range(3)]
+    best = min(sum(times.values()) for times, _ in runs)
+    print(f"\ndetllm diff --help: {best / 1000:.1f} ms of imports")
+    assert not [name for name in runs[0][1] if name.split(".")[0] in HEAVY_MODULES]
+    assert best < IMPORT_BUDGET_US
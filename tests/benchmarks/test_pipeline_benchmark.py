@@ -0,0 +1,31 @@
+"""Pipeline overhead benchmark: ``pytest -m benchmark -s tests/benchmarks``.
+
+Row counts default to 1k and 100k; set ``DETLLM_BENCH_ROWS=1000,100000,1000000``
+for the 1M scale and ``DETLLM_BENCH_OUT`` to keep ``bench.json`` for comparison.
+"""
+
+import os
+
+import pytest
+
+from detllm.bench import run_bench
+
+pytestmark = [pytest.mark.benchmark]
+
+ROWS = [int(item) for item in os.environ.get("DETLLM_BENCH_ROWS", "1000,100000").split(",")]
+
+
+def test_pipeline_overhead(tmp_path):
+    out = os.environ.get("DETLLM_BENCH_OUT") or str(tmp_path / "bench")
+    payload = run_bench(out, rows=ROWS)
+    for result in payload["results"]:
+        stages = ", ".join(
+            f"{name} {stage['seconds']:.3f}s" for name, stage in result["stages"].items()
+        )
+        check = result["check"]
+        print(
+            f"\n{result['rows']} rows: {stages}\n"
+            f"  check {check['seconds']:.3f}s, overhead {check['overhead_us_per_row']:.1f}us/row"
+        )
+        assert check["status"] == "PASS"
+        assert check["overhead_s"] > 0
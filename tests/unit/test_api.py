@@ -42,3 +42,15 @@ def test_check_returns_report(tmp_path):
         backend_adapter=FakeBackend(),
     )
     assert report.status == "PASS"
+
+
+def test_check_records_backend_strategy(tmp_path):
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["hi"],
+        runs=2,
+        out_dir=str(tmp_path / "out"),
+        backend_adapter=FakeBackend(),
+    )
+    assert report.details["backend_strategy"] == "adapter"
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json
+from detllm.core.store import ArtifactStore
+from detllm.trace.io import read_trace, write_trace
+
+
+class FakeBackend:
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        return [
+            {"prompt": prompt, "input_ids": [len(prompt)], "output_ids": [3, 4]}
+            for prompt in prompts
+        ]
+
+
+def _objects(store_root):
+    return [os.path.join(root, name) for root, _, names in os.walk(store_root) for name in names]
+
+
+def test_check_with_store_dedupes_runs_and_envs(tmp_path):
+    store_root = tmp_path / "store"
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["a", "bb", "ccc"],
+        runs=3,
+        vary_batch=[2],
+        out_dir=str(tmp_path / "out"),
+        artifact_store=str(store_root),
+        backend_adapter=FakeBackend(),
+    )
+    assert report.status == "PASS"
+
+    traces = tmp_path / "out" / "traces"
+    manifests = sorted(traces.iterdir())
+    assert [path.name for path in manifests] == [
+        "batch_2.manifest.json",
+        "run_0.manifest.json",
+        "run_1.manifest.json",
+        "run_2.manifest.json",
+    ]
+    assert len({path.read_bytes() for path in manifests}) == 1
+    rows = read_trace(str(traces / "run_1.manifest.json"))
+    assert [row["input_token_ids"] for row in rows] == [[1], [2], [3]]
+
+    env_ref = json.loads((tmp_path / "out" / "envs" / "run_1.json").read_text(encoding="utf-8"))
+    assert env_ref["artifact_type"] == "artifact_ref"
+    assert load_json(str(tmp_path / "out" / "envs" / "run_1.json"))["artifact_type"] == (
+        "env_snapshot"
+    )
+    # Three distinct rows, one row-digest list and one env snapshot.
+    assert len(_objects(store_root)) == 5
+
+
+def test_store_rejects_corrupt_objects(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    digest = store.put_json({"a": 1})
+    assert store.put_json({"a": 1}) == digest
+    with open(store.object_path(digest), "w", encoding="utf-8") as handle:
+        handle.write('{"a":2}')
+    with pytest.raises(ValueError):
+        store.get_json(digest)
+
+
+def test_cli_diff_resolves_manifests(tmp_path):
+    store = ArtifactStore(str(tmp_path / "store"))
+    left = tmp_path / "left.manifest.json"
+    right = tmp_path / "right.jsonl"
+    rows = [{"prompt_id": "p", "generated_token_ids": [1, 2]}]
+    write_trace(str(left), rows, trace_format="manifest", store=store)
+    write_trace(str(right), [{"prompt_id": "p", "generated_token_ids": [1, 3]}])
+    out_dir = tmp_path / "diff"
+    assert main(["diff", "--left", str(left), "--right", str(right), "--out", str(out_dir)]) == 0
+    report = load_json(str(out_dir / "report.json"))
+    assert report["category"] == "RUN_VARIANCE_FIXED_BATCH"
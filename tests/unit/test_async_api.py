@@ -0,0 +1,111 @@
+import asyncio
+
+import pytest
+
+from detllm import api
+from detllm.backends.synthetic import SyntheticBackend
+from detllm.core.artifacts import load_json
+
+PROMPTS = [f"prompt {idx}" for idx in range(6)]
+
+
+class _SecondCallPerturbed(SyntheticBackend):
+    calls = 0
+
+    def generate(self, prompts, **kwargs):
+        self.calls += 1
+        results = super().generate(prompts, **kwargs)
+        if self.calls == 2:
+            results[0]["output_ids"][-1] += 1
+        return results
+
+
+def _kwargs(out, **overrides):
+    kwargs = dict(
+        backend="synthetic",
+        model="synthetic",
+        prompts=PROMPTS,
+        tier=2,
+        runs=2,
+        batch_size=2,
+        out_dir=str(out),
+    )
+    kwargs.update(overrides)
+    return {key: value for key, value in kwargs.items() if value is not None}
+
+
+def test_acheck_streams_progress_events(tmp_path):
+    async def main():
+        job = api.acheck(**_kwargs(tmp_path))
+        events = [event async for event in job]
+        return await job, events
+
+    report, events = asyncio.run(main())
+    assert report.status == "PASS"
+    kinds = [event.kind for event in events]
+    assert kinds[0] == "run_started" and kinds[-1] == "finished"
+    assert kinds.count("batch_done") == 6
+    assert [event.task for event in events if event.kind == "run_finished"] == ["run_0", "run_1"]
+    written = [event.data["path"] for event in events if event.kind == "artifact_written"]
+    assert str(tmp_path / "report.json") in written
+    batch = next(event for event in events if event.kind == "batch_done")
+    assert (batch.task, batch.data["batch"], batch.data["size"], batch.data["rows"]) == (
+        "run_0",
+        0,
+        2,
+        2,
+    )
+
+
+def test_divergence_events_from_the_sync_api(tmp_path):
+    events = []
+    report = api.check(
+        **_kwargs(tmp_path, batch_size=6, backend_adapter=_SecondCallPerturbed()),
+        on_event=events.append,
+    )
+    assert report.status == "FAIL"
+    divergence = [event for event in events if event.kind == "divergence"]
+    assert [event.task for event in divergence] == ["run_1"]
+    assert divergence[0].data["first_divergence"] == report.details["first_divergence"]
+
+
+def test_checks_share_one_loop(tmp_path):
+    async def main():
+        return await asyncio.gather(
+            api.acheck(**_kwargs(tmp_path / "a")),
+            api.acheck(**_kwargs(tmp_path / "b")),
+            api.arun(**_kwargs(tmp_path / "c", runs=None)),
+        )
+
+    first, second, run = asyncio.run(main())
+    assert first.status == second.status == run.status == "PASS"
+    assert (tmp_path / "c" / "trace.jsonl").exists()
+
+
+def test_cancelled_check_leaves_resumable_artifacts(tmp_path):
+    uninterrupted = api.check(**_kwargs(tmp_path / "full"))
+    out = tmp_path / "cancelled"
+
+    async def main():
+        job = api.acheck(**_kwargs(out))
+        kinds = []
+        async for event in job:
+            kinds.append(event.kind)
+            if event.kind == "batch_done" and event.task == "run_1":
+                job.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await job
+        return kinds
+
+    kinds = asyncio.run(main())
+    assert kinds[-1] == "cancelled" and "finished" not in kinds
+    assert load_json(str(out / "checkpoint.json"))["tasks"]["run_1"]["status"] == "partial"
+
+    resumed = api.check(**_kwargs(out), resume=True)
+    assert (resumed.status, resumed.details["first_divergence"]) == (
+        uninterrupted.status,
+        uninterrupted.details["first_divergence"],
+    )
+    assert (out / "traces" / "run_1.jsonl").read_bytes() == (
+        tmp_path / "full" / "traces" / "run_1.jsonl"
+    ).read_bytes()
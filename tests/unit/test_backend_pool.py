@@ -0,0 +1,70 @@
+import argparse
+
+import pytest
+
+from detllm.backends.pool import BackendKey, BackendPool
+
+
+class CountingBackend:
+    def __init__(self, nbytes=0):
+        self.nbytes = nbytes
+        self.resets = 0
+        self.closed = False
+
+    def reset(self):
+        self.resets += 1
+
+    def close(self):
+        self.closed = True
+
+    def memory_bytes(self):
+        return self.nbytes
+
+
+def _key(model):
+    return BackendKey(backend="hf", model=model, device="cpu", dtype="float32")
+
+
+def test_pool_reuses_and_resets_backend():
+    pool = BackendPool()
+    first = pool.acquire(_key("a"), CountingBackend)
+    second = pool.acquire(_key("a"), CountingBackend)
+    assert first is second
+    assert first.resets == 1
+    assert pool.stats()["loads"] == 1
+    assert pool.stats()["hits"] == 1
+
+
+def test_pool_evicts_least_recently_used():
+    pool = BackendPool(max_entries=2)
+    a = pool.acquire(_key("a"), CountingBackend)
+    pool.acquire(_key("b"), CountingBackend)
+    pool.acquire(_key("a"), CountingBackend)
+    pool.acquire(_key("c"), CountingBackend)
+    assert a.closed is False
+    assert pool.stats()["entries"] == 2
+    assert pool.acquire(_key("b"), CountingBackend) is not None
+    assert pool.stats()["loads"] == 4
+
+
+def test_pool_evicts_over_memory_budget():
+    pool = BackendPool(max_entries=4, max_bytes=150)
+    a = pool.acquire(_key("a"), lambda: CountingBackend(nbytes=100))
+    b = pool.acquire(_key("b"), lambda: CountingBackend(nbytes=100))
+    assert a.closed is True
+    assert b.closed is False
+    assert pool.stats()["bytes"] == 100
+
+
+def test_pool_rejects_empty_capacity():
+    with pytest.raises(ValueError):
+        BackendPool(max_entries=0)
+    with pytest.raises(ValueError):
+        BackendPool(max_bytes=0)
+
+
+def test_backend_key_includes_tokenizer_revision():
+    args = argparse.Namespace(
+        backend="hf", model="m", device="cpu", dtype="float32", tokenizer_revision="abc"
+    )
+    assert BackendKey.from_args(args).tokenizer_revision == "abc"
@@ -0,0 +1,105 @@
+import argparse
+import json
+
+import pytest
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.cli import main as cli_main
+from detllm.core.batching import plan_batches
+from detllm.diff.diff import diff_traces
+
+
+class RecordingBackend:
+    def __init__(self):
+        self.batches = []
+
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def token_lengths(self, prompts):
+        return [len(prompt) for prompt in prompts]
+
+    def generate(self, prompts, **kwargs):
+        self.batches.append(list(prompts))
+        return [
+            {"prompt": prompt, "input_ids": [len(prompt)], "output_ids": [len(prompt)]}
+            for prompt in prompts
+        ]
+
+
+def _args(batch_size):
+    return argparse.Namespace(
+        batch_size=batch_size,
+        max_new_tokens=4,
+        model="m",
+        temperature=0.0,
+        top_p=1.0,
+        top_k=0,
+    )
+
+
+def test_sequential_plan_keeps_file_order():
+    plan = plan_batches(["aaa", "b", "cc"])
+    assert plan.batches(2) == [[0, 1], [2]]
+    assert plan.plan_id is None
+
+
+def test_length_plan_groups_by_length():
+    plan = plan_batches(["aaa", "b", "cc", "d"], "length", [3, 1, 2, 1])
+    assert plan.batches(2) == [[1, 3], [2, 0]]
+    assert plan.length_source == "tokens"
+    assert plan.plan_id == plan_batches(["w", "x", "y", "z"], "length", [3, 1, 2, 1]).plan_id
+
+
+def test_length_plan_falls_back_to_bytes():
+    assert plan_batches(["aa", "b"], "length").length_source == "bytes"
+
+
+def test_plan_rejects_unknown_strategy():
+    with pytest.raises(ValueError):
+        plan_batches(["a"], "random")
+
+
+def test_run_generation_restores_prompt_order():
+    backend = RecordingBackend()
+    prompts = ["long prompt", "a", "mid one", "bb"]
+    plan = plan_batches(prompts, "length", backend.token_lengths(prompts))
+    rows = cli_main._run_generation(backend, prompts, _args(2), plan=plan)
+    assert backend.batches == [["a", "bb"], ["mid one", "long prompt"]]
+    assert [row["generated_token_ids"] for row in rows] == [[11], [1], [7], [2]]
+    assert all(row["batch_plan_id"] == plan.plan_id for row in rows)
+
+
+def test_diff_flags_different_batch_plans():
+    backend = RecordingBackend()
+    prompts = ["long prompt", "a"]
+    sequential = cli_main._run_generation(backend, prompts, _args(1))
+    plan = plan_batches(prompts, "length", backend.token_lengths(prompts))
+    bucketed = cli_main._run_generation(backend, prompts, _args(1), plan=plan)
+    result = diff_traces(sequential, bucketed)
+    assert result.category == "GEN_CONTEXT_MISMATCH"
+    assert result.first_divergence["reason"] == "batch_plan_id mismatch"
+
+
+def test_check_records_batch_plan(tmp_path):
+    out_dir = tmp_path / "out"
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["long prompt", "a", "mid"],
+        runs=2,
+        batch_size=2,
+        batching="length",
+        out_dir=str(out_dir),
+        backend_adapter=RecordingBackend(),
+    )
+    assert report.status == "PASS"
+    run_config = json.loads((out_dir / "run_config.json").read_text(encoding="utf-8"))
+    batching = run_config["generation_context"]["batching"]
+    assert batching["strategy"] == "length"
+    assert batching["plan_id"]
@@ -0,0 +1,63 @@
+from detllm import api
+from detllm.backends.registry import load_backend
+from detllm.backends.synthetic import SyntheticBackend
+from detllm.bench import BENCH_STAGES, compare_bench, run_bench
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json, validate_artifact
+
+
+def test_synthetic_backend_is_deterministic_unless_perturbed():
+    backend = SyntheticBackend(prompt_tokens=4, score_size=3)
+    first = backend.generate(["a", "b"], max_new_tokens=5, capture_scores=True)
+    assert first == backend.generate(["a", "b"], max_new_tokens=5, capture_scores=True)
+    assert len(first[0]["input_ids"]) == 4
+    assert len(first[0]["output_ids"]) == 5
+    assert len(first[0]["scores"]) == 3
+
+    perturbed = SyntheticBackend(prompt_tokens=4, score_size=3, perturb=["b"])
+    second = perturbed.generate(["a", "b"], max_new_tokens=5, capture_scores=True)
+    assert second[0] == first[0]
+    assert second[1]["scores"][-1] != first[1]["scores"][-1]
+    assert load_backend("synthetic") is SyntheticBackend
+
+
+def test_check_with_synthetic_backend_passes(tmp_path):
+    report = api.check(
+        backend="synthetic",
+        model="synthetic",
+        prompts=["a", "b", "c"],
+        tier=2,
+        runs=2,
+        out_dir=str(tmp_path / "out"),
+    )
+    assert report.status == "PASS"
+
+
+def test_run_bench_writes_results(tmp_path):
+    payload = run_bench(str(tmp_path / "bench"), rows=[20], batch_size=8, memory=True)
+    assert payload == load_json(str(tmp_path / "bench" / "bench.json"))
+    validate_artifact(payload)
+    result = payload["results"][0]
+    assert result["rows"] == 20
+    assert set(result["stages"]) | set(result["skipped_stages"]) == set(BENCH_STAGES)
+    # Backend time is split out of the traced batch, its memory is not.
+    traced = {name: stage for name, stage in result["stages"].items() if name != "generate"}
+    assert all(stage["peak_bytes"] is not None for stage in traced.values())
+    assert result["check"]["status"] == "PASS"
+    assert not (tmp_path / "bench" / "work").exists()
+
+    comparison = compare_bench(payload, payload)
+    assert comparison[0]["rows"] == 20
+    assert comparison[0]["speedup"]["trace_write"] == 1.0
+
+
+def test_cli_bench_with_baseline(tmp_path):
+    out = tmp_path / "bench"
+    args = ["bench", "--rows", "10", "--batch-size", "4", "--skip-check", "--out", str(out)]
+    assert main(args) == 0
+    baseline = tmp_path / "baseline.json"
+    (out / "bench.json").rename(baseline)
+    assert main(args + ["--baseline", str(baseline)]) == 0
+    payload = load_json(str(out / "bench.json"))
+    assert "check" not in payload["results"][0]
+    assert payload["comparison"][0]["rows"] == 10
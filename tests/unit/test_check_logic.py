@@ -21,13 +21,17 @@ def test_parse_vary_batch_rejects_non_positive():
 
 def test_report_category_prefers_run_variance():
     run_result = DiffResult(status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={})
-    batch_result = DiffResult(status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={})
+    batch_result = DiffResult(
+        status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={}
+    )
     assert cli_main._report_category(run_result, batch_result) == "RUN_VARIANCE_FIXED_BATCH"
 
 
 def test_report_category_batch_variance_only():
     run_result = DiffResult(status="PASS", category="PASS", first_divergence=None)
-    batch_result = DiffResult(status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={})
+    batch_result = DiffResult(
+        status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={}
+    )
     assert cli_main._report_category(run_result, batch_result) == "BATCH_VARIANCE"
 
 
@@ -61,7 +65,32 @@ def test_batch_divergence_detail_reports_first_batch():
     run_result = DiffResult(status="PASS", category="PASS", first_divergence=None)
     batch_diffs = [
         (1, DiffResult(status="PASS", category="PASS", first_divergence=None)),
-        (2, DiffResult(status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={"idx": 1})),
+        (
+            2,
+            DiffResult(
+                status="FAIL", category="RUN_VARIANCE_FIXED_BATCH", first_divergence={"idx": 1}
+            ),
+        ),
     ]
     detail = cli_main._batch_divergence_detail(batch_diffs, run_result)
     assert detail["batch_size"] == 2
+
+
+def test_acquire_backend_uses_pool(monkeypatch):
+    built = []
+
+    def fake_build(args):
+        built.append(args.model)
+        return object()
+
+    monkeypatch.setattr(cli_main, "_build_backend", fake_build)
+    args = argparse.Namespace(
+        backend="hf", model="m", device="cpu", dtype="float32", reload_per_run=False
+    )
+    pool = cli_main.BackendPool()
+    first = cli_main._acquire_backend(args, pool)
+    second = cli_main._acquire_backend(args, pool)
+    assert first is second
+    assert built == ["m"]
+    assert cli_main._acquire_backend(args, None) is not first
+    assert cli_main._backend_strategy(args, None) == "pooled"
@@ -0,0 +1,129 @@
+import pytest
+
+from detllm import api
+from detllm.backends.synthetic import SyntheticBackend
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json, validate_artifact
+from detllm.core.checkpoint import CheckpointMismatch
+from detllm.trace.io import TraceWriter, partial_trace_path, read_trace, trace_digest
+
+PROMPTS = [f"prompt {idx}" for idx in range(12)]
+LABELS = ("run_0", "run_1", "run_2", "batch_3")
+
+
+class _CountingBackend(SyntheticBackend):
+    def __init__(self, fail_at=None):
+        super().__init__()
+        self.calls = 0
+        self.fail_at = fail_at
+
+    def generate(self, prompts, **kwargs):
+        self.calls += 1
+        if self.calls == self.fail_at:
+            raise RuntimeError("interrupted")
+        return super().generate(prompts, **kwargs)
+
+
+def _check(out, backend, **kwargs):
+    return api.check(
+        backend="synthetic",
+        model="synthetic",
+        prompts=PROMPTS,
+        tier=2,
+        runs=3,
+        batch_size=2,
+        vary_batch=[3],
+        out_dir=str(out),
+        backend_adapter=backend,
+        validate_schema=True,
+        **kwargs,
+    )
+
+
+def _report(out):
+    details = load_json(str(out / "report.json"))["details"]
+    details.pop("metrics")
+    return details
+
+
+def test_resumed_check_matches_uninterrupted(tmp_path):
+    _check(tmp_path / "full", _CountingBackend())
+
+    out = tmp_path / "resumed"
+    # Run 0 takes 6 batches; the 9th call fails in the third batch of run 1.
+    with pytest.raises(RuntimeError):
+        _check(out, _CountingBackend(fail_at=9))
+    checkpoint = load_json(str(out / "checkpoint.json"))
+    validate_artifact(checkpoint)
+    assert checkpoint["tasks"]["run_0"]["status"] == "complete"
+    assert checkpoint["tasks"]["run_1"] == {"status": "partial", "rows": 4}
+    assert len(read_trace(partial_trace_path(str(out / "traces" / "run_1.jsonl")))) == 4
+
+    backend = _CountingBackend()
+    report = _check(out, backend, resume=True)
+    # Only what was missing is generated: 4 batches of run 1, run 2 and the batch sweep.
+    assert backend.calls == 4 + 6 + 4
+    assert report.status == "PASS"
+    assert _report(out) == _report(tmp_path / "full")
+    for label in LABELS:
+        trace = f"traces/{label}.jsonl"
+        assert (out / trace).read_bytes() == (tmp_path / "full" / trace).read_bytes()
+        assert trace_digest(str(out / trace)) == trace_digest(str(tmp_path / "full" / trace))
+        assert trace_digest(str(out / trace)) is not None
+    metrics = load_json(str(out / "metrics.json"))
+    assert [run["label"] for run in metrics["runs"]] == list(LABELS)
+    tasks = load_json(str(out / "checkpoint.json"))["tasks"]
+    assert {task["status"] for task in tasks.values()} == {"complete"}
+
+
+def test_resume_rejects_a_different_check(tmp_path):
+    with pytest.raises(RuntimeError):
+        _check(tmp_path, _CountingBackend(fail_at=3))
+    with pytest.raises(CheckpointMismatch, match="run_config_digest"):
+        _check(tmp_path, _CountingBackend(), resume=True, max_new_tokens=8)
+    with pytest.raises(CheckpointMismatch, match="runs"):
+        api.check(
+            backend="synthetic",
+            model="synthetic",
+            prompts=PROMPTS,
+            tier=2,
+            runs=2,
+            batch_size=2,
+            vary_batch=[3],
+            out_dir=str(tmp_path),
+            resume=True,
+        )
+
+
+def test_cli_resume_exits_2_on_mismatch(tmp_path):
+    argv = ["check", "--backend", "synthetic", "--model", "synthetic", "--prompt", "hi"]
+    argv += ["--runs", "2", "--out", str(tmp_path)]
+    assert main(argv) == 0
+    assert main(argv + ["--resume"]) == 0
+    assert main(argv + ["--resume", "--seed", "1"]) == 2
+
+
+def test_trace_writer_resumes_a_torn_partial_trace(tmp_path):
+    rows = [{"prompt_id": f"{idx:064x}", "value": idx} for idx in range(5)]
+    full = str(tmp_path / "full.jsonl")
+    with TraceWriter(full, index=True) as writer:
+        for idx, row in enumerate(rows):
+            writer.put(idx, row)
+
+    path = str(tmp_path / "resumed.jsonl")
+    with pytest.raises(RuntimeError):
+        with TraceWriter(path, keep_partial=True) as writer:
+            for idx, row in enumerate(rows[:3]):
+                writer.put(idx, row)
+            raise RuntimeError("interrupted")
+    with open(partial_trace_path(path), "a", encoding="utf-8") as handle:
+        handle.write('{"prompt_id": "torn')
+
+    with TraceWriter(path, index=True, resume=True) as writer:
+        assert writer.rows == 3
+        for idx, row in enumerate(rows):
+            writer.put(idx, row)
+    assert open(path, "rb").read() == open(full, "rb").read()
+    assert trace_digest(path) == trace_digest(full) is not None
+    # Index entries match; headers differ only in the stamp binding them to their trace.
+    assert open(f"{path}.idx").readlines()[1:] == open(f"{full}.idx").readlines()[1:]
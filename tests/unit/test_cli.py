@@ -10,3 +10,21 @@ def test_cli_help():
         text=True,
     )
     assert "Deterministic-mode checks" in result.stdout
+
+
+def test_diff_help_does_not_import_backends():
+    script = (
+        "import sys\n"
+        "from detllm.cli.main import main\n"
+        "try:\n"
+        "    main(['diff', '--help'])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "heavy = ('torch', 'transformers', 'vllm', 'numpy', 'detllm.backends.hf',\n"
+        "         'detllm.backends.vllm', 'multiprocessing')\n"
+        "print(sorted(name for name in sys.modules if name.startswith(heavy)))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", script], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.strip().splitlines()[-1] == "[]"
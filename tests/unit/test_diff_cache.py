@@ -0,0 +1,131 @@
+import os
+import shutil
+
+import detllm.diff.cache as diff_cache
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json
+from detllm.diff.cache import DiffCache, cached_diff_trace_files
+from detllm.diff.files import diff_trace_files
+from detllm.diff.tolerance import ScoreTolerance
+from detllm.trace.io import write_trace
+
+BASE = [
+    {"prompt_id": "a", "generated_token_ids": [1, 2], "scores": [-0.5, -1.0]},
+    {"prompt_id": "b", "generated_token_ids": [3], "scores": [-2.0]},
+]
+OTHER = [BASE[0], {"prompt_id": "b", "generated_token_ids": [3], "scores": [-2.5]}]
+
+
+def _legacy_trace(path, rows):
+    # No digest sidecar, as written before trace digests existed.
+    write_trace(str(path), rows)
+    os.remove(f"{path}.digest")
+    return str(path)
+
+
+def test_cached_diff_matches_uncached_and_skips_recompute(tmp_path, monkeypatch):
+    left = _legacy_trace(tmp_path / "left.jsonl", BASE)
+    right = str(tmp_path / "right.jsonl")
+    write_trace(right, OTHER)
+    cache = DiffCache(str(tmp_path / "cache"))
+
+    first = cached_diff_trace_files(cache, left, right)
+    assert first == diff_trace_files(left, right)
+    assert first.category == "SCORE_VARIANCE"
+    cached_baselines = list((tmp_path / "cache" / "traces").rglob("*.dtrace"))
+    assert len(cached_baselines) == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("cached diff should not recompute")
+
+    monkeypatch.setattr(diff_cache, "diff_trace_files", fail)
+    assert cached_diff_trace_files(cache, left, right) == first
+    # Tolerances are part of the key.
+    monkeypatch.undo()
+    tolerant = cached_diff_trace_files(cache, left, right, tolerance=ScoreTolerance(atol=1.0))
+    assert tolerant.status == "PASS"
+
+
+def test_legacy_trace_key_follows_content(tmp_path):
+    path = _legacy_trace(tmp_path / "t.jsonl", BASE)
+    cache = DiffCache(str(tmp_path / "cache"))
+    key = cache.trace_key(path)
+    assert key.startswith("file:")
+    assert cache.trace_key(path) == key
+    _legacy_trace(tmp_path / "t.jsonl", OTHER)
+    assert cache.trace_key(path) != key
+
+    write_trace(path, BASE)
+    assert cache.trace_key(path).startswith("rows:")
+
+
+def test_rewritten_trace_gets_a_new_key(tmp_path):
+    left, right = str(tmp_path / "left.jsonl"), str(tmp_path / "right.jsonl")
+    write_trace(left, BASE)
+    write_trace(right, BASE)
+    cache = DiffCache(str(tmp_path / "cache"))
+    assert cached_diff_trace_files(cache, left, right).status == "PASS"
+
+    same_size = str(tmp_path / "same_size.jsonl")
+    write_trace(same_size, [BASE[0], {**BASE[1], "generated_token_ids": [4]}])
+    assert os.path.getsize(same_size) == os.path.getsize(right)
+    shutil.copyfile(same_size, right)
+    assert cached_diff_trace_files(cache, left, right).status == "FAIL"
+
+
+def test_cache_hits_do_not_read_traces_with_digests(tmp_path, monkeypatch):
+    left, right = str(tmp_path / "left.jsonl"), str(tmp_path / "right.jsonl")
+    write_trace(left, BASE)
+    write_trace(right, OTHER)
+    cache = DiffCache(str(tmp_path / "cache"))
+    first = cached_diff_trace_files(cache, left, right)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("keys of traces with digests come from their sidecars")
+
+    for name in ("file_sha256", "convert_trace", "diff_trace_files"):
+        monkeypatch.setattr(diff_cache, name, fail)
+    assert cached_diff_trace_files(cache, left, right) == first
+
+
+def test_cache_only_walks_when_the_ledger_crosses_the_budget(tmp_path, monkeypatch):
+    cache = DiffCache(str(tmp_path / "cache"), max_bytes=10_000)
+    cache.store("diff", {"n": 0}, {"payload": "x"})
+    walks = []
+    real_walk = os.walk
+    monkeypatch.setattr(diff_cache.os, "walk", lambda root: walks.append(root) or real_walk(root))
+    for idx in range(1, 5):
+        cache.store("diff", {"n": idx}, {"payload": "x"})
+    assert walks == []
+    cache.store("diff", {"n": 5}, {"payload": "x" * 20_000})
+    assert len(walks) == 1
+    assert cache.lookup("diff", {"n": 5}) is None
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = DiffCache(str(tmp_path / "cache"), max_bytes=400)
+    for idx in range(3):
+        cache.store("diff", {"n": idx}, {"payload": "x" * 100})
+        os.utime(cache._entry_path("results", cache._key("diff", {"n": idx}), ".json"), (idx, idx))
+    assert cache.lookup("diff", {"n": 0}) is not None  # refreshes entry 0
+    cache.store("diff", {"n": 3}, {"payload": "x" * 100})
+    cache.store("diff", {"n": 4}, {"payload": "x" * 100})
+    assert cache.lookup("diff", {"n": 1}) is None
+    assert cache.lookup("diff", {"n": 0}) is not None
+    assert cache.lookup("diff", {"n": 4}) is not None
+
+
+def test_cli_diff_cache_dir(tmp_path):
+    left, right = str(tmp_path / "left.jsonl"), str(tmp_path / "right.jsonl")
+    write_trace(left, BASE)
+    write_trace(right, OTHER)
+    out = tmp_path / "out"
+    args = ["diff", "--left", left, "--right", right, "--out", str(out), "--score-stats"]
+    args += ["--cache-dir", str(tmp_path / "cache")]
+    assert main(args) == 0
+    first = load_json(str(out / "report.json"))
+    assert main(args) == 0
+    second = load_json(str(out / "report.json"))
+    assert first["details"] == second["details"]
+    assert second["category"] == "SCORE_VARIANCE"
+    assert second["details"]["score_drift"]["max_abs_diff"] == 0.5
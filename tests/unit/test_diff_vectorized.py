@@ -0,0 +1,81 @@
+import random
+
+import pytest
+
+from detllm.diff.diff import diff_traces
+from detllm.trace.io import write_trace
+
+np = pytest.importorskip("numpy")
+
+from detllm.diff.vectorized import diff_binary_traces, diff_traces_vectorized  # noqa: E402
+
+
+def _row(idx, rng):
+    row = {
+        "prompt_id": f"p{idx}",
+        "input_token_ids_hash": f"h{idx}",
+        "generated_token_ids": [rng.randrange(50) for _ in range(rng.randrange(6))],
+        "tokenizer_id": "tok",
+        "decoding_temperature": 0.0,
+    }
+    if rng.random() < 0.8:
+        row["scores"] = [rng.choice([-0.5, -1.0, 0.0]) for _ in row["generated_token_ids"]]
+    return row
+
+
+def _mutate(row, rng):
+    row = {**row, "generated_token_ids": list(row["generated_token_ids"])}
+    choice = rng.randrange(7)
+    if choice == 0 and row["generated_token_ids"]:
+        row["generated_token_ids"][-1] += 1
+    elif choice == 1:
+        row["generated_token_ids"].append(7)
+    elif choice == 2 and row.get("scores"):
+        row["scores"] = [*row["scores"][:-1], float("nan")]
+    elif choice == 3:
+        row["scores"] = None
+    elif choice == 4:
+        row["tokenizer_id"] = "other"
+    elif choice == 5:
+        row["decoding_temperature"] = 0.5
+    else:
+        row["input_token_ids_hash"] = None
+    return row
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_vectorized_matches_python_engine(seed):
+    rng = random.Random(seed)
+    base = [_row(idx, rng) for idx in range(40)]
+    other = [_mutate(row, rng) if rng.random() < 0.1 else row for row in base]
+    expected = diff_traces(base, other, engine="python")
+    assert diff_traces_vectorized(base, other) == expected
+    assert diff_traces(base, other, engine="numpy") == expected
+
+
+def test_vectorized_handles_lengths_and_empty_traces():
+    rows = [{"prompt_id": "a", "generated_token_ids": [1]}]
+    assert diff_traces_vectorized([], []).status == "PASS"
+    assert diff_traces_vectorized(rows, []) == diff_traces(rows, [], engine="python")
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_binary_engine_matches_python_engine(tmp_path, seed):
+    rng = random.Random(seed)
+    base = [_row(idx, rng) for idx in range(30)]
+    other = [_mutate(row, rng) if rng.random() < 0.1 else row for row in base]
+    left, right = tmp_path / "left.dtrace", tmp_path / "right.dtrace"
+    write_trace(str(left), base, trace_format="binary")
+    write_trace(str(right), other, trace_format="binary")
+    assert diff_binary_traces(str(left), str(right)) == diff_traces(base, other, engine="python")
+
+
+def test_vectorized_rechecks_rows_sharing_a_nan():
+    nan = float("nan")
+    scores = [-0.5, nan]
+    base = [{"prompt_id": "a", "generated_token_ids": [1, 2], "scores": scores}]
+    other = [{"prompt_id": "a", "generated_token_ids": [1, 2], "scores": scores}]
+    assert base == other
+    expected = diff_traces(base, other, engine="python")
+    assert expected.category == "SCORE_VARIANCE"
+    assert diff_traces_vectorized(base, other) == expected
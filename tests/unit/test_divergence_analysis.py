@@ -0,0 +1,78 @@
+import json
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.diff.analysis import DivergenceAnalyzer
+
+
+def _row(pid, tokens, scores=None):
+    return {"prompt_id": pid, "generated_token_ids": tokens, "scores": scores}
+
+
+def test_analyzer_clusters_runs_and_counts_divergences():
+    baseline = [_row("a", [1, 2]), _row("b", [3, 4], [-0.5, -0.5])]
+    analyzer = DivergenceAnalyzer()
+    analyzer.add_trace("run_0", baseline)
+    analyzer.add_trace("run_1", baseline)
+    analyzer.add_trace("run_2", [_row("a", [1, 9]), _row("b", [3, 4], [-0.5, -0.25])])
+    analyzer.add_trace("batch_2", [_row("a", [1, 9]), _row("b", [3, 4], [-0.5, -0.25])])
+    result = analyzer.result()
+
+    assert [cluster["traces"] for cluster in result["clusters"]] == [
+        ["run_0", "run_1"],
+        ["run_2", "batch_2"],
+    ]
+    assert result["prompts"]["diverged"] == 2
+    first, second = result["prompts"]["per_prompt"]
+    assert first == {
+        "index": 0,
+        "prompt_id": "a",
+        "distinct_outputs": 2,
+        "runs_diverged": ["run_2", "batch_2"],
+        "first_token_index": 1,
+    }
+    assert second["first_token_index"] is None
+    assert result["positions"] == {
+        "histogram": [{"token_index": 1, "count": 2}],
+        "score_only": 2,
+    }
+
+
+class FlakyBackend:
+    def __init__(self):
+        self.calls = 0
+
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        self.calls += 1
+        # Only run_2's first prompt drifts.
+        last = 7 if self.calls == 5 else 2
+        return [{"prompt": p, "input_ids": [1], "output_ids": [1, last]} for p in prompts]
+
+
+def test_check_writes_divergence_analysis(tmp_path):
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["p0", "p1"],
+        runs=3,
+        analyze=True,
+        out_dir=str(tmp_path / "out"),
+        backend_adapter=FlakyBackend(),
+    )
+    assert report.details["analysis"] == {
+        "clusters": 2,
+        "diverged_prompts": 1,
+        "total_prompts": 2,
+    }
+    diffs = tmp_path / "out" / "diffs"
+    assert (diffs / "first_divergence.json").exists()
+    analysis = json.loads((diffs / "divergence_analysis.json").read_text(encoding="utf-8"))
+    assert analysis["artifact_type"] == "divergence_analysis"
+    assert analysis["clusters"][1]["traces"] == ["run_2"]
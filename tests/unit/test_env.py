@@ -37,3 +37,47 @@ def test_cli_env_writes_file(tmp_path):
     data = json.loads(out_path.read_text(encoding="utf-8"))
     assert data["artifact_type"] == "env_snapshot"
     assert "fingerprint" in data
+
+
+def test_versions_come_from_metadata_without_importing(monkeypatch):
+    monkeypatch.setattr(env_module.metadata, "version", lambda name: f"{name}-9.9")
+
+    def no_import(name):
+        raise AssertionError(f"{name} should not be imported")
+
+    monkeypatch.setattr(env_module.importlib, "import_module", no_import)
+    assert env_module._get_version("transformers") == "transformers-9.9"
+
+
+def test_versions_without_metadata_or_package(monkeypatch):
+    def missing(name):
+        raise env_module.metadata.PackageNotFoundError(name)
+
+    monkeypatch.setattr(env_module.metadata, "version", missing)
+    assert env_module._get_version("detllm_no_such_package") is None
+    assert env_module._get_version("json") == getattr(__import__("json"), "__version__", None)
+
+
+def test_static_env_is_memoised_and_fingerprint_matches_full_hash(monkeypatch):
+    calls = []
+    monkeypatch.setattr(env_module, "_torch_device_info", lambda: calls.append(1) or None)
+    env_module.clear_env_cache()
+    try:
+        first = env_module.capture_env()
+        monkeypatch.setenv("OMP_NUM_THREADS", "3")
+        second = env_module.capture_env()
+        redacted = env_module.capture_env(redact=True, redact_env_vars=["OMP_NUM_THREADS"])
+        # Callers may mutate their snapshot without touching the memoised copy.
+        second["python"]["version"] = "0"
+        assert env_module.capture_env()["python"]["version"] != "0"
+    finally:
+        env_module.clear_env_cache()
+
+    assert calls == [1]
+    assert second["env_vars"]["OMP_NUM_THREADS"] == "3"
+    assert first["fingerprint"] != second["fingerprint"]
+    assert redacted["python"]["executable"] == "<redacted>"
+    assert redacted["env_vars"]["OMP_NUM_THREADS"] == "<redacted>"
+    for snapshot in (first, redacted):
+        payload = {key: value for key, value in snapshot.items() if key != "fingerprint"}
+        assert snapshot["fingerprint"] == env_module._canonical_fingerprint(payload)
@@ -0,0 +1,74 @@
+import json
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+
+
+class DriftingBackend:
+    """Returns baseline tokens on the first pass, then diverges on the second prompt."""
+
+    def __init__(self, step_stopping=False):
+        self.step_stopping = step_stopping
+        self.calls = 0
+        self.references = []
+
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+            supports_step_stopping=self.step_stopping,
+        )
+
+    def generate(self, prompts, **kwargs):
+        self.calls += 1
+        if "reference_output_ids" in kwargs:
+            self.references.append(kwargs["reference_output_ids"])
+        drift = self.calls > 4 and prompts == ["p1"]
+        return [
+            {"prompt": prompt, "input_ids": [1], "output_ids": [1, 9 if drift else 2]}
+            for prompt in prompts
+        ]
+
+
+def _check(tmp_path, backend, fail_fast=True):
+    return api.check(
+        backend="hf",
+        model="fake",
+        prompts=["p0", "p1", "p2", "p3"],
+        runs=3,
+        fail_fast=fail_fast,
+        out_dir=str(tmp_path / "out"),
+        backend_adapter=backend,
+    )
+
+
+def test_fail_fast_stops_at_first_divergent_batch(tmp_path):
+    backend = DriftingBackend()
+    report = _check(tmp_path, backend)
+    assert report.category == "RUN_VARIANCE_FIXED_BATCH"
+    assert report.details["fail_fast"]["aborted"]["task"] == "run_1"
+    assert backend.calls == 6
+
+    traces = tmp_path / "out" / "traces"
+    partial = (traces / "run_1.jsonl").read_text(encoding="utf-8").strip().splitlines()
+    assert len(partial) == 2
+    assert not (traces / "run_2.jsonl").exists()
+
+    divergence = json.loads(
+        (tmp_path / "out" / "diffs" / "first_divergence.json").read_text(encoding="utf-8")
+    )
+    assert divergence["index"] == 1
+    assert divergence["token_index"] == 1
+
+
+def test_fail_fast_matches_full_check_result(tmp_path):
+    fast = _check(tmp_path / "fast", DriftingBackend())
+    full = _check(tmp_path / "full", DriftingBackend(), fail_fast=False)
+    assert fast.details["first_divergence"] == full.details["first_divergence"]
+
+
+def test_fail_fast_passes_reference_tokens_when_supported(tmp_path):
+    backend = DriftingBackend(step_stopping=True)
+    _check(tmp_path, backend)
+    assert backend.references[0] == [[1, 2]]
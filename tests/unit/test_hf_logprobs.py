@@ -0,0 +1,29 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+
+from detllm.backends.hf import _ChosenTokenLogprobs  # noqa: E402
+
+
+def test_chosen_token_logprobs_match_full_scores():
+    step_scores = [
+        torch.tensor([[1.0, 2.0, 0.5], [0.1, 0.2, 3.0]]),
+        torch.tensor([[0.3, 0.1, 0.9], [2.0, 1.0, 0.0]]),
+    ]
+    chosen = [torch.tensor([1, 2]), torch.tensor([2, 0])]
+    capture = _ChosenTokenLogprobs(batch_size=2, max_steps=4)
+
+    input_ids = torch.tensor([[7], [7]])
+    for scores, tokens in zip(step_scores, chosen, strict=True):
+        capture(input_ids, scores)
+        input_ids = torch.cat([input_ids, tokens.view(-1, 1)], dim=1)
+    result = capture.finish(input_ids)
+
+    expected = [
+        [
+            float(torch.log_softmax(step_scores[step][row], dim=-1)[chosen[step][row]].item())
+            for step in range(2)
+        ]
+        for row in range(2)
+    ]
+    assert result == expected
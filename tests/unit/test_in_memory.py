@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+from detllm import api
+from detllm.backends.synthetic import SyntheticBackend
+from detllm.core.artifacts import load_json
+
+PROMPTS = ["alpha", "beta", "gamma"]
+CHECK = dict(backend="synthetic", model="synthetic", prompts=PROMPTS, runs=2, vary_batch=[2])
+
+
+class _SecondCallPerturbed(SyntheticBackend):
+    calls = 0
+
+    def generate(self, prompts, **kwargs):
+        self.calls += 1
+        results = super().generate(prompts, **kwargs)
+        if self.calls == 2:
+            results[-1]["output_ids"][0] += 1
+        return results
+
+
+def _files(root):
+    return sorted(
+        os.path.relpath(os.path.join(path, name), root)
+        for path, _, names in os.walk(root)
+        for name in names
+    )
+
+
+def test_in_memory_check_writes_nothing_until_saved(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = api.check(**CHECK, write_artifacts=False)
+    assert os.listdir(tmp_path) == []
+
+    assert (result.status, result.category) == ("PASS", "PASS")
+    assert result.diff is None
+    assert sorted(result.traces) == ["batch_2", "run_0", "run_1"]
+    assert [row["generated_token_ids"] for row in result.traces["run_1"]] == [
+        row["generated_token_ids"] for row in result.traces["run_0"]
+    ]
+    assert sorted(result.envs) == ["run_0", "run_1"]
+    assert result.env["fingerprint"] == result.envs["run_1"]["fingerprint"]
+
+    on_disk = api.check(**CHECK, out_dir=str(tmp_path / "disk"))
+    result.save(str(tmp_path / "saved"))
+    assert _files(tmp_path / "saved") == [
+        name for name in _files(tmp_path / "disk") if name != "checkpoint.json"
+    ]
+    saved_report = load_json(str(tmp_path / "saved" / "report.json"))
+    assert (saved_report["status"], saved_report["details"]["first_divergence"]) == (
+        on_disk.status,
+        on_disk.details["first_divergence"],
+    )
+    for name in ("run_0.jsonl", "batch_2.jsonl"):
+        saved = (tmp_path / "saved" / "traces" / name).read_bytes()
+        assert saved == (tmp_path / "disk" / "traces" / name).read_bytes()
+
+
+def test_in_memory_divergence(tmp_path):
+    result = api.check(
+        **CHECK, batch_size=3, backend_adapter=_SecondCallPerturbed(), write_artifacts=False
+    )
+    assert result.status == "FAIL"
+    assert result.diff["artifact_type"] == "first_divergence"
+    assert result.diff["index"] == result.details["first_divergence"]["index"] == 2
+    result.save(str(tmp_path))
+    assert load_json(str(tmp_path / "diffs" / "first_divergence.json")) == result.diff
+
+
+def test_in_memory_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    result = api.run(backend="synthetic", model="synthetic", prompts=PROMPTS, write_artifacts=False)
+    assert result.status == "PASS"
+    assert len(result.traces["trace"]) == 3
+    assert result.envs == {}
+    assert os.listdir(tmp_path) == []
+
+
+def test_in_memory_rejects_file_backed_options():
+    with pytest.raises(ValueError, match="resume, workers"):
+        api.check(**CHECK, resume=True, workers=2, write_artifacts=False)
+    with pytest.raises(ValueError, match="shard"):
+        api.run(
+            backend="synthetic",
+            model="synthetic",
+            prompts=PROMPTS,
+            shard="0/2",
+            write_artifacts=False,
+        )
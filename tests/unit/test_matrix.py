@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from detllm import api
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json, validate_artifact
+from detllm.matrix import expand_matrix, load_spec, plan_matrix
+
+SPEC = {
+    "base": {"backend": "synthetic", "prompt": "hello", "runs": 2, "tier": 2},
+    "matrix": {"batch-size": [1, 2], "model": ["a", "b"]},
+}
+
+
+def test_cells_are_grouped_by_loaded_model():
+    cells = expand_matrix(SPEC)
+    assert [cell.params["model"] for cell in cells] == ["a", "b", "a", "b"]
+    assert cells[0].argv[:3] == ("check", "--backend", "synthetic")
+    plan = plan_matrix(cells)
+    assert [cell.id for cell in plan] == ["cell_000", "cell_002", "cell_001", "cell_003"]
+
+
+def test_matrix_runs_every_cell_with_one_load_per_model(tmp_path):
+    payload = api.matrix(spec=SPEC, out_dir=str(tmp_path), validate_schema=True)
+    validate_artifact(load_json(str(tmp_path / "matrix.json")))
+    assert payload["backend_loads"] == 2
+    assert payload["summary"]["statuses"] == {"PASS": 4}
+    assert [group["cells"] for group in payload["groups"]] == [
+        ["cell_000", "cell_002"],
+        ["cell_001", "cell_003"],
+    ]
+    for cell in payload["cells"]:
+        report = load_json(str(tmp_path / cell["dir"] / "report.json"))
+        assert report["details"]["baseline_batch_size"] == cell["params"]["batch_size"]
+        assert cell["seconds"] > 0
+        assert cell["metrics"]["runs"] == 2
+
+
+def test_invalid_specs_are_rejected(tmp_path):
+    with pytest.raises(ValueError, match="cannot set 'out'"):
+        expand_matrix({"base": {"out": "x"}, "matrix": {"model": ["a"]}})
+    with pytest.raises(ValueError, match="non-empty list"):
+        expand_matrix({"matrix": {"model": "a"}})
+    with pytest.raises(ValueError, match="Invalid matrix cell"):
+        expand_matrix({"base": {"model": "a", "no_such_option": 1}})
+    # Rejected by the checks ``check`` runs after parsing, before any cell runs.
+    with pytest.raises(ValueError, match="Invalid matrix cell"):
+        expand_matrix({**SPEC, "matrix": {"workers": [1, 0], "batch-size": [1, 2]}})
+
+    spec_path = tmp_path / "spec.json"
+    spec_path.write_text(json.dumps({"matrix": {"model": ["a"], "tier": ["x"]}}))
+    assert main(["matrix", "--spec", str(spec_path), "--out", str(tmp_path / "out")]) == 2
+
+
+def test_cell_exiting_is_recorded_and_the_matrix_continues(tmp_path, monkeypatch):
+    import detllm.cli.main as cli_main
+
+    dispatch = cli_main._dispatch
+
+    def exit_for_model_b(parser, args, pool=None):
+        if args.model == "b":
+            parser.error("rejected")
+        return dispatch(parser, args, pool=pool)
+
+    monkeypatch.setattr(cli_main, "_dispatch", exit_for_model_b)
+    payload = api.matrix(spec=SPEC, out_dir=str(tmp_path))
+    assert payload["summary"]["statuses"] == {"PASS": 2, "ERROR": 2}
+    errored = [cell for cell in payload["cells"] if cell["status"] == "ERROR"]
+    assert [(cell["params"]["model"], cell["exit_code"]) for cell in errored] == [("b", 2)] * 2
+
+
+def test_toml_spec_and_dry_run(tmp_path):
+    pytest.importorskip("tomllib")
+    spec_path = tmp_path / "spec.toml"
+    spec_path.write_text(
+        '[base]\nbackend = "synthetic"\nprompt = "hi"\n\n[matrix]\nmodel = ["a", "b"]\n'
+    )
+    assert load_spec(str(spec_path))["matrix"] == {"model": ["a", "b"]}
+    out = tmp_path / "out"
+    assert main(["matrix", "--spec", str(spec_path), "--out", str(out), "--dry-run"]) == 0
+    payload = load_json(str(out / "matrix.json"))
+    assert payload["summary"]["statuses"] == {"PENDING": 2}
+    assert not (out / "cells").exists()
@@ -0,0 +1,92 @@
+from dataclasses import dataclass
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.core.artifacts import load_json, validate_artifact
+from detllm.core.metrics import RunMetrics, summarize_metrics
+
+
+@dataclass
+class FakeBackend:
+    stats: dict | None = None
+
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        self.last_batch_stats = self.stats
+        return [
+            {"prompt": prompt, "input_ids": [1] * (idx + 1), "output_ids": [3, 4], "scores": None}
+            for idx, prompt in enumerate(prompts)
+        ]
+
+
+def test_batch_metrics_derive_padding_and_tokens():
+    metrics = RunMetrics("run_1")
+    with metrics.time_load():
+        pass
+    results = [
+        {"input_ids": [1], "output_ids": [2, 3]},
+        {"input_ids": [1, 2, 3], "output_ids": [4]},
+    ]
+    metrics.add_batch(results, 0.5)
+    payload = metrics.to_dict()
+    assert payload["input_tokens"] == 4
+    assert payload["padding_tokens"] == 2
+    assert payload["padding_ratio"] == 2 / 6
+    assert payload["generated_tokens"] == 3
+    assert payload["tokens_per_s"] == 6.0
+    assert payload["prefill_s"] is None
+    assert payload["wall_s"] >= payload["load_s"] >= 0.0
+
+    summary = summarize_metrics([payload, payload])
+    assert summary["runs"] == 2
+    assert summary["generated_tokens"] == 6
+
+
+def test_backend_batch_stats_take_precedence():
+    metrics = RunMetrics("run_1")
+    stats = {"prefill_s": 0.1, "decode_s": 0.2, "padding_tokens": 0, "unknown": 1}
+    metrics.add_batch([{"input_ids": [1], "output_ids": [2]}, {"input_ids": [1, 2]}], 1.0, stats)
+    batch = metrics.to_dict()["batches"][0]
+    assert batch["padding_tokens"] == 0
+    assert batch["prefill_s"] == 0.1
+    assert "unknown" not in batch
+
+
+def test_check_writes_metrics_artifact(tmp_path):
+    out = tmp_path / "out"
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["a", "b"],
+        runs=2,
+        batch_size=2,
+        out_dir=str(out),
+        backend_adapter=FakeBackend({"prefill_s": 0.01, "decode_s": 0.02}),
+    )
+    payload = load_json(str(out / "metrics.json"))
+    validate_artifact(payload)
+    assert [run["label"] for run in payload["runs"]] == ["run_0", "run_1"]
+    assert payload["runs"][0]["prefill_s"] == 0.01
+    assert payload["summary"]["generated_tokens"] == 8
+    assert report.details["metrics"] == payload["summary"]
+    assert "- metrics:" in (out / "report.txt").read_text(encoding="utf-8")
+
+
+def test_run_writes_metrics_artifact(tmp_path):
+    out = tmp_path / "out"
+    api.run(
+        backend="hf",
+        model="fake",
+        prompts=["a"],
+        out_dir=str(out),
+        backend_adapter=FakeBackend(),
+    )
+    payload = load_json(str(out / "metrics.json"))
+    validate_artifact(payload)
+    assert payload["runs"][0]["label"] == "run"
@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+import pstats
+
+import pytest
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json
+from detllm.core.profiling import BatchProfiler
+
+
+@dataclass
+class FakeBackend:
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        return [
+            {"prompt": prompt, "input_ids": [1, 2], "output_ids": [3, 4], "scores": None}
+            for prompt in prompts
+        ]
+
+
+def test_cprofile_samples_first_batches(tmp_path):
+    profiler = BatchProfiler("cprofile", str(tmp_path), "run_0", batches=2, top=5)
+    for batch in range(4):
+        profiler.start(batch)
+        sum(range(1000))
+        profiler.stop()
+    saved = profiler.save()
+    assert saved["batches"] == [0, 1]
+    assert saved["files"] == ["profiles/run_0.pstats", "profiles/run_0.txt"]
+    stats = pstats.Stats(str(tmp_path / "profiles" / "run_0.pstats"))
+    assert stats.total_calls > 0
+    assert "cumulative" in (tmp_path / "profiles" / "run_0.txt").read_text(encoding="utf-8")
+
+
+def test_unsampled_profiler_writes_nothing(tmp_path):
+    profiler = BatchProfiler("cprofile", str(tmp_path), "run_0", batches=1)
+    assert profiler.start(3) is False
+    assert profiler.save() is None
+    assert not (tmp_path / "profiles").exists()
+
+
+def test_check_profiles_sampled_runs(tmp_path):
+    out = tmp_path / "out"
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["a", "b", "c"],
+        runs=3,
+        vary_batch=[2],
+        out_dir=str(out),
+        backend_adapter=FakeBackend(),
+        profile="cprofile",
+        profile_runs=2,
+        profile_batches=2,
+    )
+    profile = report.details["profile"]
+    assert profile["profiler"] == "cprofile"
+    assert [run["label"] for run in profile["runs"]] == ["run_0", "run_1"]
+    assert profile["runs"][0]["batches"] == [0, 1]
+    assert (out / "profiles" / "run_1.pstats").exists()
+    assert not (out / "profiles" / "run_2.pstats").exists()
+
+
+def test_check_rejects_bad_profile_settings(tmp_path):
+    with pytest.raises(ValueError):
+        api.check(backend="hf", model="fake", prompts=["a"], profile="perf")
+    with pytest.raises(ValueError):
+        api.check(backend="hf", model="fake", prompts=["a"], profile="cprofile", profile_runs=0)
+
+
+def test_cli_run_profile(tmp_path, monkeypatch):
+    import detllm.cli.main as cli_main
+
+    monkeypatch.setattr(cli_main, "_build_backend", lambda args: FakeBackend())
+    out = tmp_path / "out"
+    args = ["run", "--model", "fake", "--prompt", "hi", "--out", str(out), "--profile", "cprofile"]
+    assert main(args) == 0
+    assert (out / "profiles" / "run.pstats").exists()
+    assert load_json(str(out / "metrics.json"))["runs"][0]["label"] == "run"
+
+
+def test_torch_profiler_writes_chrome_trace(tmp_path):
+    torch = pytest.importorskip("torch")
+    profiler = BatchProfiler("torch", str(tmp_path), "run_0", batches=1, top=5)
+    profiler.start(0)
+    torch.ones(4).sum()
+    profiler.stop()
+    saved = profiler.save()
+    assert saved["files"] == ["profiles/run_0.batch0.trace.json", "profiles/run_0.txt"]
+    assert load_json(str(tmp_path / "profiles" / "run_0.batch0.trace.json"))
@@ -1,4 +1,16 @@
+import math
+import sys
+
+import pytest
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json
 from detllm.diff.diff import diff_traces
+from detllm.diff.files import score_drift_files
+from detllm.diff.tolerance import ScoreDrift, ScoreTolerance, ulp_distance
+from detllm.trace.io import write_trace
 
 
 def test_diff_traces_score_divergence():
@@ -7,3 +19,128 @@ def test_diff_traces_score_divergence():
     result = diff_traces(base, other)
     assert result.status == "FAIL"
     assert result.category == "SCORE_VARIANCE"
+
+
+def _rows(scores):
+    return [{"prompt_id": "a", "generated_token_ids": [1, 2], "scores": scores}]
+
+
+def test_score_tolerances_accept_small_drift_only():
+    base = _rows([-0.5, -1.0])
+    one_ulp = _rows([-0.5, math.nextafter(-1.0, 0.0)])
+    assert ulp_distance(-1.0, math.nextafter(-1.0, 0.0)) == 1
+    assert ulp_distance(-0.0, 0.0) == 0
+    assert diff_traces(base, one_ulp).category == "SCORE_VARIANCE"
+    assert diff_traces(base, one_ulp, tolerance=ScoreTolerance(ulps=1)).status == "PASS"
+    drifted = _rows([-0.5, -1.001])
+    assert diff_traces(base, drifted, tolerance=ScoreTolerance(atol=1e-2)).status == "PASS"
+    assert diff_traces(base, drifted, tolerance=ScoreTolerance(rtol=1e-4)).status == "FAIL"
+    nan = _rows([-0.5, float("nan")])
+    assert diff_traces(nan, nan, tolerance=ScoreTolerance(atol=1.0, ulps=10)).status == "FAIL"
+    with pytest.raises(ValueError):
+        ScoreTolerance(atol=-1.0)
+
+
+@pytest.mark.parametrize("vectorised", [True, False])
+def test_score_drift_statistics(monkeypatch, vectorised):
+    if vectorised:
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setitem(sys.modules, "numpy", None)
+    drift = ScoreDrift(ScoreTolerance(ulps=1), top_k=2, chunk_values=3)
+    drift.add(0, _rows([-0.5, -1.0])[0], _rows([-0.5, math.nextafter(-1.0, 0.0)])[0])
+    drift.add(1, _rows([-2.0, -3.0])[0], _rows([-2.25, -3.0])[0], label="run_1")
+    drift.add(2, _rows([float("inf")])[0], _rows([float("inf")])[0])
+    stats = drift.to_dict()
+
+    assert stats["values_compared"] == 5
+    assert stats["values_differing"] == 2
+    assert stats["beyond_tolerance"] == 1
+    assert stats["non_finite"] == 0
+    assert stats["max_abs_diff"] == 0.25
+    assert stats["mean_abs_diff"] == pytest.approx((0.25 + 2**-53) / 5)
+    assert {entry["ulps"]: entry["count"] for entry in stats["ulp_histogram"]}["1"] == 1
+    assert stats["largest"][0] == {
+        "index": 1,
+        "score_index": 0,
+        "abs_diff": 0.25,
+        "ulps": ulp_distance(-2.0, -2.25),
+        "trace": "run_1",
+    }
+    assert len(stats["largest"]) == 2
+
+
+def test_cli_diff_score_tolerance_and_stats(tmp_path):
+    left, right = tmp_path / "left.jsonl", tmp_path / "right.jsonl"
+    write_trace(str(left), _rows([-0.5, -1.0]))
+    write_trace(str(right), _rows([-0.5, -1.0 + 1e-9]))
+    out = tmp_path / "out"
+    args = ["diff", "--left", str(left), "--right", str(right), "--out", str(out)]
+
+    assert main([*args, "--score-stats"]) == 0
+    report = load_json(str(out / "report.json"))
+    assert report["category"] == "SCORE_VARIANCE"
+    assert report["details"]["score_drift"]["beyond_tolerance"] == 1
+
+    assert main([*args, "--score-atol", "1e-6", "--score-stats"]) == 0
+    report = load_json(str(out / "report.json"))
+    assert report["status"] == "PASS"
+    assert report["details"]["score_tolerance"]["atol"] == 1e-6
+    assert report["details"]["score_drift"]["beyond_tolerance"] == 0
+    assert "score_drift" in (out / "report.txt").read_text(encoding="utf-8")
+
+
+def test_score_drift_needs_equal_lengths(tmp_path):
+    left, right = tmp_path / "left.jsonl", tmp_path / "right.jsonl"
+    write_trace(str(left), _rows([-0.5, -1.0]) * 2)
+    write_trace(str(right), _rows([-0.5, -1.0]))
+    with pytest.raises(ValueError):
+        score_drift_files(str(left), str(right))
+
+    out = tmp_path / "out"
+    args = ["diff", "--left", str(left), "--right", str(right), "--out", str(out)]
+    assert main([*args, "--score-stats"]) == 0
+    report = load_json(str(out / "report.json"))
+    assert report["details"]["first_divergence"]["reason"] == "trace lengths differ"
+    assert "score_drift" not in report["details"]
+
+
+class UlpNoiseBackend:
+    """Scores move by one ULP on every call after the first."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def capabilities(self):
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        self.calls += 1
+        score = -1.0 if self.calls == 1 else math.nextafter(-1.0, 0.0)
+        return [
+            {"prompt": prompt, "input_ids": [1], "output_ids": [2], "scores": [score]}
+            for prompt in prompts
+        ]
+
+
+@pytest.mark.parametrize("ulps, status", [(0, "FAIL"), (1, "PASS")])
+def test_check_reports_score_drift(tmp_path, ulps, status):
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["p0"],
+        tier=2,
+        runs=3,
+        score_ulps=ulps,
+        out_dir=str(tmp_path / "out"),
+        backend_adapter=UlpNoiseBackend(),
+    )
+    assert report.status == status
+    drift = report.details["score_drift"]
+    assert drift["values_compared"] == 2
+    assert drift["max_ulps"] == 1
+    assert drift["beyond_tolerance"] == (0 if ulps else 2)
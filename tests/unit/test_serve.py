@@ -0,0 +1,104 @@
+import threading
+
+import pytest
+
+from detllm import serve
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json
+from detllm.serve import JobServer, parse_address, submit_job
+
+CHECK = ["check", "--backend", "synthetic", "--model", "synthetic", "--tier", "2", "--runs", "2"]
+
+
+@pytest.fixture
+def server(request, tmp_path):
+    if getattr(request, "param", None) == "unix":
+        address = f"unix:{tmp_path / 'detllm.sock'}"
+    else:
+        address = "127.0.0.1:0"
+    job_server = JobServer(address, jobs=2)
+    job_server.start()
+    thread = threading.Thread(target=job_server.serve_forever, daemon=True)
+    thread.start()
+    yield job_server
+    job_server.shutdown()
+    thread.join()
+
+
+def test_parse_address():
+    assert parse_address("unix:/tmp/d.sock") == ("unix", "/tmp/d.sock")
+    assert parse_address("unix:///tmp/d.sock") == ("unix", "/tmp/d.sock")
+    assert parse_address("/tmp/d.sock") == ("unix", "/tmp/d.sock")
+    assert parse_address("http://localhost:9000") == ("tcp", ("localhost", 9000))
+    assert parse_address("127.0.0.1:9000") == ("tcp", ("127.0.0.1", 9000))
+    with pytest.raises(ValueError):
+        parse_address("localhost")
+
+
+def test_served_checks_reuse_the_warm_backend(server, tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    for name in ("first", "second"):
+        argv = CHECK + ["--prompt", "hello", "--out", name, "--server", server.url]
+        assert main(argv) == 0
+        # Relative paths resolve against the client's working directory.
+        report = load_json(str(tmp_path / name / "report.json"))
+        assert report["status"] == "PASS"
+    assert report["details"]["backend_loads"] == 0
+    assert server.pool.stats()["loads"] == 1
+
+    argv = ["diff", "--left", "first/traces/run_0.jsonl", "--right", "second/traces/run_1.jsonl"]
+    assert main(argv + ["--out", "diff", "--report", "--server", server.url]) == 0
+    assert "PASS" in capsys.readouterr().out
+    assert server.health()["jobs"] == {"finished": 3}
+
+
+@pytest.mark.parametrize("server", ["unix"], indirect=True)
+def test_unix_socket_and_failed_jobs(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    job = submit_job(server.url, ["run", "--backend", "synthetic", "--model", "synthetic"])
+    assert (job["status"], job["exit_code"]) == ("failed", 2)
+    with pytest.raises(RuntimeError, match="can be served"):
+        submit_job(server.url, ["env"])
+    argv = ["run", "--backend", "synthetic", "--model", "synthetic", "--prompt", "hi"]
+    job = submit_job(server.url, argv + ["--out", "run"])
+    assert (job["status"], job["exit_code"]) == ("finished", 0)
+    assert (tmp_path / "run" / "trace.jsonl").exists()
+
+
+def test_unreachable_server_runs_locally(tmp_path, monkeypatch):
+    monkeypatch.setenv("DETLLM_SERVER", f"unix:{tmp_path / 'missing.sock'}")
+    argv = ["run", "--backend", "synthetic", "--model", "synthetic", "--prompt", "hi"]
+    assert main(argv + ["--out", str(tmp_path / "run")]) == 0
+    assert (tmp_path / "run" / "trace.jsonl").exists()
+
+
+def test_jobs_from_another_environment_are_refused(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CUBLAS_WORKSPACE_CONFIG", ":4096:8")
+    argv = CHECK + ["--prompt", "hi", "--out", "out", "--server", server.url]
+    assert main(argv) == 2
+    assert not (tmp_path / "out").exists()
+    with pytest.raises(RuntimeError, match="CUBLAS_WORKSPACE_CONFIG"):
+        submit_job(server.url, argv[:-2])
+
+
+def test_losing_the_server_while_waiting_fails_cleanly(server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    request = serve._request
+
+    def drop_polls(address, method, path, payload=None):
+        if method == "GET":
+            raise ConnectionRefusedError("server went away")
+        return request(address, method, path, payload)
+
+    monkeypatch.setattr(serve, "_request", drop_polls)
+    with pytest.raises(RuntimeError, match="Lost the detllm server"):
+        submit_job(server.url, CHECK + ["--prompt", "hi", "--out", "lost"])
+    assert main(CHECK + ["--prompt", "hi", "--out", "lost", "--server", server.url]) == 2
+
+
+def test_pool_memory_budget_is_configurable():
+    job_server = JobServer("127.0.0.1:0", max_backends=4, pool_max_bytes=1 << 30)
+    assert (job_server.pool.max_entries, job_server.pool.max_bytes) == (4, 1 << 30)
+    with pytest.raises(SystemExit):
+        main(["serve", "--pool-max-bytes", "0"])
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+
+from detllm import api
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json, validate_artifact
+from detllm.core.generation import hash_prompt
+from detllm.core.sharding import ShardMergeError, ShardSpec, shard_positions
+from detllm.trace.io import read_trace
+
+PROMPTS = [f"prompt {idx}" for idx in range(12)]
+
+
+def _check(out, shard=None, prompts=PROMPTS, **kwargs):
+    return api.check(
+        backend="synthetic",
+        model="synthetic",
+        prompts=prompts,
+        tier=2,
+        runs=2,
+        batch_size=2,
+        vary_batch=[3],
+        out_dir=str(out),
+        shard=shard,
+        validate_schema=True,
+        **kwargs,
+    )
+
+
+def test_shard_spec_parsing_and_assignment():
+    assert ShardSpec.parse("1/3") == ShardSpec(1, 3)
+    for value in ("3/3", "-1/2", "1", "a/b", "0/0"):
+        with pytest.raises(ValueError):
+            ShardSpec.parse(value)
+    ids = [hash_prompt(prompt) for prompt in PROMPTS]
+    positions = [shard_positions(ids, ShardSpec(idx, 3)) for idx in range(3)]
+    assert sorted(sum(positions, [])) == list(range(len(PROMPTS)))
+    assert positions == [shard_positions(ids, ShardSpec(idx, 3)) for idx in range(3)]
+
+
+def test_merged_check_matches_single_host(tmp_path):
+    single = _check(tmp_path / "single")
+    shards = [str(tmp_path / f"shard{idx}") for idx in range(3)]
+    for idx, shard_dir in enumerate(shards):
+        _check(shard_dir, shard=f"{idx}/3")
+        validate_artifact(load_json(f"{shard_dir}/shard.json"))
+
+    report = api.merge(shard_dirs=shards[::-1], out_dir=str(tmp_path / "merged"))
+    assert (report.status, report.category) == (single.status, single.category)
+    assert report.details["runs"] == 2
+    assert report.details["batch_sizes"] == [3]
+    assert report.details["shards"] == 3
+    for name in ("run_0", "run_1", "batch_3"):
+        merged = read_trace(str(tmp_path / "merged" / "traces" / f"{name}.jsonl"))
+        assert merged == read_trace(str(tmp_path / "single" / "traces" / f"{name}.jsonl"))
+    run_config = load_json(str(tmp_path / "merged" / "run_config.json"))
+    assert [shard["index"] for shard in run_config["generation_context"]["shards"]] == [0, 1, 2]
+    metrics = load_json(str(tmp_path / "merged" / "metrics.json"))
+    assert len(metrics["runs"]) == 9
+    for name in ("run_0", "run_1"):
+        env = load_json(str(tmp_path / "merged" / "envs" / f"{name}.json"))
+        single_env = load_json(str(tmp_path / "single" / "envs" / f"{name}.json"))
+        assert env["fingerprint"] == single_env["fingerprint"]
+
+
+def test_empty_shards_merge(tmp_path):
+    # Three prompts over eight shards leave most shards without a prompt.
+    prompts = PROMPTS[:3]
+    single = _check(tmp_path / "single", prompts=prompts, trace_format="binary")
+    shards = [str(tmp_path / f"shard{idx}") for idx in range(8)]
+    for idx, shard_dir in enumerate(shards):
+        report = _check(shard_dir, shard=f"{idx}/8", prompts=prompts, trace_format="binary")
+        assert report.status == "PASS"
+    sizes = [len(load_json(f"{shard_dir}/shard.json")["positions"]) for shard_dir in shards]
+    assert 0 in sizes and sum(sizes) == 3
+
+    report = api.merge(shard_dirs=shards, out_dir=str(tmp_path / "merged"))
+    assert report.status == single.status
+    merged = read_trace(str(tmp_path / "merged" / "traces" / "run_1.dtrace"))
+    assert merged == read_trace(str(tmp_path / "single" / "traces" / "run_1.dtrace"))
+
+
+def test_merge_rejects_incompatible_shards(tmp_path):
+    shards = [str(tmp_path / f"shard{idx}") for idx in range(2)]
+    for idx, shard_dir in enumerate(shards):
+        _check(shard_dir, shard=f"{idx}/2")
+
+    with pytest.raises(ShardMergeError, match="cover"):
+        api.merge(shard_dirs=shards[:1], out_dir=str(tmp_path / "merged"))
+
+    run_env_path = tmp_path / "shard1" / "envs" / "run_1.json"
+    original = run_env_path.read_text(encoding="utf-8")
+    run_env = json.loads(original)
+    run_env["fingerprint"] = "0" * 64
+    run_env_path.write_text(json.dumps(run_env), encoding="utf-8")
+    with pytest.raises(ShardMergeError, match="run_1 in a different environment"):
+        api.merge(shard_dirs=shards, out_dir=str(tmp_path / "merged"))
+    run_env_path.write_text(original, encoding="utf-8")
+
+    env_path = tmp_path / "shard1" / "env.json"
+    env = json.loads(env_path.read_text(encoding="utf-8"))
+    env["fingerprint"] = "0" * 64
+    env_path.write_text(json.dumps(env), encoding="utf-8")
+    with pytest.raises(ShardMergeError, match="fingerprint"):
+        api.merge(shard_dirs=shards, out_dir=str(tmp_path / "merged"))
+
+    other = tmp_path / "other"
+    _check(other, shard="1/2", max_new_tokens=4)
+    with pytest.raises(ShardMergeError, match="run configs"):
+        api.merge(shard_dirs=[shards[0], str(other)], out_dir=str(tmp_path / "merged"))
+
+
+def test_cli_sharded_run_and_merge(tmp_path, monkeypatch):
+    prompt_file = tmp_path / "prompts.jsonl"
+    prompt_file.write_text("".join(json.dumps(p) + "\n" for p in PROMPTS), encoding="utf-8")
+    base = ["run", "--backend", "synthetic", "--model", "synthetic"]
+    base += ["--prompt-file", str(prompt_file), "--trace-format", "binary"]
+    for idx in range(2):
+        assert main(base + ["--shard", f"{idx}/2", "--out", str(tmp_path / f"s{idx}")]) == 0
+    merged = tmp_path / "merged"
+    args = ["merge", "--in", str(tmp_path / "s0"), "--in", str(tmp_path / "s1")]
+    assert main(args + ["--out", str(merged)]) == 0
+    rows = read_trace(str(merged / "trace.dtrace"))
+    assert [row["prompt_id"] for row in rows] == [hash_prompt(prompt) for prompt in PROMPTS]
+    assert main(["merge", "--in", str(tmp_path / "s0"), "--out", str(merged)]) == 2
+
+    with pytest.raises(SystemExit):
+        main(base + ["--shard", "2/2"])
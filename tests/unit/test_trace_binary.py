@@ -0,0 +1,111 @@
+import json
+import struct
+import subprocess
+import sys
+
+from detllm import api
+from detllm.trace.binary import BinaryTrace, is_binary_trace
+from detllm.trace.io import convert_trace, read_trace, write_trace
+
+ROWS = [
+    {
+        "prompt_id": "a" * 64,
+        "input_token_ids": [5, 6],
+        "input_token_ids_hash": "b" * 64,
+        "generated_token_ids": [5, 6, 7],
+        "scores": [-0.1, -1e-300, float.fromhex("0x1.fffffffffffffp-2")],
+        "tokenizer_id": "tok",
+        "decoding_temperature": 0.0,
+    },
+    {
+        "prompt_id": "short",
+        "generated_token_ids": [2**40],
+        "scores": None,
+        "tokenizer_id": "other",
+        "decoding_temperature": 0.0,
+    },
+]
+
+
+def test_binary_trace_round_trip_is_exact(tmp_path):
+    path = tmp_path / "trace.dtrace"
+    write_trace(str(path), ROWS, trace_format="binary")
+    assert is_binary_trace(str(path))
+    rows = read_trace(str(path))
+    assert rows == ROWS
+    for left, right in zip(ROWS[0]["scores"], rows[0]["scores"], strict=True):
+        assert struct.pack("<d", left) == struct.pack("<d", right)
+
+
+def test_binary_trace_sections_are_zero_copy_views(tmp_path):
+    path = tmp_path / "trace.dtrace"
+    write_trace(str(path), ROWS[:1], trace_format="binary")
+    with BinaryTrace(str(path)) as trace:
+        assert len(trace) == 1
+        tokens = trace.section("generated_values")
+        assert isinstance(tokens, memoryview)
+        assert tokens.tolist() == [5, 6, 7]
+        assert trace.section("generated_offsets").tolist() == [0, 3]
+        assert trace.header["sections"]["generated_values"]["offset"] % 8 == 0
+
+
+def test_convert_trace_both_ways(tmp_path):
+    jsonl = tmp_path / "trace.jsonl"
+    write_trace(str(jsonl), ROWS)
+    binary = tmp_path / "trace.dtrace"
+    assert convert_trace(str(jsonl), str(binary)) == "binary"
+    back = tmp_path / "back.jsonl"
+    assert convert_trace(str(binary), str(back)) == "jsonl"
+    assert back.read_text(encoding="utf-8") == jsonl.read_text(encoding="utf-8")
+
+
+def test_cli_diff_reads_binary_and_jsonl(tmp_path):
+    left = tmp_path / "left.dtrace"
+    right = tmp_path / "right.jsonl"
+    write_trace(str(left), ROWS, trace_format="binary")
+    write_trace(str(right), ROWS)
+    out_dir = tmp_path / "out"
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "detllm.cli.main",
+            "--quiet",
+            "diff",
+            "--left",
+            str(left),
+            "--right",
+            str(right),
+            "--out",
+            str(out_dir),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    report = json.loads((out_dir / "report.json").read_text(encoding="utf-8"))
+    assert report["category"] == "PASS"
+
+
+class _Backend:
+    def capabilities(self):
+        from detllm.backends.base import BackendCapabilities
+
+        return BackendCapabilities(True, True, True)
+
+    def generate(self, prompts, **kwargs):
+        return [{"prompt": p, "input_ids": [1], "output_ids": [1, 2]} for p in prompts]
+
+
+def test_check_writes_binary_traces(tmp_path):
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["a", "b"],
+        runs=2,
+        trace_format="binary",
+        out_dir=str(tmp_path / "out"),
+        backend_adapter=_Backend(),
+    )
+    assert report.status == "PASS"
+    assert is_binary_trace(str(tmp_path / "out" / "traces" / "run_1.dtrace"))
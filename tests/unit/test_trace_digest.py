@@ -0,0 +1,100 @@
+import os
+import shutil
+
+import pytest
+
+import detllm.diff.files as diff_files
+from detllm.core.store import ArtifactStore
+from detllm.diff.diff import diff_row
+from detllm.diff.files import diff_trace_files
+from detllm.trace.digest import output_digest
+from detllm.trace.io import read_trace, trace_digest, write_trace
+
+
+def _row(prompt_id, tokens, scores=None):
+    row = {"prompt_id": prompt_id, "generated_token_ids": tokens, "scores": scores}
+    row["output_digest"] = output_digest(row)
+    return row
+
+
+ROWS = [_row("a", [1, 2], [-0.5, -0.25]), _row("b", [3])]
+
+
+def _write(tmp_path, name, rows, trace_format):
+    suffix = {"jsonl": ".jsonl", "binary": ".dtrace", "manifest": ".manifest.json"}[trace_format]
+    path = str(tmp_path / f"{name}{suffix}")
+    store = ArtifactStore(str(tmp_path / "store")) if trace_format == "manifest" else None
+    write_trace(path, rows, trace_format=trace_format, store=store)
+    return path
+
+
+def test_trace_digest_is_format_independent(tmp_path):
+    digests = {
+        trace_format: trace_digest(_write(tmp_path, "t", ROWS, trace_format))
+        for trace_format in ("jsonl", "binary", "manifest")
+    }
+    assert len(set(digests.values())) == 1
+    assert None not in digests.values()
+    changed = _write(tmp_path, "changed", [ROWS[0], _row("b", [4])], "jsonl")
+    assert trace_digest(changed) != digests["jsonl"]
+
+
+def test_trace_digest_missing_for_stale_legacy_and_nan_traces(tmp_path):
+    stale = _write(tmp_path, "stale", ROWS, "jsonl")
+    with open(stale, "a", encoding="utf-8") as handle:
+        handle.write('{"prompt_id": "c", "generated_token_ids": []}\n')
+    assert trace_digest(stale) is None
+
+    legacy = tmp_path / "legacy.jsonl"
+    legacy.write_text('{"prompt_id": "a", "generated_token_ids": [1]}\n', encoding="utf-8")
+    assert trace_digest(str(legacy)) is None
+
+    nan_row = _row("n", [1], [float("nan")])
+    assert nan_row["output_digest"] is None
+    for trace_format in ("jsonl", "binary"):
+        assert trace_digest(_write(tmp_path, "nan", [nan_row], trace_format)) is None
+
+
+@pytest.mark.parametrize("trace_format", ["jsonl", "binary"])
+def test_diff_short_circuits_on_equal_trace_digests(tmp_path, monkeypatch, trace_format):
+    left = _write(tmp_path, "left", ROWS, trace_format)
+    right = _write(tmp_path, "right", ROWS, trace_format)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("rows should not be read")
+
+    monkeypatch.setattr(diff_files, "read_trace", fail)
+    monkeypatch.setattr(diff_files, "iter_trace", fail)
+    assert diff_trace_files(left, right).status == "PASS"
+
+
+def test_diff_row_uses_output_digests_and_falls_back_without_them(tmp_path):
+    left, right = _row("a", [1, 2]), _row("a", [1, 3])
+    assert diff_row(0, left, right).category == "RUN_VARIANCE_FIXED_BATCH"
+    assert diff_row(0, left, dict(left)) is None
+
+    legacy = {key: value for key, value in left.items() if key != "output_digest"}
+    assert diff_row(0, legacy, right).first_divergence["token_index"] == 1
+
+    path = _write(tmp_path, "legacy", [legacy], "binary")
+    assert read_trace(path) == [legacy]
+
+
+def test_same_size_rewrite_invalidates_the_digest_sidecar(tmp_path):
+    baseline = _write(tmp_path, "baseline", ROWS, "jsonl")
+    left = _write(tmp_path, "a", ROWS, "jsonl")
+    other = _write(tmp_path, "b", [ROWS[0], _row("b", [4])], "jsonl")
+    assert os.path.getsize(other) == os.path.getsize(baseline)
+    shutil.copyfile(other, baseline)
+    assert trace_digest(baseline) is None
+    assert diff_trace_files(baseline, left).status == "FAIL"
+
+
+def test_digest_sidecar_is_bound_to_size_and_mtime(tmp_path):
+    path = _write(tmp_path, "trace", ROWS, "jsonl")
+    digest = trace_digest(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert trace_digest(path) is None
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert trace_digest(path) == digest
@@ -0,0 +1,118 @@
+import os
+import shutil
+
+import pytest
+
+from detllm.cli.main import main
+from detllm.core.artifacts import load_json
+from detllm.core.store import ArtifactStore
+from detllm.diff.diff import diff_traces
+from detllm.diff.files import diff_trace_files
+from detllm.trace.index import StaleIndexError, TraceIndex, index_path
+from detllm.trace.io import read_rows, write_trace
+
+ROWS = [
+    {"prompt_id": "a", "generated_token_ids": [1, 2]},
+    {"prompt_id": "b", "generated_token_ids": [3]},
+    {"prompt_id": "c", "generated_token_ids": [4, 5, 6], "scores": [-0.5, -0.25, -1.0]},
+]
+
+
+@pytest.mark.parametrize("trace_format", ["jsonl", "binary", "manifest"])
+def test_read_rows_seeks_via_index(tmp_path, trace_format):
+    path = str(tmp_path / "trace")
+    store = ArtifactStore(str(tmp_path / "store")) if trace_format == "manifest" else None
+    write_trace(path, ROWS, trace_format=trace_format, store=store, index=True)
+    index = TraceIndex.load(path)
+    assert [entry.prompt_id for entry in index.entries] == ["a", "b", "c"]
+    assert read_rows(path, ["c", "a"]) == [ROWS[0], ROWS[2]]
+
+
+def test_stale_index_is_ignored_and_removed(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    write_trace(path, ROWS, index=True)
+    with open(path, "a", encoding="utf-8") as handle:
+        handle.write('{"prompt_id": "d"}\n')
+    assert TraceIndex.load(path) is None
+    assert read_rows(path, ["d"]) == [{"prompt_id": "d"}]
+    write_trace(path, ROWS)
+    assert not os.path.exists(index_path(path))
+
+
+def test_prompt_id_alignment_ignores_order():
+    reordered = [ROWS[2], ROWS[0], ROWS[1]]
+    assert diff_traces(ROWS, reordered).status == "FAIL"
+    assert diff_traces(ROWS, reordered, align="prompt_id").status == "PASS"
+
+    missing = diff_traces(ROWS, ROWS[:2], align="prompt_id")
+    assert missing.first_divergence == {
+        "index": 2,
+        "right_index": None,
+        "reason": "prompt_id missing from right trace",
+        "prompt_id": "c",
+    }
+
+
+@pytest.mark.parametrize("align", ["position", "prompt_id"])
+def test_indexed_file_diff_matches_in_memory_diff(tmp_path, align):
+    right_rows = [ROWS[1], {"prompt_id": "a", "generated_token_ids": [1, 9]}, ROWS[2]]
+    left, right = str(tmp_path / "left.jsonl"), str(tmp_path / "right.jsonl")
+    write_trace(left, ROWS, index=True)
+    write_trace(right, right_rows, index=True)
+    result = diff_trace_files(left, right, align=align)
+    assert result == diff_traces(ROWS, right_rows, align=align)
+    if align == "prompt_id":
+        assert result.first_divergence["right_index"] == 1
+
+
+def test_cli_diff_align_prompt_id(tmp_path):
+    left, right = tmp_path / "left.jsonl", tmp_path / "right.jsonl"
+    write_trace(str(left), ROWS, index=True)
+    write_trace(str(right), list(reversed(ROWS)), index=True)
+    out_dir = tmp_path / "out"
+    argv = ["diff", "--left", str(left), "--right", str(right), "--out", str(out_dir)]
+    assert main(argv + ["--align", "prompt_id"]) == 0
+    report = load_json(str(out_dir / "report.json"))
+    assert report["status"] == "PASS"
+    assert report["details"]["align"] == "prompt_id"
+
+
+def test_same_size_rewrite_invalidates_the_index(tmp_path):
+    path = str(tmp_path / "trace.jsonl")
+    other = str(tmp_path / "other.jsonl")
+    write_trace(path, ROWS, index=True)
+    swapped = [ROWS[0], {"prompt_id": "b", "generated_token_ids": [4]}, ROWS[2]]
+    write_trace(other, swapped, index=True)
+    assert os.path.getsize(other) == os.path.getsize(path)
+    shutil.copyfile(other, path)
+    assert TraceIndex.load(path) is None
+    assert read_rows(path, ["b"]) == [swapped[1]]
+    original = str(tmp_path / "original.jsonl")
+    write_trace(original, ROWS, index=True)
+    assert diff_trace_files(original, path).status == "FAIL"
+
+
+def test_rows_read_through_the_index_are_verified(tmp_path):
+    path, other = str(tmp_path / "trace.jsonl"), str(tmp_path / "other.jsonl")
+    write_trace(path, ROWS, index=True)
+    swapped = [ROWS[0], {"prompt_id": "b", "generated_token_ids": [4]}, ROWS[2]]
+    write_trace(other, swapped)
+    # A same-size rewrite that kept the trace's size and mtime.
+    stat = os.stat(path)
+    shutil.copyfile(other, path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    index = TraceIndex.load(path)
+    assert index is not None
+    with pytest.raises(StaleIndexError):
+        index.read(index.lookup(["b"]))
+    assert read_rows(path, ["b"]) == [swapped[1]]
+
+
+def test_binary_index_is_bound_to_the_embedded_digest(tmp_path):
+    path = str(tmp_path / "trace.dtrace")
+    write_trace(path, ROWS, trace_format="binary", index=True)
+    os.utime(path)
+    assert TraceIndex.load(path) is not None
+    write_trace(str(tmp_path / "other.dtrace"), ROWS[::-1], trace_format="binary")
+    shutil.copyfile(str(tmp_path / "other.dtrace"), path)
+    assert TraceIndex.load(path) is None
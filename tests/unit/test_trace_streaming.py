@@ -0,0 +1,130 @@
+import pytest
+
+from detllm.backends.base import BackendCapabilities
+from detllm.cli import main as cli_main
+from detllm.core.batching import plan_batches
+from detllm.core.workers import GenerationTask
+from detllm.diff.diff import TraceComparator, diff_trace_stream, diff_traces
+from detllm.trace.binary import BinaryTrace, BinaryTraceWriter
+from detllm.trace.io import TraceWriter, iter_trace, read_trace, write_trace
+
+
+def _row(idx, tokens=(1, 2), **extra):
+    return {"prompt_id": f"p{idx}", "generated_token_ids": list(tokens), **extra}
+
+
+class EchoBackend:
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        return [
+            {"prompt": prompt, "input_ids": [len(prompt)], "output_ids": [len(prompt), 0]}
+            for prompt in prompts
+        ]
+
+
+@pytest.mark.parametrize("trace_format", ["jsonl", "binary"])
+def test_trace_writer_restores_index_order(tmp_path, trace_format):
+    path = tmp_path / "trace"
+    with TraceWriter(str(path), trace_format=trace_format) as writer:
+        writer.put(2, _row(2))
+        writer.put(0, _row(0))
+        assert writer.rows == 1
+        writer.put(1, _row(1))
+        assert writer.rows == 3
+    assert [row["prompt_id"] for row in iter_trace(str(path))] == ["p0", "p1", "p2"]
+
+
+@pytest.mark.parametrize("trace_format", ["jsonl", "binary"])
+def test_trace_writer_discards_partial_file_on_error(tmp_path, trace_format):
+    path = tmp_path / "trace"
+    with pytest.raises(RuntimeError):
+        with TraceWriter(str(path), trace_format=trace_format) as writer:
+            writer.write(_row(0))
+            raise RuntimeError("generation failed")
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_trace_writer_flushes_rows_behind_a_gap_on_close(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    with TraceWriter(str(path)) as writer:
+        writer.put(3, _row(3))
+        writer.put(1, _row(1))
+    assert [row["prompt_id"] for row in read_trace(str(path))] == ["p1", "p3"]
+
+
+def test_binary_writer_spools_across_flushes(tmp_path):
+    path = tmp_path / "trace.dtrace"
+    rows = [_row(idx, tokens=range(idx % 5), tokenizer_id=f"t{idx % 2}") for idx in range(25)]
+    writer = BinaryTraceWriter(str(path), flush_rows=4)
+    for row in rows:
+        writer.write(row)
+    writer.close()
+    assert read_trace(str(path)) == rows
+    with BinaryTrace(str(path)) as trace:
+        assert "extra_rows" in trace.header["sections"]
+
+    uniform = tmp_path / "uniform.dtrace"
+    uniform_rows = [_row(idx, tokenizer_id="t") for idx in range(3)]
+    write_trace(str(uniform), uniform_rows, trace_format="binary")
+    with BinaryTrace(str(uniform)) as trace:
+        assert trace.header["fields"] == {"const": {"tokenizer_id": "t"}}
+        assert "extra_rows" not in trace.header["sections"]
+
+
+def test_trace_comparator_matches_diff_traces_out_of_order():
+    base = [_row(idx) for idx in range(4)]
+    other = [_row(0), _row(1, tokens=(1, 3)), _row(2), _row(3, tokens=(9,))]
+    comparator = TraceComparator(base)
+    for idx in (3, 2, 1, 0):
+        comparator.add(idx, other[idx])
+    assert comparator.result() == diff_traces(base, other)
+    assert comparator.result().first_divergence["index"] == 1
+
+
+def test_diff_trace_stream_reports_length_first():
+    base = [_row(0), _row(1)]
+    result = diff_trace_stream(base, iter([_row(0, tokens=(5,))]))
+    assert result == diff_traces(base, [_row(0, tokens=(5,))])
+    assert result.first_divergence["reason"] == "trace lengths differ"
+
+
+def test_generate_task_streams_rows_and_keeps_only_baseline(tmp_path):
+    args = cli_main.build_parser().parse_args(
+        ["check", "--model", "fake", "--out", str(tmp_path), "--batch-size", "2"]
+    )
+    prompts = ["ccc", "a", "bb"]
+    plan = plan_batches(prompts, "length")
+    backend = EchoBackend()
+
+    baseline = cli_main._generate_task(
+        args,
+        prompts,
+        GenerationTask("run", 0, 2),
+        None,
+        plan,
+        backend_adapter=backend,
+        capture_task_env=False,
+        keep_rows=True,
+    )
+    assert [row["generated_token_ids"][0] for row in baseline.rows] == [3, 1, 2]
+    assert read_trace(baseline.trace_path) == baseline.rows
+
+    other = cli_main._generate_task(
+        args,
+        prompts,
+        GenerationTask("run", 1, 2),
+        None,
+        plan,
+        backend_adapter=backend,
+        capture_task_env=False,
+        baseline_rows=baseline.rows,
+    )
+    assert other.rows is None
+    assert other.rows_written == 3
+    assert other.divergence.status == "PASS"
@@ -0,0 +1,51 @@
+import json
+from dataclasses import dataclass
+
+from detllm import api
+from detllm.backends.base import BackendCapabilities
+from detllm.core.workers import partition_cpus
+
+
+@dataclass
+class PicklableBackend:
+    def capabilities(self) -> BackendCapabilities:
+        return BackendCapabilities(
+            supports_tier1_fixed_batch=True,
+            supports_scores=True,
+            supports_torch_deterministic=True,
+        )
+
+    def generate(self, prompts, **kwargs):
+        return [
+            {"prompt": prompt, "input_ids": [1, 2], "output_ids": [3, 4], "scores": None}
+            for prompt in prompts
+        ]
+
+
+def test_partition_cpus_covers_each_worker():
+    slices = partition_cpus(2)
+    assert slices
+    assert all(slices)
+    flat = [cpu for cpus in slices for cpu in cpus]
+    assert len(flat) == len(set(flat))
+
+
+def test_check_with_workers_matches_sequential(tmp_path):
+    out_dir = tmp_path / "out"
+    report = api.check(
+        backend="hf",
+        model="fake",
+        prompts=["a", "b", "c"],
+        runs=2,
+        vary_batch=[2],
+        workers=2,
+        out_dir=str(out_dir),
+        backend_adapter=PicklableBackend(),
+    )
+    assert report.status == "PASS"
+    assert report.details["workers"] == 2
+    assert (out_dir / "traces" / "run_1.jsonl").exists()
+    assert (out_dir / "traces" / "batch_2.jsonl").exists()
+    assert not list((out_dir / "traces").glob("*.tmp"))
+    env = json.loads((out_dir / "envs" / "run_1.json").read_text(encoding="utf-8"))
+    assert env["artifact_type"] == "env_snapshot"